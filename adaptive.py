@@ -0,0 +1,228 @@
+"""
+Coarse-to-fine availability search ("adaptive" mode of find_common_availability
+and find_available_rooms).
+
+Phase 1 fetches COARSE_INTERVAL free/busy for the whole horizon. A coarse slot
+is only free when the whole slot is free, so free coarse runs are certain; the
+slots right next to them may be partly free. Phase 2 therefore re-queries at
+FINE_INTERVAL only the candidate windows (free runs widened by one coarse slot
+on each side) that could hold the meeting, instead of the whole horizon.
+Free time hidden inside coarse slots that are busy on both sides is not
+searched; that is the price of skipping the bulk of the horizon.
+
+Each search returns (and records in metrics.REGISTRY) how many availabilityView
+characters and response bytes both phases used, and how much a single fine
+pass over the whole horizon would have cost. That pass is not made, so its
+bytes are estimated from the bytes per view character actually received, and
+its latency from the coarse phase (the same requests with COARSE/FINE times
+shorter views), assuming time grows with response size. The latency estimate
+is left out when the coarse phase was served from the snapshot cache.
+"""
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import deadlines
+import scheduling
+import timegrid
+from metrics import REGISTRY
+
+COARSE_INTERVAL = 60
+FINE_INTERVAL = 15
+
+
+def candidate_windows(mask: int, first: int, last: int, slot_minutes: int, duration_minutes: int) -> List[Tuple[int, int]]:
+    """
+    Coarse slot ranges [start, end) worth refining: each free run between slots
+    `first` and `last`, widened by one slot per side, if long enough for the meeting.
+    """
+    windows = []
+    k = first
+    while k < last:
+        if not (mask >> k) & 1:
+            k += 1
+            continue
+        run_end = k
+        while run_end < last and (mask >> run_end) & 1:
+            run_end += 1
+        start, end = max(first, k - 1), min(last, run_end + 1)
+        if (end - start) * slot_minutes >= duration_minutes:
+            if windows and start <= windows[-1][1]:
+                # Widened windows around a one-slot gap overlap: refine them as one
+                windows[-1] = (windows[-1][0], end)
+            else:
+                windows.append((start, end))
+        k = run_end
+    return windows
+
+
+def free_runs(mask: int, slots: int, slot_minutes: int, min_minutes: int) -> List[Tuple[int, int]]:
+    """(start_minute, end_minute) of free runs at least `min_minutes` long."""
+    runs = []
+    k = 0
+    while k < slots:
+        if not (mask >> k) & 1:
+            k += 1
+            continue
+        run_end = k
+        while run_end < slots and (mask >> run_end) & 1:
+            run_end += 1
+        if (run_end - k) * slot_minutes >= min_minutes:
+            runs.append((k * slot_minutes, run_end * slot_minutes))
+        k = run_end
+    return runs
+
+
+def _record(kind: str, stats: dict, coarse: dict, fine: dict) -> dict:
+    """Add the Graph traffic of both phases (fetch_window stats) and the single-pass estimates to `stats`."""
+    stats["saved_view_chars"] = stats["single_pass_view_chars"] - stats["coarse_view_chars"] - stats["fine_view_chars"]
+    stats["response_bytes"] = coarse.get("bytes", 0) + fine.get("bytes", 0)
+    stats["coarse_requests"] = coarse.get("requests", 0)
+    stats["fine_requests"] = fine.get("requests", 0)
+    received_chars = coarse.get("view_chars", 0) + fine.get("view_chars", 0)
+    if received_chars:
+        single_pass_bytes = round(stats["response_bytes"] / received_chars * stats["single_pass_view_chars"])
+        stats["single_pass_bytes_estimate"] = single_pass_bytes
+        stats["saved_bytes_estimate"] = single_pass_bytes - stats["response_bytes"]
+        REGISTRY.inc("adaptive.saved_bytes_estimate", stats["saved_bytes_estimate"], kind=kind)
+    if coarse.get("view_chars"):
+        single_pass_ms = stats["coarse_ms"] * stats["single_pass_view_chars"] / coarse["view_chars"]
+        stats["single_pass_ms_estimate"] = round(single_pass_ms, 1)
+        stats["saved_ms_estimate"] = round(single_pass_ms - stats["coarse_ms"] - stats["fine_ms"], 1)
+        REGISTRY.observe("adaptive.saved_ms_estimate", stats["saved_ms_estimate"], kind=kind)
+    REGISTRY.inc("adaptive.searches", kind=kind)
+    REGISTRY.inc("adaptive.saved_view_chars", stats["saved_view_chars"], kind=kind)
+    REGISTRY.observe("adaptive.coarse_ms", stats["coarse_ms"], kind=kind)
+    REGISTRY.observe("adaptive.fine_ms", stats["fine_ms"], kind=kind)
+    REGISTRY.observe("adaptive.response_bytes", stats["response_bytes"], kind=kind)
+    return stats
+
+
+async def common_free_windows(call, attendee_emails: List[str], start_day: date, num_days: int,
+                              duration_minutes: int = 30) -> dict:
+    """Free windows (within work hours) shared by the user and all attendees, over `num_days` days."""
+    emails = [await scheduling.get_my_address(call)] + list(attendee_emails)
+    emails = list(dict.fromkeys(e.lower() for e in emails if e))
+    stats = {"coarse_view_chars": 0, "fine_view_chars": 0}
+
+    # Phase 1: coarse over the whole horizon (whole-day buckets, served from the snapshot cache when warm)
+    started = time.monotonic()
+    coarse_stats = {}
+    coarse_views, grid_start = await scheduling.get_local_schedules(call, emails, start_day, num_days, COARSE_INTERVAL,
+                                                                     coarse_stats)
+    stats["coarse_ms"] = round((time.monotonic() - started) * 1000, 1)
+    stats["coarse_view_chars"] = sum(len(v) for v in coarse_views.values())
+
+    combined = -1 if coarse_views else 0
+    for view in coarse_views.values():
+        combined &= scheduling.view_to_free_mask(view)
+
+    # Candidate windows in UTC minutes; each day's local work hours placed on the UTC grid
+    table = timegrid.offset_table(scheduling.MEETING_ZONE, start_day, num_days)
+    windows = []
+    for i in range(num_days):
+        work_start, work_end = table.work_window(start_day + timedelta(days=i), scheduling.WORK_START_HOUR, scheduling.WORK_END_HOUR)
+        first = -(-(work_start - grid_start) // COARSE_INTERVAL)
+        last = (work_end - grid_start) // COARSE_INTERVAL
+        for start, end in candidate_windows(combined, first, last, COARSE_INTERVAL, duration_minutes):
+            windows.append((grid_start + start * COARSE_INTERVAL, grid_start + end * COARSE_INTERVAL))
+
+    # Phase 2: fine only inside the candidate windows, all windows concurrently
+    started = time.monotonic()
+    fine_stats = {}
+    fine_views = await deadlines.gather_partial(*(
+        scheduling.fetch_window(call, emails, timegrid.utc_datetime(start), timegrid.utc_datetime(end), FINE_INTERVAL, fine_stats)
+        for start, end in windows
+    ), what="fine windows")
+    fine_views = [views or {} for views in fine_views]
+    stats["fine_ms"] = round((time.monotonic() - started) * 1000, 1)
+
+    slots = []
+    for (start, end), views in zip(windows, fine_views):
+        stats["fine_view_chars"] += sum(len(v) for v in views.values())
+        mask = -1 if views else 0
+        for view in views.values():
+            mask &= scheduling.view_to_free_mask(view)
+        for run_start, run_end in free_runs(mask, (end - start) // FINE_INTERVAL, FINE_INTERVAL, duration_minutes):
+            slots.append((table.local_iso(start + run_start), table.local_iso(start + run_end)))
+
+    stats["single_pass_view_chars"] = len(emails) * num_days * 24 * 60 // FINE_INTERVAL
+    return {"slots": slots, "metrics": _record("availability", stats, coarse_stats, fine_stats)}
+
+
+async def free_rooms(call, rooms: List[dict], date_str: str, start_time_str: str, end_time_str: str,
+                     duration_minutes: Optional[int] = None) -> dict:
+    """
+    Rooms with a free stretch of `duration_minutes` (default: the whole window)
+    inside [start, end] on `date_str`, with the first such stretch.
+    """
+    # Local window -> UTC minutes (elapsed minutes stay right on DST days)
+    day = datetime.strptime(date_str, "%Y-%m-%d").date()
+    table = timegrid.offset_table(scheduling.MEETING_ZONE, day, 1)
+    start = table.to_utc(timegrid.to_minutes(datetime.fromisoformat(f"{date_str}T{start_time_str}")))
+    end = table.to_utc(timegrid.to_minutes(datetime.fromisoformat(f"{date_str}T{end_time_str}")))
+    window_minutes = end - start
+    duration_minutes = min(duration_minutes or window_minutes, window_minutes)
+    names = {r["emailAddress"].lower(): r.get("displayName") for r in rooms if r.get("emailAddress")}
+    stats = {"coarse_view_chars": 0, "fine_view_chars": 0}
+
+    # Phase 1: coarse for every room
+    started = time.monotonic()
+    coarse_stats = {}
+    coarse_views = await scheduling.fetch_window(
+        call, list(names), timegrid.utc_datetime(start), timegrid.utc_datetime(end), COARSE_INTERVAL, coarse_stats
+    )
+    stats["coarse_ms"] = round((time.monotonic() - started) * 1000, 1)
+    stats["coarse_view_chars"] = sum(len(v) for v in coarse_views.values())
+
+    coarse_slots = -(-window_minutes // COARSE_INTERVAL)
+    found: Dict[str, Tuple[int, int]] = {}
+    to_refine: Dict[Tuple[int, int], List[str]] = {}
+    for email, view in coarse_views.items():
+        # The last coarse slot may run past the window end, so it is never trusted as free
+        mask = scheduling.view_to_free_mask(view) & ((1 << (window_minutes // COARSE_INTERVAL)) - 1)
+        settled = free_runs(mask, coarse_slots, COARSE_INTERVAL, duration_minutes)
+        if settled:
+            found[email] = settled[0]
+            continue
+        for window in candidate_windows(mask, 0, coarse_slots, COARSE_INTERVAL, duration_minutes):
+            to_refine.setdefault(window, []).append(email)
+
+    # Phase 2: fine only for undecided rooms, grouped by identical window
+    started = time.monotonic()
+    fine_stats = {}
+    groups = list(to_refine.items())
+    fine_views = await deadlines.gather_partial(*(
+        scheduling.fetch_window(
+            call, emails,
+            timegrid.utc_datetime(start + ws * COARSE_INTERVAL),
+            timegrid.utc_datetime(min(end, start + we * COARSE_INTERVAL)),
+            FINE_INTERVAL, fine_stats
+        )
+        for (ws, we), emails in groups
+    ), what="fine windows")
+    fine_views = [views or {} for views in fine_views]
+    stats["fine_ms"] = round((time.monotonic() - started) * 1000, 1)
+
+    for ((ws, we), _), views in zip(groups, fine_views):
+        offset = ws * COARSE_INTERVAL
+        window_end = min(window_minutes, we * COARSE_INTERVAL)
+        for email, view in views.items():
+            stats["fine_view_chars"] += len(view)
+            if email in found:
+                continue
+            runs = free_runs(scheduling.view_to_free_mask(view), (window_end - offset) // FINE_INTERVAL, FINE_INTERVAL, duration_minutes)
+            if runs:
+                found[email] = (offset + runs[0][0], offset + runs[0][1])
+
+    stats["single_pass_view_chars"] = len(names) * (window_minutes // FINE_INTERVAL)
+
+    available = []
+    for email, (run_start, run_end) in found.items():
+        available.append({
+            "name": names.get(email, email),
+            "email": email,
+            "free_from": table.local_iso(start + run_start)[11:16],
+            "free_until": table.local_iso(start + run_end)[11:16]
+        })
+    return {"rooms": available, "metrics": _record("rooms", stats, coarse_stats, fine_stats)}
@@ -1,4 +1,5 @@
 import os
+import sys
 import json
 import logging
 import msal
@@ -25,6 +26,9 @@ SCOPES = [
     "People.Read",
     "Place.Read.All"
 ]
+# Optional, needs admin consent: expands groups / distribution lists given as attendees.
+# Granted separately (python auth_setup.py --groups) so sign-in works without it.
+GROUP_SCOPES = ["GroupMember.Read.All"]
 
 CACHE_FILE = "token_cache.bin"
 
@@ -40,6 +44,7 @@ def create_app():
     )
 
 def main():
+    scopes = GROUP_SCOPES if "--groups" in sys.argv[1:] else SCOPES
     if not CLIENT_ID or not TENANT_ID:
          print("Error: Please set AZURE_CLIENT_ID and AZURE_TENANT_ID in .env file first.")
          return
@@ -52,11 +57,11 @@ def main():
     
     if accounts:
         print(f"Found stored account: {accounts[0]['username']}")
-        result = app.acquire_token_silent(SCOPES, account=accounts[0])
+        result = app.acquire_token_silent(scopes, account=accounts[0])
     
     if not result:
         print("No suitable token found in cache. Starting Device Code Flow...")
-        flow = app.initiate_device_flow(scopes=SCOPES)
+        flow = app.initiate_device_flow(scopes=scopes)
         
         if "user_code" not in flow:
             print(f"Failed to create device flow. Error: {json.dumps(flow, indent=2)}")
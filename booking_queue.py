@@ -0,0 +1,268 @@
+"""
+Fire-and-confirm booking: book_meeting(wait_for_confirmation=False).
+
+The request is validated and pre-checked against the free/busy snapshot cache
+(no Graph call), then queued and answered with a ticket right away. A
+background worker per Graph client creates the events:
+- bookings queued together are sent as one Graph $batch (up to BATCH_SIZE),
+- throttling, 5xx and network errors are retried with exponential backoff
+  (honouring Retry-After) up to BOOKING_MAX_ATTEMPTS,
+- every event carries the ticket id as Graph's `transactionId`, so a retry of a
+  request that did reach Graph does not create a second event,
+- an identical booking request submitted again while its ticket is pending or
+  booked returns the existing ticket instead of queueing a duplicate.
+
+get_booking_status reports a ticket's outcome (queued, submitting, retrying,
+booked with webLink, or failed with the error).
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import circuit_breaker
+import deadlines
+import scheduling
+import timegrid
+import tracing
+from caches import TTLCache
+from freebusy_cache import freebusy_cache
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Graph $batch accepts at most 20 requests
+BATCH_SIZE = 20
+MAX_ATTEMPTS = int(os.getenv("BOOKING_MAX_ATTEMPTS", "4"))
+RETRY_BASE_SECONDS = float(os.getenv("BOOKING_RETRY_BASE_SECONDS", "2"))
+TICKET_TTL_SECONDS = int(os.getenv("BOOKING_TICKET_TTL_SECONDS", "86400"))
+
+QUEUED, SUBMITTING, RETRYING, BOOKED, FAILED = "queued", "submitting", "retrying", "booked", "failed"
+
+# Shared, so any worker can report a ticket queued by another (see shared_cache.py)
+# High cost: an evicted ticket cannot be refetched, so budget pressure should take it last
+tickets = TTLCache("booking_tickets", TICKET_TTL_SECONDS, max_entries=4096, shared=True, cost=100)
+# idempotency key (hash of the event payload) -> ticket id
+_ticket_by_key = TTLCache("booking_keys", TICKET_TTL_SECONDS, max_entries=4096, shared=True, cost=100)
+
+
+def _save(ticket: dict):
+    """Store a ticket after changing it (publishes the change to other workers)."""
+    tickets.set(ticket["ticket"], ticket)
+
+
+def _mailboxes(call, payload: dict) -> List[str]:
+    emails = [a["emailAddress"]["address"] for a in payload.get("attendees", [])]
+    return list(dict.fromkeys(e.lower() for e in [scheduling.cached_my_address(call), *emails] if e))
+
+
+def _event_range(payload: dict):
+    """(start, end) of the (first) instance in UTC minutes; event times are local to MEETING_ZONE."""
+    start = datetime.fromisoformat(payload["start"]["dateTime"])
+    end = datetime.fromisoformat(payload["end"]["dateTime"])
+    if end <= start:
+        raise ValueError("Meeting end must be after its start")
+    table = timegrid.offset_table(scheduling.MEETING_ZONE, start.date(), (end.date() - start.date()).days + 1)
+    return table.to_utc(timegrid.to_minutes(start)), table.to_utc(timegrid.to_minutes(end))
+
+
+def precheck(call, payload: dict, interval: int = 30) -> List[str]:
+    """
+    Mailboxes (organizer, attendees, room) the snapshot cache shows busy during
+    the (first) meeting instance. Uncached mailboxes are not checked.
+    """
+    start, end = _event_range(payload)
+    utc_day, num_days = timegrid.utc_days(start, end)
+    views = freebusy_cache.cached_views(_mailboxes(call, payload), utc_day, num_days, interval)
+
+    grid_start = timegrid.day_minutes(utc_day)
+    first = (start - grid_start) // interval
+    last = -(-(end - grid_start) // interval)
+    return [email for email, view in views.items() if view[first:last].strip("0")]
+
+
+def status(ticket_id: str) -> Optional[dict]:
+    """Public view of a ticket, or None if unknown/expired."""
+    ticket = tickets.get(ticket_id)
+    if ticket is None:
+        return None
+    return {k: v for k, v in ticket.items() if k != "payload"}
+
+
+class BookingWorker:
+    """Drains one Graph client's booking queue in $batch-sized groups."""
+
+    def __init__(self, call):
+        self.call = call
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self._retries = set()
+
+    def ensure_started(self):
+        if self.task is None or self.task.done() or self.task.get_loop() is not asyncio.get_running_loop():
+            self.queue = asyncio.Queue()
+            # Outlives the tool call that starts it, so it must not inherit that call's deadline or trace
+            with deadlines.unbounded(), tracing.detached():
+                self.task = asyncio.create_task(self.run())
+
+    def put(self, ticket: dict):
+        self.ensure_started()
+        self.queue.put_nowait(ticket)
+
+    async def run(self):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < BATCH_SIZE and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                await self.submit(batch)
+            except Exception as e:
+                # Keep the worker alive whatever happens to one batch
+                logger.exception(f"Booking batch failed unexpectedly: {e}")
+                for ticket in batch:
+                    if ticket["status"] == SUBMITTING:
+                        self._attempt_failed(ticket, str(e), retryable=False)
+
+    async def submit(self, batch: List[dict]):
+        with tracing.span("booking.submit", **{"booking.batch_size": len(batch)}):
+            await self._submit(batch)
+
+    async def _submit(self, batch: List[dict]):
+        for ticket in batch:
+            ticket["status"] = SUBMITTING
+            ticket["attempts"] += 1
+            ticket["updated_at"] = time.time()
+            _save(ticket)
+
+        if len(batch) == 1:
+            ticket = batch[0]
+            try:
+                result = await self.call("POST", "/me/events", ticket["payload"], params={"$select": "webLink"})
+            except Exception as e:
+                retryable = isinstance(e, circuit_breaker.CircuitOpenError) or circuit_breaker.is_failure(e)
+                self._attempt_failed(ticket, str(e), retryable)
+                return
+            self._booked(ticket, result)
+            return
+
+        requests = [{
+            "id": str(i),
+            "method": "POST",
+            "url": "/me/events?$select=webLink",
+            "headers": {"Content-Type": "application/json"},
+            "body": ticket["payload"]
+        } for i, ticket in enumerate(batch)]
+        try:
+            data = await self.call("POST", "/$batch", {"requests": requests})
+        except Exception as e:
+            retryable = isinstance(e, circuit_breaker.CircuitOpenError) or circuit_breaker.is_failure(e)
+            for ticket in batch:
+                self._attempt_failed(ticket, str(e), retryable)
+            return
+        REGISTRY.inc("booking.batches")
+
+        answered = set()
+        for response in data.get("responses", []):
+            ticket = batch[int(response["id"])]
+            answered.add(ticket["ticket"])
+            code = response.get("status", 500)
+            body = response.get("body") or {}
+            if 200 <= code < 300:
+                self._booked(ticket, body)
+                continue
+            message = body.get("error", {}).get("message") or f"HTTP {code}"
+            retry_after = (response.get("headers") or {}).get("Retry-After")
+            self._attempt_failed(ticket, f"Graph API Error ({code}): {message}", code == 429 or code >= 500, retry_after)
+        for ticket in batch:
+            if ticket["ticket"] not in answered:
+                self._attempt_failed(ticket, "No response in $batch", retryable=True)
+
+    def _booked(self, ticket: dict, result: dict):
+        ticket.update(status=BOOKED, web_link=result.get("webLink"), error=None, updated_at=time.time())
+        _save(ticket)
+        REGISTRY.inc("booking.booked")
+        REGISTRY.observe("booking.confirm_ms", (ticket["updated_at"] - ticket["created_at"]) * 1000)
+
+        # The new event makes the cached free/busy of everyone involved outdated
+        payload = ticket["payload"]
+        utc_day, num_days = timegrid.utc_days(*_event_range(payload))
+        for mailbox in _mailboxes(self.call, payload):
+            if payload.get("recurrence"):
+                freebusy_cache.invalidate(mailbox)
+                continue
+            for i in range(num_days):
+                freebusy_cache.invalidate(mailbox, utc_day + timedelta(days=i))
+
+    def _attempt_failed(self, ticket: dict, error: str, retryable: bool, retry_after: Optional[str] = None):
+        # Worked out before any state change: a malformed header must not leave the ticket half updated
+        wait = circuit_breaker.retry_after_seconds(retry_after)
+        ticket.update(error=error, updated_at=time.time())
+        if not retryable or ticket["attempts"] >= MAX_ATTEMPTS:
+            ticket["status"] = FAILED
+            _save(ticket)
+            REGISTRY.inc("booking.failed")
+            logger.warning(f"Booking {ticket['ticket']} failed after {ticket['attempts']} attempt(s): {error}")
+            return
+
+        ticket["status"] = RETRYING
+        _save(ticket)
+        delay = wait if wait is not None else RETRY_BASE_SECONDS * 2 ** (ticket["attempts"] - 1)
+        REGISTRY.inc("booking.retries")
+        task = asyncio.create_task(self._requeue(ticket, delay))
+        self._retries.add(task)
+        task.add_done_callback(self._retries.discard)
+
+    async def _requeue(self, ticket: dict, delay: float):
+        with tracing.span("booking.backoff", **{"booking.attempt": ticket["attempts"], "booking.delay_s": delay}):
+            await asyncio.sleep(delay)
+        ticket["status"] = QUEUED
+        _save(ticket)
+        self.put(ticket)
+
+
+workers: Dict = {}
+
+
+async def submit(call, payload: dict) -> dict:
+    """
+    Validate, pre-check and queue an event payload (see meeting_core.build_event).
+    Returns the ticket; raises ValueError on invalid input or a known conflict.
+    """
+    key = hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+    existing = tickets.get(_ticket_by_key.get(key) or "")
+    if existing and existing["status"] != FAILED:
+        return status(existing["ticket"])
+
+    conflicts = precheck(call, payload)
+    if conflicts:
+        raise ValueError(f"Not queued: busy at that time according to cached schedules: {', '.join(conflicts)}")
+
+    ticket_id = str(uuid.uuid4())
+    now = time.time()
+    ticket = {
+        "ticket": ticket_id,
+        "status": QUEUED,
+        "subject": payload.get("subject"),
+        "start": payload["start"]["dateTime"],
+        "end": payload["end"]["dateTime"],
+        "attempts": 0,
+        "web_link": None,
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+        # Graph ignores a second create with the same transactionId, which makes retries safe
+        "payload": {**payload, "transactionId": ticket_id}
+    }
+    _save(ticket)
+    _ticket_by_key.set(key, ticket_id)
+
+    if call not in workers:
+        workers[call] = BookingWorker(call)
+    workers[call].put(ticket)
+    REGISTRY.inc("booking.submitted")
+    return status(ticket_id)
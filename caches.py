@@ -0,0 +1,248 @@
+"""
+Small in-process caches for Graph directory data (rooms, people, user lookups).
+
+Caches created with shared=True are also kept in the cross-process tier when
+one is configured (see shared_cache.py), so several workers share them.
+
+All caches draw from one memory budget (CACHE_MEMORY_BUDGET_MB). Entry sizes
+are estimated when stored; when the total goes over the budget, MANAGER evicts
+across all caches by GreedyDual-Size-Frequency: an entry's priority is
+clock + hits * cost / size, lowest goes first, where `cost` is what a refetch
+costs relative to other caches. Small, often used, expensive entries stay;
+large, rarely used ones go. Each eviction advances the clock to the evicted
+priority, so entries that stop being used age out.
+"""
+import heapq
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import shared_cache
+import tracing
+from metrics import REGISTRY
+
+MEMORY_BUDGET_MB = float(os.getenv("CACHE_MEMORY_BUDGET_MB", "256"))
+# Per-entry bookkeeping (OrderedDict slot, metadata, heap item)
+ENTRY_OVERHEAD_BYTES = 200
+
+
+def approx_size(value: Any) -> int:
+    """Approximate deep size in bytes of a JSON-like value."""
+    size = 0
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+    return size
+
+
+class _Meta:
+    __slots__ = ("size", "hits", "priority")
+
+    def __init__(self, size: int, hits: int):
+        self.size = size
+        self.hits = hits
+        self.priority = 0.0
+
+
+class CacheManager:
+    """One memory budget across every TTLCache, enforced with GDSF eviction."""
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self.used_bytes = 0
+        self.clock = 0.0
+        self.caches: Dict[str, "TTLCache"] = {}
+        # (priority, seq, cache name, key); an item is outdated once its entry's priority changed
+        self.heap: List[tuple] = []
+        self._seq = itertools.count()
+        # Caches may also be used from worker threads (asyncio.to_thread)
+        self.lock = threading.RLock()
+
+    def register(self, cache: "TTLCache"):
+        self.caches[cache.name] = cache
+
+    def touch(self, cache: "TTLCache", key: Hashable, meta: _Meta):
+        meta.priority = self.clock + meta.hits * cache.cost / meta.size
+        heapq.heappush(self.heap, (meta.priority, next(self._seq), cache.name, key))
+
+    def enforce(self):
+        """Evict the lowest-priority entries until usage is within budget."""
+        while self.used_bytes > self.budget_bytes and self.heap:
+            priority, _, name, key = heapq.heappop(self.heap)
+            cache = self.caches.get(name)
+            meta = cache._meta.get(key) if cache else None
+            if meta is None or meta.priority != priority:
+                continue
+            self.clock = priority
+            cache._drop(key, evicted=True)
+
+        # Every hit pushes a new heap item; rebuild once outdated ones dominate
+        entries = sum(len(cache._meta) for cache in self.caches.values())
+        if len(self.heap) > 4 * entries + 1024:
+            self.heap = [(meta.priority, next(self._seq), cache.name, key)
+                         for cache in self.caches.values() for key, meta in cache._meta.items()]
+            heapq.heapify(self.heap)
+
+    def stats(self) -> dict:
+        """Budget usage and per-cache entries, bytes, hit rate and evictions."""
+        with self.lock:
+            caches = {}
+            for name, cache in sorted(self.caches.items()):
+                lookups = cache.hits + cache.misses
+                caches[name] = {
+                    "entries": len(cache._meta),
+                    "bytes": sum(meta.size for meta in cache._meta.values()),
+                    "hits": cache.hits,
+                    "misses": cache.misses,
+                    "hit_rate": round(cache.hits / lookups, 3) if lookups else None,
+                    "evictions": cache.evictions,
+                    "cost": cache.cost,
+                    "shared": cache.shared
+                }
+            return {
+                "budget_bytes": self.budget_bytes,
+                "used_bytes": self.used_bytes,
+                "used_percent": round(100 * self.used_bytes / self.budget_bytes, 1),
+                "caches": caches
+            }
+
+
+MANAGER = CacheManager(int(MEMORY_BUDGET_MB * 1024 * 1024))
+
+
+class TTLCache:
+    """
+    LRU dict whose entries expire after `ttl_seconds`.
+
+    Expired entries are kept (until evicted) so callers can still fall back to
+    the last known value with get_entry().
+
+    Besides its own max_entries limit, a cache gives up entries when the
+    process-wide memory budget is exceeded; `cost` weighs how expensive a miss
+    is (e.g. several Graph calls for one entry) against the other caches.
+
+    With shared=True, keys and values must be JSON serializable (tuples come
+    back as tuples, other containers as lists and dicts). Budget evictions only
+    drop the in-memory copy.
+    """
+
+    def __init__(self, name: str, ttl_seconds: float, max_entries: int = 1024, shared: bool = False,
+                 cost: float = 1.0):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.cost = cost
+        self.shared = shared and shared_cache.store is not None
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._meta: Dict[Hashable, _Meta] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        MANAGER.register(self)
+        if self.shared:
+            shared_cache.register(self)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Value for `key` if present and not expired, else None."""
+        entry = self._lookup(key)
+        if entry is None or time.time() - entry[1] > self.ttl_seconds:
+            self.misses += 1
+            return None
+        self._hit(key)
+        return entry[0]
+
+    def get_entry(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        """(value, stored_at) for `key` regardless of expiry, or None."""
+        entry = self._lookup(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self._hit(key)
+        return entry
+
+    def _lookup(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        with tracing.span("cache.lookup", **{"cache.name": self.name}) as lookup:
+            if self.shared:
+                shared_cache.sync()
+            entry = self._entries.get(key)
+            if entry is None and self.shared:
+                # Another worker may have fetched it
+                entry = shared_cache.store.get(self.name, key)
+                if entry is not None:
+                    self._remember(key, entry)
+                lookup.set_attribute("cache.shared_tier", True)
+            lookup.set_attribute("cache.hit", entry is not None)
+        return entry
+
+    def _hit(self, key: Hashable):
+        with MANAGER.lock:
+            meta = self._meta.get(key)
+            if meta is None:
+                return
+            self.hits += 1
+            meta.hits += 1
+            self._entries.move_to_end(key)
+            MANAGER.touch(self, key, meta)
+
+    def set(self, key: Hashable, value: Any):
+        entry = (value, time.time())
+        self._remember(key, entry)
+        if self.shared:
+            shared_cache.store.put(self.name, key, value, entry[1])
+
+    def _remember(self, key: Hashable, entry: Tuple[Any, float]):
+        size = approx_size(key) + approx_size(entry[0]) + ENTRY_OVERHEAD_BYTES
+        with MANAGER.lock:
+            previous = self._meta.pop(key, None)
+            if previous is not None:
+                MANAGER.used_bytes -= previous.size
+            meta = _Meta(size, previous.hits if previous else 1)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._meta[key] = meta
+            MANAGER.used_bytes += size
+            MANAGER.touch(self, key, meta)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)), evicted=True)
+            MANAGER.enforce()
+
+    def _drop(self, key: Hashable, evicted: bool = False):
+        with MANAGER.lock:
+            self._entries.pop(key, None)
+            meta = self._meta.pop(key, None)
+            if meta is None:
+                return
+            MANAGER.used_bytes -= meta.size
+            if evicted:
+                self.evictions += 1
+                REGISTRY.inc("cache.evictions", cache=self.name)
+
+    def drop_local(self, key: Optional[Hashable] = None):
+        """Forget the in-memory copy of one entry (or all); the shared tier is left alone."""
+        for k in (list(self._entries) if key is None else [key]):
+            self._drop(k)
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Drop one entry, or everything when no key is given (in every worker when shared)."""
+        self.drop_local(key)
+        if self.shared:
+            shared_cache.store.delete(self.name, key)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every entry whose key matches `predicate`; returns how many were dropped."""
+        keys = set(key for key in self._entries if predicate(key))
+        if self.shared:
+            keys.update(key for key in shared_cache.store.keys(self.name) if predicate(key))
+        for key in keys:
+            self.invalidate(key)
+        return len(keys)
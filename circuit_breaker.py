@@ -0,0 +1,252 @@
+"""
+Per-endpoint circuit breakers for Graph calls, with degraded-mode serving.
+
+A breaker opens when, within GRAPH_BREAKER_WINDOW_SECONDS, at least
+GRAPH_BREAKER_MIN_REQUESTS calls were made and the share of failures (timeouts,
+connection errors, 429 and 5xx) reached GRAPH_BREAKER_FAILURE_RATE. While open,
+calls fail fast with CircuitOpenError for GRAPH_BREAKER_OPEN_SECONDS; after that
+a single probe call is let through (half-open) and its outcome closes or re-opens
+the breaker.
+
+While a breaker is open, or when a call fails because of Graph itself,
+read-only calls are answered from the last known good
+response for the same request (room directory, user lookups, schedules). Tools
+decorated with @serve_stale get such answers clearly marked as stale.
+"""
+import asyncio
+import functools
+import json
+import logging
+import math
+import os
+import re
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+import httpx
+
+import deadlines
+import tracing
+from caches import TTLCache
+
+logger = logging.getLogger(__name__)
+
+FAILURE_RATE = float(os.getenv("GRAPH_BREAKER_FAILURE_RATE", "0.5"))
+MIN_REQUESTS = int(os.getenv("GRAPH_BREAKER_MIN_REQUESTS", "5"))
+WINDOW_SECONDS = float(os.getenv("GRAPH_BREAKER_WINDOW_SECONDS", "60"))
+OPEN_SECONDS = float(os.getenv("GRAPH_BREAKER_OPEN_SECONDS", "30"))
+LAST_KNOWN_GOOD_TTL_SECONDS = int(os.getenv("GRAPH_LAST_KNOWN_GOOD_TTL_SECONDS", "86400"))
+
+# POST actions that only read data and can therefore be served from the last known good response
+READ_ONLY_ACTIONS = ("/getSchedule", "/findMeetingTimes")
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_rate: float = FAILURE_RATE, min_requests: int = MIN_REQUESTS,
+                 window_seconds: float = WINDOW_SECONDS, open_seconds: float = OPEN_SECONDS):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.outcomes = deque()  # (timestamp, failed)
+
+    def before_call(self) -> bool:
+        """
+        Raise CircuitOpenError if the call must not go to Graph right now.
+        Returns True when the call is the half-open probe.
+        """
+        if self.state == CLOSED:
+            return False
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+        raise CircuitOpenError(f"Graph endpoint {self.name} is unavailable (circuit open), retry later")
+
+    def abandon_probe(self):
+        """The probe ended without telling anything about Graph (cancelled, deadline): let the next call probe."""
+        if self.state == HALF_OPEN:
+            self.probe_in_flight = False
+
+    def record(self, failed: bool):
+        now = time.monotonic()
+        if self.state == HALF_OPEN:
+            self.probe_in_flight = False
+            if failed:
+                self._open(now)
+            else:
+                logger.info(f"Circuit for {self.name} closed again")
+                self.state = CLOSED
+                self.outcomes.clear()
+            return
+
+        self.outcomes.append((now, failed))
+        while self.outcomes and now - self.outcomes[0][0] > self.window_seconds:
+            self.outcomes.popleft()
+        failures = sum(1 for _, f in self.outcomes if f)
+        if self.state == CLOSED and len(self.outcomes) >= self.min_requests and failures / len(self.outcomes) >= self.failure_rate:
+            self._open(now)
+
+    def _open(self, now: float):
+        logger.warning(f"Circuit for {self.name} opened")
+        self.state = OPEN
+        self.opened_at = now
+        self.outcomes.clear()
+
+
+breakers: Dict[str, CircuitBreaker] = {}
+last_known_good = TTLCache("last_known_good", LAST_KNOWN_GOOD_TTL_SECONDS, max_entries=256, shared=True)
+
+_ID_SEGMENT = re.compile(r"/[^/]*(@|[0-9a-fA-F]{8}-[0-9a-fA-F]{4})[^/]*")
+
+
+def endpoint_name(endpoint: str) -> str:
+    """Group requests by endpoint: drop the query and collapse ids/mailboxes in the path."""
+    path = endpoint.split("?", 1)[0].replace("https://graph.microsoft.com/v1.0", "")
+    return _ID_SEGMENT.sub("/{id}", path)
+
+
+def breaker_for(endpoint: str) -> CircuitBreaker:
+    name = endpoint_name(endpoint)
+    if name not in breakers:
+        breakers[name] = CircuitBreaker(name)
+    return breakers[name]
+
+
+def is_failure(error: Exception) -> bool:
+    """Whether an error says something about Graph's health (client errors do not)."""
+    if not isinstance(error, httpx.HTTPError) and isinstance(error.__cause__, httpx.HTTPError):
+        error = error.__cause__
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delay-seconds or HTTP-date); None if absent or unparsable."""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+        return max(0.0, seconds) if math.isfinite(seconds) else None
+    except ValueError:
+        pass
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max(0.0, (moment - datetime.now(timezone.utc)).total_seconds())
+
+
+async def guarded_call(send, method: str, endpoint: str, data: Optional[dict] = None, params: Optional[dict] = None):
+    """
+    Run `send(method, endpoint, data, params)` behind the endpoint's breaker.
+
+    Successful read-only responses are remembered; while the breaker is open (or
+    when Graph times out / errors server-side) they are returned instead of
+    failing and the current tool call is marked stale.
+    """
+    breaker = breaker_for(endpoint)
+    read_only = method == "GET" or endpoint.endswith(READ_ONLY_ACTIONS)
+    key = (method, endpoint, json.dumps(data, sort_keys=True), json.dumps(params, sort_keys=True, default=str))
+
+    def serve_last_known_good():
+        entry = last_known_good.get_entry(key) if read_only else None
+        if entry is None:
+            return None
+        mark_stale(breaker.name, entry[1])
+        tracing.current_span().set_attribute("graph.served_stale", True)
+        return entry
+
+    tracing.current_span().set_attribute("graph.breaker_state", breaker.state)
+
+    try:
+        probe = breaker.before_call()
+    except CircuitOpenError:
+        entry = serve_last_known_good()
+        if entry is None:
+            raise
+        return entry[0]
+
+    try:
+        result = await send(method, endpoint, data, params)
+    except (asyncio.CancelledError, deadlines.DeadlineExceeded):
+        # Cut short by the caller, not answered by Graph: neither a success nor a failure
+        if probe:
+            breaker.abandon_probe()
+        raise
+    except Exception as e:
+        failed = is_failure(e)
+        breaker.record(failed)
+        # Graph itself is struggling: an older answer is more useful than an error
+        entry = serve_last_known_good() if failed else None
+        if entry is None:
+            raise
+        return entry[0]
+    breaker.record(False)
+    if read_only:
+        last_known_good.set(key, result)
+    return result
+
+
+# --- Degraded-mode marking -------------------------------------------------
+
+_stale_sources: ContextVar[Optional[dict]] = ContextVar("stale_sources", default=None)
+
+
+def mark_stale(source: str, fetched_at: float):
+    """Record that the current tool call used cached data for `source`."""
+    sources = _stale_sources.get()
+    if sources is not None:
+        sources[source] = min(fetched_at, sources.get(source, fetched_at))
+
+
+def _stale_note(sources: dict, as_of: str) -> str:
+    return f"STALE: Graph is unavailable, served cached data for {', '.join(sorted(sources))} (as of {as_of})"
+
+
+def serve_stale(tool):
+    """
+    Tool decorator: if any cached data was served while a breaker was open,
+    mark the result as stale without changing its shape.
+    """
+    @functools.wraps(tool)
+    async def wrapper(*args, **kwargs):
+        token = _stale_sources.set({})
+        try:
+            result = await tool(*args, **kwargs)
+            sources = _stale_sources.get()
+        finally:
+            _stale_sources.reset(token)
+        if not sources:
+            return result
+
+        as_of = datetime.fromtimestamp(min(sources.values())).isoformat(timespec="seconds")
+        note = _stale_note(sources, as_of)
+        if isinstance(result, dict):
+            return {**result, "stale": True, "stale_note": note}
+        if isinstance(result, list) and result and all(isinstance(item, dict) for item in result):
+            return [{**item, "stale": True, "stale_as_of": as_of} for item in result]
+        if isinstance(result, list):
+            return result + [note]
+        return f"{result}\n{note}"
+
+    return wrapper
@@ -0,0 +1,218 @@
+"""
+Outlook desktop (COM) work on a small pool of dedicated worker threads.
+
+COM objects belong to the apartment (thread) that created them, so each worker
+initialises its own single-threaded apartment and holds its own
+Outlook.Application / MAPI namespace (and its own resolved recipients) for its
+whole life. Callers never touch COM: they queue jobs and get a
+concurrent.futures.Future back, so
+
+- the Tk UI keeps running (poll future.done() with root.after),
+- async code can `await asyncio.wrap_future(future)`,
+- per-recipient FreeBusy / Resolve lookups run concurrently across the workers.
+
+Everything COM-specific is behind the Provider interface; OutlookProvider is
+the real one (pywin32 is only imported inside the worker threads), so the
+queueing can run on any platform with another Provider.
+
+Configuration:
+    OUTLOOK_COM_WORKERS   worker threads in the default pool (default 3)
+"""
+import logging
+import os
+import queue
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+COM_WORKERS = int(os.getenv("OUTLOOK_COM_WORKERS", "3"))
+
+
+class Provider(ABC):
+    """Calendar operations of one worker thread; open() and close() run on that thread."""
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    @abstractmethod
+    def resolve(self, address: str) -> bool:
+        """Whether the address resolves to a recipient."""
+
+    @abstractmethod
+    def free_busy(self, address: str, start: datetime, interval: int, complete: bool = False) -> Optional[str]:
+        """Free/busy string from local midnight of `start`, one character per `interval` minutes (None if unresolved)."""
+
+    @abstractmethod
+    def create_meeting(self, subject: str, body: str, required_emails: List[str], start: datetime, end: datetime):
+        """Open a meeting request window for the user to review and send."""
+
+
+class OutlookProvider(Provider):
+    def open(self):
+        import pythoncom
+        import win32com.client
+
+        pythoncom.CoInitialize()
+        self.application = win32com.client.Dispatch("Outlook.Application")
+        self.namespace = self.application.GetNamespace("MAPI")
+        # address -> resolved Recipient (or None); only valid on this thread
+        self.recipients: Dict[str, Any] = {}
+
+    def close(self):
+        import pythoncom
+
+        self.recipients = {}
+        self.namespace = self.application = None
+        pythoncom.CoUninitialize()
+
+    def _recipient(self, address: str):
+        key = address.strip().lower()
+        if key not in self.recipients:
+            recipient = self.namespace.CreateRecipient(address.strip())
+            recipient.Resolve()
+            self.recipients[key] = recipient if recipient.Resolved else None
+        return self.recipients[key]
+
+    def resolve(self, address: str) -> bool:
+        return self._recipient(address) is not None
+
+    def free_busy(self, address: str, start: datetime, interval: int, complete: bool = False) -> Optional[str]:
+        recipient = self._recipient(address)
+        return None if recipient is None else recipient.FreeBusy(start, interval, complete)
+
+    def create_meeting(self, subject: str, body: str, required_emails: List[str], start: datetime, end: datetime):
+        meeting = self.application.CreateItem(1)  # olAppointmentItem
+        meeting.Subject = subject
+        meeting.Body = body
+        meeting.Start = start
+        meeting.End = end
+        meeting.MeetingStatus = 1  # olMeeting
+        for email in required_emails:
+            if email.strip():
+                try:
+                    meeting.Recipients.Add(email.strip())
+                except Exception:
+                    pass
+        meeting.Recipients.ResolveAll()
+        meeting.Display()
+
+
+class ComPool:
+    """Worker threads that each own one Provider; jobs are taken from one queue in order."""
+
+    def __init__(self, provider_factory: Callable[[], Provider] = OutlookProvider, workers: int = COM_WORKERS):
+        self.provider_factory = provider_factory
+        self.workers = max(1, workers)
+        self.jobs: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self.threads: List[threading.Thread] = []
+        self.lock = threading.Lock()
+
+    def _start(self):
+        with self.lock:
+            if self.threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"outlook-com-{i}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def _work(self):
+        provider = self.provider_factory()
+        try:
+            provider.open()
+            error = None
+        except Exception as e:
+            logger.error(f"COM worker could not connect to Outlook: {e}")
+            error = e
+        try:
+            while True:
+                job = self.jobs.get()
+                if job is None:
+                    return
+                fn, future = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                    continue
+                try:
+                    future.set_result(fn(provider))
+                except Exception as e:
+                    future.set_exception(e)
+        finally:
+            if error is None:
+                try:
+                    provider.close()
+                except Exception as e:
+                    logger.warning(f"Closing COM worker failed: {e}")
+
+    def submit(self, fn: Callable[[Provider], Any]) -> Future:
+        """Run fn(provider) on one of the workers."""
+        self._start()
+        future = Future()
+        self.jobs.put((fn, future))
+        return future
+
+    def resolve(self, address: str) -> Future:
+        return self.submit(lambda provider: provider.resolve(address))
+
+    def free_busy(self, address: str, start: datetime, interval: int, complete: bool = False) -> Future:
+        return self.submit(lambda provider: provider.free_busy(address, start, interval, complete))
+
+    def create_meeting(self, subject: str, body: str, required_emails: List[str], start: datetime, end: datetime) -> Future:
+        return self.submit(lambda provider: provider.create_meeting(subject, body, required_emails, start, end))
+
+    def shutdown(self):
+        """Let the workers finish queued jobs, then stop them."""
+        with self.lock:
+            threads, self.threads = self.threads, []
+        for _ in threads:
+            self.jobs.put(None)
+        for thread in threads:
+            thread.join()
+
+
+def when_all(futures: List[Future], then: Callable[[List[Any]], Any]) -> Future:
+    """Future of then([results...]) once every future is done (failing with the first error)."""
+    combined = Future()
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def finish():
+        try:
+            combined.set_result(then([future.result() for future in futures]))
+        except Exception as e:
+            combined.set_exception(e)
+
+    def done(_):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            finish()
+
+    if not futures:
+        finish()
+    for future in futures:
+        future.add_done_callback(done)
+    return combined
+
+
+_default_pool: Optional[ComPool] = None
+_default_lock = threading.Lock()
+
+
+def default_pool() -> ComPool:
+    """Process-wide pool of OutlookProvider workers, created on first use."""
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = ComPool()
+        return _default_pool
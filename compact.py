@@ -0,0 +1,47 @@
+"""
+Compact, columnar encodings for tool results.
+
+Large slot and room lists repeat the same keys and date prefixes on every
+entry; these encodings state them once, which cuts serialization size and the
+tokens an agent has to read. Selected per call with output_format="compact", or
+for every call with MCP_OUTPUT_FORMAT=compact.
+"""
+import os
+from typing import Iterable, List, Optional, Tuple
+
+DEFAULT_OUTPUT_FORMAT = os.getenv("MCP_OUTPUT_FORMAT", "default")
+
+
+def is_compact(output_format: Optional[str]) -> bool:
+    return (output_format or DEFAULT_OUTPUT_FORMAT) == "compact"
+
+
+def columns(records: List[dict], fields: Iterable[str]) -> dict:
+    """[{"name": a, "email": b}, ...] -> {"columns": ["name", "email"], "rows": [[a, b], ...]}"""
+    fields = list(fields)
+    return {"columns": fields, "rows": [[record.get(f) for f in fields] for record in records]}
+
+
+def slots_by_day(slots: List[Tuple[str, str]]) -> dict:
+    """
+    [("2026-11-02T08:00:00", "2026-11-02T08:30:00"), ...] ->
+    {"2026-11-02": [["08:00", "08:30"], ...]}, ISO date-times of any precision.
+    """
+    days = {}
+    for start, end in slots:
+        days.setdefault(start[:10], []).append([start[11:16], end[11:16]])
+    return days
+
+
+def format_slots(slots: List[Tuple[str, str]], output_format: Optional[str] = None):
+    """Slot list as "{start} to {end}" strings, or grouped per day when compact."""
+    if is_compact(output_format):
+        return {"slots_by_day": slots_by_day(slots)}
+    return [f"{start} to {end}" for start, end in slots]
+
+
+def format_records(records: List[dict], fields: Iterable[str], output_format: Optional[str] = None):
+    """Record list as is, or columnar when compact."""
+    if is_compact(output_format):
+        return columns(records, fields)
+    return records
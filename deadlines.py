@@ -0,0 +1,158 @@
+"""
+Deadline budgets for tool calls, propagated to every Graph request they make.
+
+Each tool invocation decorated with @bounded gets MCP_TOOL_DEADLINE_SECONDS
+(a tighter deadline already in force wins). The deadline lives in a context
+variable, so it follows the call into sub-tasks without being passed around:
+- every Graph request's timeout is cut to the time left, and a request that
+  would start after the deadline is not sent (DeadlineExceeded),
+- waiting for a Graph slot (fair_scheduler) gives up at the deadline,
+- fan-outs (getSchedule batches and windows) use gather_partial: shortly before
+  the deadline the unfinished requests are cancelled and the tool answers with
+  what arrived, marked as partial.
+If the MCP client cancels the call, the cancellation propagates the same way
+and outstanding sub-requests are cancelled.
+
+Background work (cache revalidation, booking worker, subscriptions) runs with
+unbounded() so it is not cut short by the tool call that started it.
+"""
+import asyncio
+import functools
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+TOOL_DEADLINE_SECONDS = float(os.getenv("MCP_TOOL_DEADLINE_SECONDS", "25"))
+# Time kept back from fan-outs to assemble and return the partial answer
+FANOUT_RESERVE_SECONDS = float(os.getenv("MCP_DEADLINE_RESERVE_SECONDS", "0.5"))
+
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+_partial: ContextVar[Optional[List[str]]] = ContextVar("partial_results", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+def remaining() -> Optional[float]:
+    """Seconds left until the current deadline (None when there is none)."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check(what: str = "Graph request"):
+    """Raise DeadlineExceeded if the current deadline has passed."""
+    left = remaining()
+    if left is not None and left <= 0:
+        REGISTRY.inc("deadline.exceeded")
+        raise DeadlineExceeded(f"{what} abandoned: the tool call's deadline has passed")
+
+
+def timeout(default: float) -> float:
+    """`default` shortened to the time left before the deadline."""
+    left = remaining()
+    return default if left is None else max(min(default, left), 0.001)
+
+
+@contextmanager
+def budget(seconds: float):
+    """Run a block with at most `seconds` left (an earlier existing deadline is kept)."""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@contextmanager
+def unbounded():
+    """Run a block (e.g. spawning a background task) without the current deadline."""
+    token = _deadline.set(None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def mark_partial(note: str):
+    """Record that the current tool call's answer is missing part of its data."""
+    notes = _partial.get()
+    if notes is not None:
+        notes.append(note)
+
+
+async def gather_partial(*aws, what: str = "requests") -> list:
+    """
+    asyncio.gather that stops waiting shortly before the deadline.
+
+    Unfinished awaitables are cancelled and come back as None; the call is then
+    marked partial. An exception from a finished one is raised as with gather
+    (after cancelling the rest).
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    if not tasks:
+        return []
+    left = remaining()
+    wait_seconds = None if left is None else max(left - FANOUT_RESERVE_SECONDS, 0)
+    try:
+        done, pending = await asyncio.wait(tasks, timeout=wait_seconds)
+    except asyncio.CancelledError:
+        for task in tasks:
+            task.cancel()
+        raise
+    for task in pending:
+        task.cancel()
+    if pending:
+        REGISTRY.inc("deadline.partial")
+        logger.warning(f"Deadline reached: {len(pending)} of {len(tasks)} {what} abandoned")
+        mark_partial(f"{len(pending)} of {len(tasks)} {what} did not finish before the deadline")
+
+    for task in tasks:
+        if task in done and not task.cancelled() and task.exception() is not None:
+            raise task.exception()
+    return [task.result() if task in done else None for task in tasks]
+
+
+def _annotate(result, notes: List[str]):
+    note = "PARTIAL: " + "; ".join(notes)
+    if isinstance(result, dict):
+        return {**result, "partial": True, "partial_note": note}
+    if isinstance(result, list):
+        return result + [note]
+    return f"{result}\n{note}"
+
+
+def bounded(tool):
+    """
+    Tool decorator: run the call under a TOOL_DEADLINE_SECONDS budget and mark
+    answers assembled from partial data.
+    """
+    @functools.wraps(tool)
+    async def wrapper(*args, **kwargs):
+        token = _partial.set([])
+        try:
+            with budget(TOOL_DEADLINE_SECONDS):
+                try:
+                    # Backstop for work that does not check the deadline itself
+                    async with asyncio.timeout(remaining()):
+                        result = await tool(*args, **kwargs)
+                except DeadlineExceeded:
+                    raise
+                except TimeoutError as e:
+                    REGISTRY.inc("deadline.exceeded")
+                    raise DeadlineExceeded(f"{tool.__name__} did not finish within {TOOL_DEADLINE_SECONDS:g}s") from e
+            notes = _partial.get()
+        finally:
+            _partial.reset(token)
+        return _annotate(result, notes) if notes else result
+
+    return wrapper
@@ -0,0 +1,136 @@
+"""
+Cached directory lookups shared by both MCP servers: the room catalog, the
+signed-in user's most relevant people (/me/people, ranked by Graph) and the
+group / distribution list membership index used to expand attendee lists.
+
+Like scheduling.py, functions take the server's Graph `call` coroutine.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Tuple
+
+import paging
+from caches import TTLCache
+
+logger = logging.getLogger(__name__)
+
+ROOM_CATALOG_TTL_SECONDS = int(os.getenv("ROOM_CATALOG_TTL_SECONDS", "3600"))
+PEOPLE_TTL_SECONDS = int(os.getenv("PEOPLE_TTL_SECONDS", "3600"))
+GROUP_MEMBERS_TTL_SECONDS = int(os.getenv("GROUP_MEMBERS_TTL_SECONDS", "3600"))
+# After a failed group lookup (e.g. GroupMember.Read.All not granted), skip expansion this long
+GROUP_LOOKUP_RETRY_SECONDS = int(os.getenv("GROUP_LOOKUP_RETRY_SECONDS", "600"))
+
+# $filter "mail in (...)" takes at most 15 values; member pages hold at most 999 entries
+GROUP_LOOKUPS_PER_CALL = 15
+MEMBERS_PAGE_SIZE = 999
+
+# cost: Graph calls (pages) a refetch takes, roughly
+room_catalog = TTLCache("rooms", ROOM_CATALOG_TTL_SECONDS, max_entries=1, shared=True, cost=10)
+relevant_people = TTLCache("people", PEOPLE_TTL_SECONDS, max_entries=64)
+# Membership index: address -> group id ("" when the address is not a group), group id -> member addresses
+group_ids = TTLCache("group_ids", GROUP_MEMBERS_TTL_SECONDS, max_entries=8192, shared=True)
+group_members = TTLCache("group_members", GROUP_MEMBERS_TTL_SECONDS, max_entries=1024, shared=True, cost=3)
+# time.monotonic() until which group lookups are not attempted
+_groups_unavailable_until = 0.0
+
+
+async def get_rooms(call) -> List[dict]:
+    """All rooms in the tenant's place directory (cached, the catalog rarely changes)."""
+    rooms = room_catalog.get("rooms")
+    if rooms is None:
+        rooms = await paging.take(call, "/places/microsoft.graph.room", {"$select": "displayName,emailAddress"})
+        room_catalog.set("rooms", rooms)
+    return rooms
+
+
+async def get_relevant_people(call, top: int = 10) -> List[str]:
+    """Email addresses of the colleagues the signed-in user works with most (People.Read)."""
+    people = relevant_people.get((call, top))
+    if people is None:
+        params = {
+            "$top": top,
+            "$select": "scoredEmailAddresses",
+            "$filter": "personType/class eq 'Person' and personType/subclass eq 'OrganizationUser'"
+        }
+        data = await call("GET", "/me/people", params=params)
+        people = []
+        for person in data.get("value", []):
+            addresses = person.get("scoredEmailAddresses") or []
+            if addresses and addresses[0].get("address"):
+                people.append(addresses[0]["address"].lower())
+        relevant_people.set((call, top), people)
+    return people
+
+
+async def lookup_groups(call, emails: List[str]) -> Dict[str, str]:
+    """Group id of every address that is a group or distribution list (others are left out)."""
+    global _groups_unavailable_until
+    emails = list(dict.fromkeys(e.lower() for e in emails if e))
+    unknown = [e for e in emails if group_ids.get(e) is None]
+    if unknown and time.monotonic() < _groups_unavailable_until:
+        unknown = []
+
+    async def lookup(batch):
+        quoted = ",".join("'" + e.replace("'", "''") + "'" for e in batch)
+        data = await call("GET", "/groups", params={"$filter": f"mail in ({quoted})", "$select": "id,mail"})
+        found = {(g.get("mail") or "").lower(): g["id"] for g in data.get("value", [])}
+        for email in batch:
+            group_ids.set(email, found.get(email, ""))
+
+    results = await asyncio.gather(*(
+        lookup(unknown[i:i + GROUP_LOOKUPS_PER_CALL]) for i in range(0, len(unknown), GROUP_LOOKUPS_PER_CALL)
+    ), return_exceptions=True)
+    failures = [result for result in results if isinstance(result, Exception)]
+    if failures:
+        # e.g. GroupMember.Read.All not granted: those addresses are taken literally for a while
+        _groups_unavailable_until = time.monotonic() + GROUP_LOOKUP_RETRY_SECONDS
+        logger.warning(f"Group lookup failed, treating addresses as individuals for "
+                       f"{GROUP_LOOKUP_RETRY_SECONDS}s: {failures[0]}")
+    return {e: group_ids.get(e) for e in emails if group_ids.get(e)}
+
+
+async def get_group_members(call, group_id: str) -> List[str]:
+    """Email addresses of a group's users, nested groups included (cached)."""
+    members = group_members.get(group_id)
+    if members is not None:
+        return members
+
+    members, seen, pending = [], {group_id}, [group_id]
+    while pending:
+        current = pending.pop()
+        direct = await paging.take(call, f"/groups/{current}/members", {"$select": "id,mail,userPrincipalName"},
+                                 page_size=MEMBERS_PAGE_SIZE)
+        for member in direct:
+            if member.get("@odata.type") == "#microsoft.graph.group":
+                if member["id"] not in seen:
+                    seen.add(member["id"])
+                    pending.append(member["id"])
+                continue
+            address = member.get("mail") or member.get("userPrincipalName")
+            if address:
+                members.append(address.lower())
+    members = list(dict.fromkeys(members))
+    group_members.set(group_id, members)
+    return members
+
+
+async def expand_attendees(call, emails: List[str]) -> Tuple[List[str], Dict[str, int]]:
+    """
+    Replace group / distribution list addresses by their members.
+    Returns (individual addresses without duplicates, {group address: member count}).
+    """
+    groups = await lookup_groups(call, emails)
+    results = await asyncio.gather(*(get_group_members(call, gid) for gid in groups.values()), return_exceptions=True)
+    expanded = {}
+    for group, members in zip(groups, results):
+        if isinstance(members, Exception):
+            logger.warning(f"Could not expand group {group}, keeping the address as is: {members}")
+        else:
+            expanded[group] = members
+
+    people = []
+    for email in (e.lower() for e in emails if e):
+        people.extend(expanded.get(email, [email]))
+    return list(dict.fromkeys(people)), {group: len(members) for group, members in expanded.items()}
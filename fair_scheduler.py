@@ -0,0 +1,158 @@
+"""
+Priority-aware fair scheduling of Graph calls (used by main.py's multi-user GraphClient).
+
+At most GRAPH_MAX_CONCURRENCY Graph calls run at once. Callers beyond that wait
+in per-priority queues, and within a priority class users are served round-robin,
+one call per turn. One user's bulk sweep therefore only delays other users'
+lookups by one call per round, instead of queueing them behind the whole sweep.
+
+Priority classes (lower runs first):
+    INTERACTIVE  tool calls (default)
+    PREFETCH     cache warm-up
+    BACKGROUND   background revalidation, subscription upkeep
+A waiting call whose wait exceeds GRAPH_SCHED_AGING_SECONDS is served before
+higher classes, so background work is slowed but never starved.
+
+Waiting gives up at the tool call's deadline (see deadlines.py).
+
+The class comes from a context variable: set_priority() inside a background
+task, or `with priority(...)` around a block. Queue depth, in-flight calls and
+wait times are published to metrics.REGISTRY under graph_scheduler.*.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import deadlines
+import tracing
+from metrics import REGISTRY
+
+MAX_CONCURRENCY = int(os.getenv("GRAPH_MAX_CONCURRENCY", "8"))
+AGING_SECONDS = float(os.getenv("GRAPH_SCHED_AGING_SECONDS", "5"))
+
+INTERACTIVE, PREFETCH, BACKGROUND = 0, 1, 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", PREFETCH: "prefetch", BACKGROUND: "background"}
+
+_priority: ContextVar[int] = ContextVar("graph_priority", default=INTERACTIVE)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+def set_priority(level: int):
+    """Set the priority class for the rest of the current task."""
+    _priority.set(level)
+
+
+@contextmanager
+def priority(level: int):
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class FairScheduler:
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY, aging_seconds: float = AGING_SECONDS):
+        self.max_concurrency = max_concurrency
+        self.aging_seconds = aging_seconds
+        self.in_flight = 0
+        # priority -> user -> waiting (enqueued_at, future); user order is the round-robin order
+        self.queues = {level: OrderedDict() for level in PRIORITY_NAMES}
+
+    def _waiting(self) -> int:
+        return sum(len(waiters) for users in self.queues.values() for waiters in users.values())
+
+    async def run(self, user: str, call):
+        """Run `call()` (a coroutine function) once `user` gets a slot."""
+        level = current_priority()
+        name = PRIORITY_NAMES[level]
+        enqueued_at = time.monotonic()
+        REGISTRY.inc("graph_scheduler.calls", priority=name)
+
+        if self.in_flight < self.max_concurrency and not self._waiting():
+            self.in_flight += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self.queues[level].setdefault(user, deque()).append((enqueued_at, future))
+            self._publish()
+            try:
+                # Give up waiting at the tool call's deadline
+                with tracing.span("graph.queue_wait", **{"graph.priority": name}):
+                    async with asyncio.timeout(deadlines.remaining()):
+                        await future
+            except (asyncio.CancelledError, TimeoutError) as e:
+                if future.done() and not future.cancelled():
+                    # Granted a slot just before being cancelled: hand it on
+                    self._release()
+                else:
+                    self._withdraw(level, user, future)
+                if isinstance(e, TimeoutError):
+                    raise deadlines.DeadlineExceeded("Graph request abandoned waiting for a slot at the deadline") from None
+                raise
+        REGISTRY.observe("graph_scheduler.wait_ms", (time.monotonic() - enqueued_at) * 1000, priority=name)
+
+        try:
+            return await call()
+        finally:
+            self._release()
+
+    def _withdraw(self, level: int, user: str, future):
+        waiters = self.queues[level].get(user)
+        if waiters is None:
+            return
+        for entry in waiters:
+            if entry[1] is future:
+                waiters.remove(entry)
+                break
+        if not waiters:
+            del self.queues[level][user]
+        self._publish()
+
+    def _release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self.in_flight < self.max_concurrency:
+            future = self._next_waiter()
+            if future is None:
+                break
+            self.in_flight += 1
+            future.set_result(None)
+        self._publish()
+
+    def _next_waiter(self):
+        while True:
+            classes = [level for level in sorted(self.queues) if self.queues[level]]
+            if not classes:
+                return None
+            chosen = classes[0]
+            now = time.monotonic()
+            for level in classes[1:]:
+                oldest = min(waiters[0][0] for waiters in self.queues[level].values())
+                if now - oldest > self.aging_seconds:
+                    chosen = level
+                    break
+
+            # Round-robin: serve the first user in line, then move them to the back
+            users = self.queues[chosen]
+            user, waiters = next(iter(users.items()))
+            _, future = waiters.popleft()
+            del users[user]
+            if waiters:
+                users[user] = waiters
+            if not future.done():
+                return future
+
+    def _publish(self):
+        REGISTRY.set_gauge("graph_scheduler.in_flight", self.in_flight)
+        for level, users in self.queues.items():
+            depth = sum(len(waiters) for waiters in users.values())
+            REGISTRY.set_gauge("graph_scheduler.queue_depth", depth, priority=PRIORITY_NAMES[level])
+        REGISTRY.set_gauge("graph_scheduler.waiting_users", len({u for users in self.queues.values() for u in users}))
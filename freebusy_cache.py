@@ -0,0 +1,245 @@
+"""
+On-disk free/busy snapshot cache that survives server restarts.
+
+availabilityView strings are stored in SQLite, one row per mailbox per UTC day
+bucket and slot interval, together with the time they were fetched.
+Reads follow stale-while-revalidate: entries younger than FREEBUSY_FRESH_SECONDS
+are served as is, entries up to FREEBUSY_MAX_STALE_SECONDS old are served
+immediately while a background fetch refreshes them, anything older is fetched
+before answering. Buckets for days older than FREEBUSY_RETENTION_DAYS are
+removed by compact(), at start-up and then every FREEBUSY_COMPACT_EVERY_SECONDS
+(checked on writes, run on a worker thread). Freed pages are reused by later
+writes; the file is not vacuumed.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import circuit_breaker
+import deadlines
+import fair_scheduler
+import shared_cache
+import tracing
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = os.getenv("FREEBUSY_CACHE_PATH", os.path.join(os.path.dirname(__file__), "freebusy_cache.db"))
+FRESH_SECONDS = int(os.getenv("FREEBUSY_FRESH_SECONDS", "60"))
+MAX_STALE_SECONDS = int(os.getenv("FREEBUSY_MAX_STALE_SECONDS", "3600"))
+RETENTION_DAYS = int(os.getenv("FREEBUSY_RETENTION_DAYS", "1"))
+COMPACT_EVERY_SECONDS = int(os.getenv("FREEBUSY_COMPACT_EVERY_SECONDS", "3600"))
+
+
+class FreeBusyCache:
+    def __init__(self, path: str = CACHE_PATH, fresh_seconds: int = FRESH_SECONDS,
+                 max_stale_seconds: int = MAX_STALE_SECONDS, retention_days: int = RETENTION_DAYS):
+        self.fresh_seconds = fresh_seconds
+        self.max_stale_seconds = max_stale_seconds
+        self.retention_days = retention_days
+        # WAL: several worker processes may use the same file (see serve_workers.py)
+        self.db = shared_cache.connect(path)
+        # Compaction (on a worker thread) and the server loop share this connection
+        self.lock = threading.Lock()
+        with self.lock:
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS freebusy ("
+                " mailbox TEXT NOT NULL,"
+                " bucket TEXT NOT NULL,"
+                " interval INTEGER NOT NULL,"
+                " view TEXT NOT NULL,"
+                " fetched_at REAL NOT NULL,"
+                " PRIMARY KEY (mailbox, bucket, interval))"
+            )
+            # Small values remembered across restarts (e.g. the signed-in user's mailbox), each with an expiry
+            if "expires_at" not in [row[1] for row in self.db.execute("PRAGMA table_info(meta)")]:
+                self.db.execute("DROP TABLE IF EXISTS meta")
+            self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+            self.db.commit()
+        self.compact()
+        self._refreshing = set()
+        self._tasks = set()
+
+    def get_many(self, mailboxes: List[str], days: List[date], interval: int) -> Dict[Tuple[str, date], Tuple[str, float]]:
+        """Return {(mailbox, day): (view, fetched_at)} for every bucket present on disk."""
+        if not mailboxes or not days:
+            return {}
+        buckets = {d.isoformat(): d for d in days}
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT mailbox, bucket, view, fetched_at FROM freebusy"
+                f" WHERE interval = ? AND mailbox IN ({','.join('?' * len(mailboxes))})"
+                f" AND bucket IN ({','.join('?' * len(buckets))})",
+                [interval, *[m.lower() for m in mailboxes], *buckets]
+            ).fetchall()
+        return {(mailbox, buckets[bucket]): (view, fetched_at) for mailbox, bucket, view, fetched_at in rows}
+
+    def put_views(self, views: Dict[str, str], start_day: date, num_days: int, interval: int, fetched_at: Optional[float] = None):
+        """Split multi-day availabilityViews into per-day buckets and store them."""
+        fetched_at = fetched_at or time.time()
+        slots_per_day = 24 * 60 // interval
+        rows = []
+        for mailbox, view in views.items():
+            for i in range(num_days):
+                day_view = view[i * slots_per_day:(i + 1) * slots_per_day]
+                if len(day_view) == slots_per_day:
+                    rows.append((mailbox.lower(), (start_day + timedelta(days=i)).isoformat(), interval, day_view, fetched_at))
+        with self.lock:
+            self.db.executemany("INSERT OR REPLACE INTO freebusy VALUES (?, ?, ?, ?, ?)", rows)
+            self.db.commit()
+        if time.monotonic() - self.compacted_at > COMPACT_EVERY_SECONDS:
+            self.compacted_at = time.monotonic()
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                self.compact()
+            else:
+                # Keep the DELETE (and the lock it holds) off the event loop
+                self.spawn(asyncio.to_thread(self.compact))
+
+    def get_meta(self, key: str) -> Optional[str]:
+        """Value stored with set_meta, or None if missing or expired."""
+        with self.lock:
+            row = self.db.execute("SELECT value FROM meta WHERE key = ? AND expires_at > ?", (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str, ttl_seconds: float):
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?, ?)", (key, value, time.time() + ttl_seconds))
+            self.db.commit()
+
+    def invalidate(self, mailbox: str, day: Optional[date] = None):
+        """Drop cached buckets for a mailbox (one day or all of them)."""
+        with self.lock:
+            if day:
+                self.db.execute("DELETE FROM freebusy WHERE mailbox = ? AND bucket = ?", (mailbox.lower(), day.isoformat()))
+            else:
+                self.db.execute("DELETE FROM freebusy WHERE mailbox = ?", (mailbox.lower(),))
+            self.db.commit()
+
+    def compact(self) -> int:
+        """Delete buckets for past days, rows too old to ever be served again and expired meta values."""
+        self.compacted_at = time.monotonic()
+        oldest_day = (date.today() - timedelta(days=self.retention_days)).isoformat()
+        with self.lock:
+            deleted = self.db.execute(
+                "DELETE FROM freebusy WHERE bucket < ? OR fetched_at < ?",
+                (oldest_day, time.time() - self.max_stale_seconds)
+            ).rowcount
+            self.db.execute("DELETE FROM meta WHERE expires_at <= ?", (time.time(),))
+            self.db.commit()
+        return deleted
+
+    def _revalidate(self, call, fetch, emails: List[str], start_day: date, num_days: int, interval: int):
+        """Refresh buckets in the background, at most one refresh per key at a time."""
+        key = (tuple(sorted(emails)), start_day, num_days, interval)
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+
+        async def refresh():
+            try:
+                views = await fetch(call, emails, start_day, num_days, interval)
+                self.put_views(views, start_day, num_days, interval)
+            except Exception as e:
+                logger.warning(f"Background free/busy refresh failed: {e}")
+            finally:
+                self._refreshing.discard(key)
+
+        self.spawn(refresh())
+
+    def spawn(self, coro):
+        """
+        Run a coroutine in the background (lowest Graph priority, not bound by the
+        calling tool's deadline), keeping a reference until it finishes.
+        """
+        with fair_scheduler.priority(fair_scheduler.BACKGROUND), deadlines.unbounded():
+            task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def peek(self, call, fetch, emails: List[str], start_day: date, num_days: int, interval: int = 30) -> Optional[Dict[str, str]]:
+        """
+        Serve views purely from disk if every mailbox is cached within the staleness bound.
+
+        Stale mailboxes are revalidated in the background. On a miss nothing is
+        returned and the missing mailboxes are fetched in the background, so the
+        next query for the same collaborators is answered from the cache.
+        """
+        views, missing, stale = self._lookup(emails, start_day, num_days, interval)
+        if stale:
+            self._revalidate(call, fetch, stale, start_day, num_days, interval)
+        if missing:
+            self._revalidate(call, fetch, missing, start_day, num_days, interval)
+            return None
+        return views
+
+    def cached_views(self, emails: List[str], start_day: date, num_days: int, interval: int = 30) -> Dict[str, str]:
+        """Views of the mailboxes cached within the staleness bound; never touches Graph."""
+        return self._lookup(emails, start_day, num_days, interval)[0]
+
+    def _lookup(self, emails: List[str], start_day: date, num_days: int, interval: int, max_stale_seconds: Optional[float] = None):
+        """Split mailboxes into (cached views, missing or expired, stale but servable)."""
+        with tracing.span("cache.freebusy", **{"cache.mailboxes": len(emails), "cache.days": num_days}) as lookup:
+            views, missing, stale = self._split(emails, start_day, num_days, interval, max_stale_seconds)
+            lookup.set_attributes(**{"cache.hits": len(views), "cache.misses": len(missing), "cache.stale": len(stale)})
+        return views, missing, stale
+
+    def _split(self, emails: List[str], start_day: date, num_days: int, interval: int, max_stale_seconds: Optional[float]):
+        max_stale_seconds = self.max_stale_seconds if max_stale_seconds is None else max_stale_seconds
+        emails = [e.lower() for e in emails]
+        days = [start_day + timedelta(days=i) for i in range(num_days)]
+        cached = self.get_many(emails, days, interval)
+        now = time.time()
+
+        views = {}
+        missing = []
+        stale = []
+        for email in emails:
+            entries = [cached.get((email, d)) for d in days]
+            if any(entry is None for entry in entries):
+                missing.append(email)
+                continue
+            age = now - min(fetched_at for _, fetched_at in entries)
+            if age > max_stale_seconds:
+                missing.append(email)
+                continue
+            if age > self.fresh_seconds:
+                stale.append(email)
+            views[email] = "".join(view for view, _ in entries)
+        return views, missing, stale
+
+    async def fetch_schedules(self, call, fetch, emails: List[str], start_day: date, num_days: int, interval: int = 30) -> Dict[str, str]:
+        """
+        Cache-aware wrapper around scheduling.fetch_schedules (passed in as `fetch`).
+
+        Mailboxes with every day bucket cached within the staleness bound are
+        answered from disk; the rest are fetched in one bulk call and stored.
+        """
+        views, missing, stale = self._lookup(emails, start_day, num_days, interval)
+        if stale:
+            self._revalidate(call, fetch, stale, start_day, num_days, interval)
+
+        if missing:
+            try:
+                fetched = await fetch(call, missing, start_day, num_days, interval)
+            except circuit_breaker.CircuitOpenError:
+                # Degraded mode: any snapshot on disk beats no answer while Graph is down
+                fetched, still_missing, _ = self._lookup(missing, start_day, num_days, interval, float("inf"))
+                if still_missing:
+                    raise
+                oldest = min(fetched_at for (_, fetched_at) in self.get_many(missing, [start_day], interval).values())
+                circuit_breaker.mark_stale("free/busy", oldest)
+                return {**views, **fetched}
+            self.put_views(fetched, start_day, num_days, interval)
+            views.update(fetched)
+
+        return views
+
+
+# Shared instance used by both MCP servers
+freebusy_cache = FreeBusyCache()
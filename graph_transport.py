@@ -0,0 +1,199 @@
+"""
+Pluggable httpx transport under OutlookManager.call_graph and GraphClient.call_api.
+
+GRAPH_TRANSPORT selects the mode:
+    (unset)  talk to Graph directly
+    record   talk to Graph and append every exchange to GRAPH_RECORDING
+    replay   answer from GRAPH_RECORDING without any network access
+
+Recordings are gzip'd JSON lines, one exchange per line. Exchanges are handed
+to a single writer thread, so the event loop never touches the file and each
+recording session is one gzip stream (finished by close(), run at exit).
+Authorization headers are never written and request bodies are stored only as a hash. With
+GRAPH_RECORD_REDACT=1 email addresses in URLs, request bodies and responses are
+replaced by stable pseudonyms, so recordings can be shared outside the tenant.
+
+Replay serves the recorded response for an identical request (method, path,
+query and body), falling back to the next recorded response for the same
+endpoint when the request shape changed (e.g. different batching). Recorded
+latencies are reproduced scaled by GRAPH_REPLAY_SPEED: 1 = real time, 10 = ten
+times faster, 0 = no delay. Throttling (429 + Retry-After) is replayed as recorded.
+"""
+import asyncio
+import atexit
+import gzip
+import hashlib
+import itertools
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+TRANSPORT_MODE = os.getenv("GRAPH_TRANSPORT", "").lower()
+RECORDING_PATH = os.getenv("GRAPH_RECORDING", os.path.join(os.path.dirname(__file__), "graph_recording.jsonl.gz"))
+REPLAY_SPEED = float(os.getenv("GRAPH_REPLAY_SPEED", "1"))
+REDACT = os.getenv("GRAPH_RECORD_REDACT", "0") == "1"
+
+# Response headers worth keeping for replay (throttling and paging behaviour)
+KEPT_HEADERS = ("content-type", "retry-after", "x-ms-throttle-limit-percentage")
+
+_EMAIL_RE = re.compile(r"[A-Za-z0-9._%+'-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+_REDACTED_DOMAIN = "redacted.invalid"
+
+
+def _redact(text: str) -> str:
+    """Replace email addresses with stable pseudonyms (idempotent)."""
+    def pseudonym(match):
+        address = match.group(0)
+        if address.lower().endswith("@" + _REDACTED_DOMAIN):
+            return address
+        digest = hashlib.sha1(address.lower().encode()).hexdigest()[:10]
+        return f"u{digest}@{_REDACTED_DOMAIN}"
+    return _EMAIL_RE.sub(pseudonym, text) if REDACT else text
+
+
+def _request_key(request: httpx.Request) -> tuple:
+    target = _redact(request.url.raw_path.decode())
+    body_hash = hashlib.sha1(_redact(request.content.decode(errors="replace")).encode()).hexdigest()
+    return request.method, target, body_hash
+
+
+def _endpoint(target: str) -> str:
+    return target.split("?", 1)[0]
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Forwards to Graph and appends a sanitized copy of every exchange to a recording."""
+
+    def __init__(self, path: str = RECORDING_PATH, inner: Optional[httpx.AsyncBaseTransport] = None):
+        self.path = path
+        self.inner = inner or httpx.AsyncHTTPTransport()
+        self.started = time.monotonic()
+        # Lines waiting for the writer thread (None: finish the file)
+        self.lines: "queue.Queue[Optional[str]]" = queue.Queue()
+        self.writer: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        sent_at = time.monotonic()
+        response = await self.inner.handle_async_request(request)
+        # aread() decodes gzip, so the re-wrapped response below must not claim an encoding
+        body = await response.aread()
+        elapsed = time.monotonic() - sent_at
+
+        method, target, body_hash = _request_key(request)
+        entry = {
+            "t": round(sent_at - self.started, 4),
+            "method": method,
+            "target": target,
+            "body_hash": body_hash,
+            "status": response.status_code,
+            "headers": {k: v for k, v in response.headers.items() if k.lower() in KEPT_HEADERS},
+            "body": _redact(body.decode(errors="replace")),
+            "elapsed": round(elapsed, 4)
+        }
+        self._append(json.dumps(entry, separators=(",", ":")) + "\n")
+
+        headers = [(k, v) for k, v in response.headers.items() if k.lower() not in ("content-encoding", "content-length")]
+        return httpx.Response(response.status_code, headers=headers, content=body, request=request)
+
+    def _append(self, line: str):
+        with self.lock:
+            if self.writer is None:
+                self.writer = threading.Thread(target=self._write_lines, name="graph-recorder", daemon=True)
+                self.writer.start()
+                atexit.register(self.close)
+            self.lines.put(line)
+
+    def _write_lines(self):
+        """Writer thread: the only code touching the file; flushes after each burst of lines."""
+        with gzip.open(self.path, "at", encoding="utf-8") as f:
+            while True:
+                burst = [self.lines.get()]
+                while burst[-1] is not None and not self.lines.empty():
+                    burst.append(self.lines.get_nowait())
+                f.writelines(line for line in burst if line is not None)
+                f.flush()
+                if burst[-1] is None:
+                    return
+
+    def close(self):
+        """Write out the buffered exchanges and finish the gzip stream."""
+        with self.lock:
+            if self.writer is None:
+                return
+            self.lines.put(None)
+            self.writer.join()
+            self.writer = None
+            atexit.unregister(self.close)
+
+    async def aclose(self):
+        # Shared by every short-lived AsyncClient in the process; closed at exit only
+        pass
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """Serves recorded exchanges offline, reproducing their latency scaled by `speed`."""
+
+    def __init__(self, path: str = RECORDING_PATH, speed: float = REPLAY_SPEED):
+        self.speed = speed
+        self.exact = defaultdict(deque)
+        self.by_endpoint = defaultdict(list)
+        self.latencies = defaultdict(list)
+
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                self.exact[(entry["method"], entry["target"], entry["body_hash"])].append(entry)
+                self.by_endpoint[(entry["method"], _endpoint(entry["target"]))].append(entry)
+                self.latencies[(entry["method"], _endpoint(entry["target"]))].append(entry["elapsed"])
+
+        # Round-robin over each endpoint's recorded responses for requests that changed shape
+        self.fallback = {key: itertools.cycle(entries) for key, entries in self.by_endpoint.items()}
+        logger.info(f"Replaying {sum(len(v) for v in self.by_endpoint.values())} Graph exchanges from {path}")
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        method, target, body_hash = _request_key(request)
+        endpoint_key = (method, _endpoint(target))
+
+        queue = self.exact.get((method, target, body_hash))
+        if queue:
+            entry = queue[0]
+            queue.rotate(-1)
+            elapsed = entry["elapsed"]
+        elif endpoint_key in self.fallback:
+            entry = next(self.fallback[endpoint_key])
+            # Same endpoint, different request: sample from that endpoint's latency distribution
+            elapsed = random.choice(self.latencies[endpoint_key])
+        else:
+            return httpx.Response(
+                404, json={"error": {"code": "NotRecorded", "message": f"No recording for {method} {target}"}},
+                request=request
+            )
+
+        if self.speed > 0:
+            await asyncio.sleep(elapsed / self.speed)
+        return httpx.Response(entry["status"], headers=entry["headers"], content=entry["body"].encode(), request=request)
+
+
+def _create_transport() -> Optional[httpx.AsyncBaseTransport]:
+    if TRANSPORT_MODE == "record":
+        return RecordingTransport()
+    if TRANSPORT_MODE == "replay":
+        return ReplayTransport()
+    return None
+
+
+# Shared transport (None = httpx default); pass to httpx.AsyncClient(transport=...)
+transport = _create_transport()
+REPLAYING = isinstance(transport, ReplayTransport)
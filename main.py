@@ -1,12 +1,19 @@
-import os
-import json
 import logging
-import httpx
-from datetime import datetime, timedelta
-from typing import List, Optional, Any
+from typing import List, Optional, Union
 from north_mcp_python_sdk import NorthMCPServer
 from north_mcp_python_sdk.auth import get_authenticated_user
 
+import booking_queue
+import caches
+import circuit_breaker
+import deadlines
+import fair_scheduler
+import meeting_core
+import metrics
+import profiling
+import scheduling
+import tracing
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,95 +25,41 @@ server = NorthMCPServer(
     server_secret="some server secret" # Ideally get from env var
 )
 
-class GraphClient:
+class GraphClient(meeting_core.GraphEngine):
     """
     Client for interacting with Microsoft Graph API.
-    Handles token retrieval from various sources suitable for RBC internal environment.
+    Tokens come from the environment / On-Behalf-Of context (see meeting_core.EnvTokenAuth),
+    suitable for RBC internal environment.
     """
     def __init__(self):
-        self.base_url = "https://graph.microsoft.com/v1.0"
-        
+        super().__init__(meeting_core.EnvTokenAuth())
+        # Many users share this app registration's Graph quota
+        self.scheduler = fair_scheduler.FairScheduler()
+
     def _get_token(self) -> str:
+        return self.get_token()
+
+    async def call_api(self, method: str, endpoint: str, data: dict = None, params: dict = None):
         """
-        Retrieve a valid access token for Microsoft Graph.
-        Strategy:
-        1. Check specific environment variable (Dev/Manual override)
-        2. Check for On-Behalf-Of token from authenticated user context (Future/Integration)
-        3. Check for Managed Identity (Azure internal)
-        4. Client Credentials (Service Account)
+        Generic Graph API caller (fails fast / serves cached reads while the endpoint's circuit is open).
+        Each attempt is queued fairly per user and by priority (see fair_scheduler).
         """
-        
-        # --- STRATEGY 1: Environment Variable (Testing/Dev) ---
-        # Simplest for local dev: hardcode a token or set in .env
-        token = os.getenv("AZURE_ACCESS_TOKEN")
-        if token:
-            return token
-
-        # --- STRATEGY 2: User Context / On-Behalf-Of (OBO) ---
-        # Logic: If the North SDK passes the user's OBO token in the user object
-        # try:
-        #     user = get_authenticated_user()
-        #     # distinct_id or metadata might hold the upstream token
-        #     if hasattr(user, "graph_token") and user.graph_token:
-        #         return user.graph_token
-        # except Exception:
-        #     pass
+        return await self.call(method, endpoint, data, params)
 
-        # --- STRATEGY 3: Managed Identity (Azure Production) ---
-        # Logic: If running on an Azure VM/Container with identity enabled
-        # try:
-        #     # Use azure-identity library (needs to be installed)
-        #     # from azure.identity import DefaultAzureCredential
-        #     # credential = DefaultAzureCredential()
-        #     # token_obj = credential.get_token("https://graph.microsoft.com/.default")
-        #     # return token_obj.token
-        #     pass
-        # except ImportError:
-        #     logger.warning("azure-identity not installed")
-        # except Exception as e:
-        #     logger.error(f"Managed Identity token failed: {e}")
+    async def _send_attempt(self, method: str, endpoint: str, data: dict = None, params: dict = None):
+        # Only the request itself holds a slot, not the backoff between retries
+        return await self.scheduler.run(
+            _calling_user(),
+            lambda: self._send_once(method, endpoint, data, params)
+        )
 
-        # --- STRATEGY 4: Client Credentials (Service Account) ---
-        # Logic: Use App ID + Secret to act AS THE APP (not as user)
-        # Note: This limits access to what the App permissions allow, not the user's data
-        # unless "Application Permissions" are granted.
-        # try:
-        #      import msal
-        #      app = msal.ConfidentialClientApplication(
-        #          client_id=os.getenv("AZURE_CLIENT_ID"),
-        #          client_credential=os.getenv("AZURE_CLIENT_SECRET"),
-        #          authority=f"https://login.microsoftonline.com/{os.getenv('AZURE_TENANT_ID')}"
-        #      )
-        #      result = app.acquire_token_for_client(scopes=["https://graph.microsoft.com/.default"])
-        #      if "access_token" in result:
-        #          return result['access_token']
-        # except Exception:
-        #      pass
-
-        
-        raise Exception("No valid Graph API token found. Please set AZURE_ACCESS_TOKEN or configure OBO/Managed Identity.")
 
-    async def call_api(self, method: str, endpoint: str, data: dict = None, params: dict = None):
-        """Generic Graph API caller"""
-        token = self._get_token()
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
-        url = f"{self.base_url}{endpoint}"
-        
-        async with httpx.AsyncClient() as client:
-            try:
-                if method == "POST":
-                    resp = await client.post(url, headers=headers, json=data, params=params)
-                elif method == "GET":
-                    resp = await client.get(url, headers=headers, params=params)
-                
-                resp.raise_for_status()
-                return resp.json() if resp.status_code != 204 else {"status": "success"}
-            except httpx.HTTPStatusError as e:
-                logger.error(f"Graph API Error: {e.response.text}")
-                raise Exception(f"Graph API Error ({e.response.status_code}): {e.response.text}")
+def _calling_user() -> str:
+    """Fair-queueing key: the authenticated North user, or 'system' outside a request."""
+    try:
+        return get_authenticated_user().email
+    except Exception:
+        return "system"
 
 # Initialize Graph Client
 graph_client = GraphClient()
@@ -116,89 +69,86 @@ graph_client = GraphClient()
 # ============================================================================
 
 @server.tool()
-async def search_users(query: str) -> List[dict]:
+@tracing.traced_tool
+@deadlines.bounded
+@circuit_breaker.serve_stale
+@profiling.profiled
+async def search_users(query: str, output_format: Optional[str] = None, max_results: int = 25) -> Union[List[dict], dict]:
     """
     Search for users in the organization by name or email keyword.
     Use this to verify a user's exact email address before booking.
     
     Args:
         query: Name or part of an email to search for (e.g., "John", "service")
+        output_format: (Optional) 'compact' for a columnar result
+        max_results: (Optional) Maximum number of users to return (default 25)
     """
     try:
         current_user = get_authenticated_user() # Audit who is calling
         logger.info(f"User {current_user.email} calling search_users with query: {query}")
 
-        endpoint = "/users"
-        params = {
-            "$select": "displayName,userPrincipalName,mail",
-            "$filter": f"startsWith(displayName,'{query}') or startsWith(userPrincipalName,'{query}') or startsWith(mail,'{query}')",
-            "$top": 10
-        }
-        
-        data = await graph_client.call_api("GET", endpoint, params=params)
-        users = data.get("value", [])
-        
-        results = []
-        for u in users:
-            name = u.get("displayName")
-            email = u.get("mail") or u.get("userPrincipalName")
-            results.append({"name": name, "email": email})
-            
-        return results
+        return await meeting_core.search_users(graph_client.call_api, query, output_format, max_results)
     except Exception as e:
         logger.error(f"Error searching users: {e}")
         return [{"error": str(e)}]
 
 @server.tool()
-async def find_common_availability(attendee_emails: List[str], date_str: str, duration_minutes: int = 30) -> List[str]:
+@tracing.traced_tool
+@deadlines.bounded
+@circuit_breaker.serve_stale
+@profiling.profiled
+async def find_common_availability(
+    attendee_emails: List[str],
+    date_str: str,
+    duration_minutes: int = 30,
+    output_format: Optional[str] = None,
+    mode: str = "standard",
+    days: int = 1,
+    optional_attendees: Optional[List[str]] = None,
+    need_room: bool = False
+) -> Union[List[str], dict]:
     """
     Find common available time slots for the user and a list of attendees on a specific date.
     
     Args:
-        attendee_emails: List of email addresses
+        attendee_emails: List of email addresses (group / distribution list addresses are expanded to their members)
         date_str: Date in 'YYYY-MM-DD' format
         duration_minutes: Duration in minutes (default 30)
+        output_format: (Optional) 'compact' to group slots per day as [start, end] pairs
+        mode: (Optional) 'adaptive' for a coarse-to-fine search over several days,
+              returning free windows plus bytes/latency metrics;
+              'max_attendance' for the top slots ranked by how many attendees are free
+              (used automatically when a group or distribution list address is given);
+              'ranked' for the top slots where everyone is free, scored by time of day,
+              calendar fragmentation, optional attendees and rooms
+              (used automatically when optional_attendees or need_room is given)
+        days: (Optional) Number of days to search from date_str in adaptive / max_attendance / ranked mode
+        optional_attendees: (Optional) Email addresses of optional attendees (slots where more of them are free rank higher)
+        need_room: (Optional) Rank slots by how many meeting rooms are free
     """
     try:
         current_user = get_authenticated_user()
         
-        start_time = f"{date_str}T08:00:00"
-        end_time = f"{date_str}T18:00:00" # Standard work hours assumption
-        
-        # Add current user to potential check if implicit
-        # (API 'me/findMeetingTimes' usually considers 'me' automatically)
-        
-        attendees = [{"emailAddress": {"address": email}, "type": "required"} for email in attendee_emails]
-        
-        payload = {
-            "attendees": attendees,
-            "timeConstraint": {
-                "activityDomain": "work",
-                "timeslots": [{
-                    "start": {"dateTime": start_time, "timeZone": "Pacific Standard Time"},
-                    "end": {"dateTime": end_time, "timeZone": "Pacific Standard Time"}
-                }]
-            },
-            "meetingDuration": f"PT{duration_minutes}M",
-            "returnSuggestionReasons": True,
-            "minimumAttendeePercentage": 100
-        }
-        
-        data = await graph_client.call_api("POST", "/me/findMeetingTimes", data=payload)
-        suggestions = data.get("meetingTimeSuggestions", [])
-        
-        available_slots = []
-        for slot in suggestions:
-            start = slot["meetingTimeSlot"]["start"]["dateTime"]
-            end = slot["meetingTimeSlot"]["end"]["dateTime"]
-            available_slots.append(f"{start} to {end}")
-            
-        return available_slots
+        return await meeting_core.find_common_availability(
+            graph_client.call_api, attendee_emails, date_str, duration_minutes, output_format, mode, days,
+            optional_attendees, need_room
+        )
     except Exception as e:
         return [f"Error: {str(e)}"]
 
 @server.tool()
-async def find_available_rooms(date_str: str, start_time_str: str, end_time_str: str) -> List[dict]:
+@tracing.traced_tool
+@deadlines.bounded
+@circuit_breaker.serve_stale
+@profiling.profiled
+async def find_available_rooms(
+    date_str: str,
+    start_time_str: str,
+    end_time_str: str,
+    output_format: Optional[str] = None,
+    mode: str = "standard",
+    duration_minutes: Optional[int] = None
+) -> Union[List[dict], dict]:
     """
     Find available meeting rooms for a specific time slot.
     
@@ -206,47 +156,62 @@ async def find_available_rooms(date_str: str, start_time_str: str, end_time_str:
         date_str: 'YYYY-MM-DD'
         start_time_str: 'HH:MM:SS' (e.g. '14:00:00')
         end_time_str: 'HH:MM:SS' (e.g. '15:00:00')
+        output_format: (Optional) 'compact' for a columnar result
+        mode: (Optional) 'adaptive' for a coarse-to-fine check that also finds rooms
+              free for only part of the window, with bytes/latency metrics
+        duration_minutes: (Optional) In adaptive mode, minutes the room must be free (default: whole window)
     """
     try:
-        # 1. List rooms
-        rooms_data = await graph_client.call_api("GET", "/places/microsoft.graph.room")
-        rooms = rooms_data.get("value", [])
-        if not rooms:
-            return [{"error": "No meeting rooms found in directory"}]
-            
-        room_emails = [r.get("emailAddress") for r in rooms if r.get("emailAddress")]
-        
-        # 2. Check availability
-        start_dt = f"{date_str}T{start_time_str}"
-        end_dt = f"{date_str}T{end_time_str}"
-        
-        payload = {
-            "schedules": room_emails,
-            "startTime": {"dateTime": start_dt, "timeZone": "Pacific Standard Time"},
-            "endTime": {"dateTime": end_dt, "timeZone": "Pacific Standard Time"},
-            "availabilityViewInterval": 60
-        }
-        
-        schedule_data = await graph_client.call_api("POST", "/me/calendar/getSchedule", data=payload)
-        
-        available_rooms = []
-        for item in schedule_data.get("value", []):
-            email = item["scheduleId"]
-            is_free = True
-            for event in item.get("scheduleItems", []):
-                if event["status"] != "free":
-                    is_free = False
-                    break
-            
-            if is_free:
-                room_name = next((r["displayName"] for r in rooms if r.get("emailAddress") == email), email)
-                available_rooms.append({"name": room_name, "email": email})
-                
-        return available_rooms
+        return await meeting_core.find_available_rooms(
+            graph_client.call_api, date_str, start_time_str, end_time_str, output_format, mode, duration_minutes
+        )
+    except LookupError as e:
+        return [{"error": str(e)}]
     except Exception as e:
         return [{"error": f"Error finding rooms: {str(e)}"}]
 
 @server.tool()
+@tracing.traced_tool
+@deadlines.bounded
+@circuit_breaker.serve_stale
+@profiling.profiled
+async def find_recurring_availability(
+    attendee_emails: List[str],
+    first_date: str,
+    duration_minutes: int = 30,
+    pattern: str = "weekly",
+    interval: int = 1,
+    occurrences: int = 4
+) -> dict:
+    """
+    Find the best time of day for a recurring meeting (e.g. a weekly or biweekly sync).
+    Slots are ranked by how many instances of the series are conflict-free for everyone.
+    Book the chosen slot with book_meeting using the same recurrence arguments.
+    
+    Args:
+        attendee_emails: List of email addresses
+        first_date: Date of the first instance in 'YYYY-MM-DD' format
+        duration_minutes: Duration in minutes (default 30)
+        pattern: 'weekly' or 'daily'
+        interval: Repeat every N weeks/days (2 with 'weekly' = biweekly)
+        occurrences: Number of meetings in the series
+    """
+    try:
+        current_user = get_authenticated_user()
+        logger.info(f"User {current_user.email} calling find_recurring_availability for {len(attendee_emails)} attendees")
+
+        return await scheduling.find_recurring_slots(
+            graph_client.call_api, attendee_emails, first_date,
+            pattern=pattern, interval=interval, occurrences=occurrences,
+            duration_minutes=duration_minutes
+        )
+    except Exception as e:
+        return {"error": str(e)}
+
+@server.tool()
+@tracing.traced_tool
+@deadlines.bounded
+@profiling.profiled
 async def book_meeting(
     subject: str,
     start_iso: str,
@@ -254,7 +219,12 @@ async def book_meeting(
     attendee_emails: List[str],
     room_email: Optional[str] = None,
     is_online: bool = False,
-    content: str = "Please join us for a meeting."
+    content: str = "Please join us for a meeting.",
+    recurrence_pattern: Optional[str] = None,
+    recurrence_interval: int = 1,
+    recurrence_occurrences: Optional[int] = None,
+    recurrence_end_date: Optional[str] = None,
+    wait_for_confirmation: bool = True
 ) -> str:
     """
     Book a meeting in Outlook.
@@ -267,42 +237,73 @@ async def book_meeting(
         room_email: (Optional) Email of the meeting room
         is_online: (Optional) Create Teams meeting
         content: Body of the invite
+        recurrence_pattern: (Optional) 'weekly' or 'daily' for a recurring series
+        recurrence_interval: (Optional) Repeat every N weeks/days (2 = biweekly)
+        recurrence_occurrences: (Optional) Number of meetings in the series
+        recurrence_end_date: (Optional) Last date of the series 'YYYY-MM-DD'
+        wait_for_confirmation: (Optional) False to return a booking ticket immediately;
+              check the outcome with get_booking_status
     """
     try:
-        attendees = [{"emailAddress": {"address": email}, "type": "required"} for email in attendee_emails]
-        
-        if room_email:
-            attendees.append({"emailAddress": {"address": room_email}, "type": "resource"})
-            
-        location_display = "Online (Teams)" if is_online else "TBD"
-        if room_email:
-            location_display = room_email 
-
-        payload = {
-            "subject": subject,
-            "body": {
-                "contentType": "HTML",
-                "content": content
-            },
-            "start": {
-                "dateTime": start_iso,
-                "timeZone": "Pacific Standard Time"
-            },
-            "end": {
-                "dateTime": end_iso,
-                "timeZone": "Pacific Standard Time"
-            },
-            "location": {
-                "displayName": location_display
-            },
-            "attendees": attendees,
-            "isOnlineMeeting": is_online,
-            "onlineMeetingProvider": "teamsForBusiness" if is_online else None
-        }
-        
-        result = await graph_client.call_api("POST", "/me/events", data=payload)
-        weblink = result.get('webLink', 'No link returned')
+        meeting = dict(
+            subject=subject, start_iso=start_iso, end_iso=end_iso,
+            attendee_emails=attendee_emails, room_email=room_email, is_online=is_online, content=content,
+            recurrence_pattern=recurrence_pattern, recurrence_interval=recurrence_interval,
+            recurrence_occurrences=recurrence_occurrences, recurrence_end_date=recurrence_end_date
+        )
+        if not wait_for_confirmation:
+            ticket = await booking_queue.submit(graph_client.call_api, meeting_core.build_event(**meeting))
+            return f"Booking queued. Ticket: {ticket['ticket']} (status: {ticket['status']}). Check the outcome with get_booking_status."
+        result = await meeting_core.book_meeting(graph_client.call_api, **meeting)
+        weblink = result or 'No link returned'
         return f"Meeting booked successfully! WebLink: {weblink}"
         
     except Exception as e:
         return f"Failed to book meeting: {str(e)}"
+
+@server.tool()
+async def get_booking_status(ticket_id: str) -> dict:
+    """
+    Check the outcome of a booking made with book_meeting(wait_for_confirmation=False).
+    Status is one of 'queued', 'submitting', 'retrying', 'booked' (with web_link) or 'failed' (with error).
+    
+    Args:
+        ticket_id: Ticket returned by book_meeting
+    """
+    ticket = booking_queue.status(ticket_id)
+    if ticket is None:
+        return {"error": f"Unknown or expired booking ticket: {ticket_id}"}
+    return ticket
+
+@server.tool()
+async def server_metrics() -> dict:
+    """
+    Diagnostics: counters and timings collected by this server (e.g. bytes and latency of adaptive searches).
+    """
+    return metrics.REGISTRY.snapshot()
+
+@server.tool()
+async def cache_stats() -> dict:
+    """
+    Diagnostics: memory budget usage and per-cache entries, bytes, hit rate and evictions.
+    """
+    return caches.MANAGER.stats()
+
+@server.tool()
+async def set_profiling(mode: Optional[str] = None, tools: Optional[List[str]] = None, sample_rate: Optional[float] = None) -> dict:
+    """
+    Admin: switch per-tool profiling on or off at runtime and list the latest profile files.
+    Profiles (folded stacks for flamegraphs, plus cProfile dumps in 'full' mode) are written to MCP_PROFILE_DIR.
+    
+    Args:
+        mode: (Optional) 'off', 'sample' or 'full'
+        tools: (Optional) Tool names to profile (empty list = all tools)
+        sample_rate: (Optional) Fraction of matching calls to profile (0.0 - 1.0)
+    """
+    try:
+        current_user = get_authenticated_user()
+        if (current_user.email or "").lower() not in profiling.ADMIN_EMAILS:
+            return {"error": "set_profiling is restricted to administrators (MCP_ADMIN_EMAILS)"}
+        return {"settings": profiling.configure(mode, tools, sample_rate), "recent_profiles": profiling.recent_profiles()}
+    except Exception as e:
+        return {"error": str(e)}
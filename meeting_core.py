@@ -0,0 +1,518 @@
+"""
+Tool core shared by the FastMCP server (server.py) and the North MCP server (main.py).
+
+- AuthProvider: where Graph tokens come from (MSAL device-flow cache or an
+  environment / On-Behalf-Of token).
+- GraphEngine: Graph caller behind the circuit breakers, sending through one
+  connection pool per event loop shared by every engine in the process.
+- Tool functions (search_users, find_common_availability, find_available_rooms,
+  book_meeting) take the engine's `call` and return plain data; each server
+  only adds its own docstrings, auditing and error shape.
+
+Caches (free/busy snapshots, directory, last known good) and metrics.REGISTRY are
+module level, so both servers running in one process (see serve_all.py) share them.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+import weakref
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+
+import adaptive
+import circuit_breaker
+import compact
+import deadlines
+import directory
+import graph_transport
+import paging
+import scheduling
+import shared_cache
+import slot_ranking
+import timegrid
+import tracing
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+GRAPH_BASE_URL = "https://graph.microsoft.com/v1.0"
+GRAPH_TIMEOUT_SECONDS = float(os.getenv("GRAPH_TIMEOUT_SECONDS", "10"))
+GRAPH_MAX_CONNECTIONS = int(os.getenv("GRAPH_MAX_CONNECTIONS", "20"))
+# Read-only requests that hit throttling (429), a 5xx or a transport error are retried this often
+GRAPH_MAX_RETRIES = int(os.getenv("GRAPH_MAX_RETRIES", "2"))
+GRAPH_RETRY_BASE_SECONDS = float(os.getenv("GRAPH_RETRY_BASE_SECONDS", "0.5"))
+GRAPH_RETRY_MAX_DELAY_SECONDS = 10
+# Rooms whose schedules are fetched for ranking (getSchedule takes 20 per call)
+RANKING_MAX_ROOMS = int(os.getenv("RANKING_MAX_ROOMS", "60"))
+# Optional delegated scopes for group expansion (admin consent), requested apart from the base scopes
+GROUP_SCOPES = ["GroupMember.Read.All"]
+
+
+# ============================================================================
+# AUTH PROVIDERS
+# ============================================================================
+
+class AuthProvider(ABC):
+    """Source of Graph access tokens for a GraphEngine."""
+
+    @abstractmethod
+    def get_token(self) -> str:
+        """Access token for the base scopes."""
+
+    def get_scoped_token(self, scopes: List[str]) -> Optional[str]:
+        """Token that also carries the optional `scopes`, or None when they were not granted."""
+        return self.get_token()
+
+
+class MsalCacheAuth(AuthProvider):
+    """Delegated token from the MSAL cache written by auth_setup.py (device flow), refreshed silently."""
+
+    def __init__(self, client_id: str, authority: str, scopes: List[str], cache_file: str):
+        import msal
+
+        self.scopes = scopes
+        self.cache_file = cache_file
+        self.cache = msal.SerializableTokenCache()
+        self.synced_at = 0.0
+        if os.path.exists(cache_file):
+            with open(cache_file, "r") as f:
+                self.cache.deserialize(f.read())
+
+        self.app = msal.PublicClientApplication(
+            client_id,
+            authority=authority,
+            token_cache=self.cache
+        )
+
+    def get_token(self) -> str:
+        """Get token from cache (refreshed automatically)"""
+        # Pick up tokens another worker refreshed, so workers do not each refresh their own
+        shared = shared_cache.store.get("tokens", self.cache_file) if shared_cache.store else None
+        if shared and shared[1] > self.synced_at:
+            self.cache.deserialize(shared[0])
+            self.synced_at = shared[1]
+
+        accounts = self.app.get_accounts()
+        if not accounts:
+            raise Exception("No accounts found. Please run 'python auth_setup.py' first.")
+
+        result = self._acquire(self.scopes, accounts[0])
+        if result and "access_token" in result:
+            return result["access_token"]
+
+        raise Exception("Failed to acquire token silently. Please re-run 'python auth_setup.py'.")
+
+    def get_scoped_token(self, scopes: List[str]) -> Optional[str]:
+        """Token for optional scopes granted separately (python auth_setup.py --groups), else None."""
+        accounts = self.app.get_accounts()
+        if not accounts:
+            return None
+        result = self._acquire(scopes, accounts[0])
+        return result["access_token"] if result and "access_token" in result else None
+
+    def _acquire(self, scopes: List[str], account: dict) -> Optional[dict]:
+        result = self.app.acquire_token_silent(scopes, account=account)
+
+        if self.cache.has_state_changed:
+            with open(self.cache_file, "w") as f:
+                f.write(self.cache.serialize())
+            if shared_cache.store:
+                self.synced_at = time.time()
+                shared_cache.store.put("tokens", self.cache_file, self.cache.serialize(), self.synced_at)
+        return result
+
+
+class EnvTokenAuth(AuthProvider):
+    """
+    Token for hosted environments.
+    Strategy:
+    1. Check specific environment variable (Dev/Manual override)
+    2. Check for On-Behalf-Of token from authenticated user context (Future/Integration)
+    3. Check for Managed Identity (Azure internal)
+    4. Client Credentials (Service Account)
+    """
+
+    def __init__(self, env_var: str = "AZURE_ACCESS_TOKEN"):
+        self.env_var = env_var
+
+    def get_token(self) -> str:
+        # --- STRATEGY 1: Environment Variable (Testing/Dev) ---
+        # Simplest for local dev: hardcode a token or set in .env
+        token = os.getenv(self.env_var)
+        if token:
+            return token
+
+        # --- STRATEGY 2: User Context / On-Behalf-Of (OBO) ---
+        # Logic: If the North SDK passes the user's OBO token in the user object
+        # try:
+        #     user = get_authenticated_user()
+        #     # distinct_id or metadata might hold the upstream token
+        #     if hasattr(user, "graph_token") and user.graph_token:
+        #         return user.graph_token
+        # except Exception:
+        #     pass
+
+        # --- STRATEGY 3: Managed Identity (Azure Production) ---
+        # Logic: If running on an Azure VM/Container with identity enabled
+        # try:
+        #     # Use azure-identity library (needs to be installed)
+        #     # from azure.identity import DefaultAzureCredential
+        #     # credential = DefaultAzureCredential()
+        #     # token_obj = credential.get_token("https://graph.microsoft.com/.default")
+        #     # return token_obj.token
+        #     pass
+        # except ImportError:
+        #     logger.warning("azure-identity not installed")
+        # except Exception as e:
+        #     logger.error(f"Managed Identity token failed: {e}")
+
+        # --- STRATEGY 4: Client Credentials (Service Account) ---
+        # Logic: Use App ID + Secret to act AS THE APP (not as user)
+        # Note: This limits access to what the App permissions allow, not the user's data
+        # unless "Application Permissions" are granted.
+        # try:
+        #      import msal
+        #      app = msal.ConfidentialClientApplication(
+        #          client_id=os.getenv("AZURE_CLIENT_ID"),
+        #          client_credential=os.getenv("AZURE_CLIENT_SECRET"),
+        #          authority=f"https://login.microsoftonline.com/{os.getenv('AZURE_TENANT_ID')}"
+        #      )
+        #      result = app.acquire_token_for_client(scopes=["https://graph.microsoft.com/.default"])
+        #      if "access_token" in result:
+        #          return result['access_token']
+        # except Exception:
+        #      pass
+
+        raise Exception(f"No valid Graph API token found. Please set {self.env_var} or configure OBO/Managed Identity.")
+
+
+# ============================================================================
+# GRAPH ENGINE
+# ============================================================================
+
+# One pooled client per event loop (each asyncio.run, e.g. in tests, gets its own)
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def shared_client() -> httpx.AsyncClient:
+    """The process-wide Graph HTTP client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            transport=graph_transport.transport,
+            timeout=GRAPH_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=GRAPH_MAX_CONNECTIONS)
+        )
+        _clients[loop] = client
+    return client
+
+
+class GraphEngine:
+    def __init__(self, auth: AuthProvider, base_url: str = GRAPH_BASE_URL):
+        self.auth = auth
+        self.base_url = base_url
+
+    def get_token(self, endpoint: str = "") -> str:
+        # Replayed recordings need no credentials
+        if graph_transport.REPLAYING:
+            return "replay"
+        if endpoint.replace(self.base_url, "").startswith("/groups"):
+            token = self.auth.get_scoped_token(GROUP_SCOPES)
+            if token is None:
+                raise Exception(f"{', '.join(GROUP_SCOPES)} has not been granted (run 'python auth_setup.py --groups')")
+            return token
+        return self.auth.get_token()
+
+    async def call(self, method: str, endpoint: str, data: dict = None, params: dict = None):
+        """Generic Graph API caller (fails fast / serves cached reads while the endpoint's circuit is open)"""
+        name = circuit_breaker.endpoint_name(endpoint)
+        with tracing.span(f"graph {method} {name}", **{"graph.endpoint": name, "http.request.method": method}):
+            return await circuit_breaker.guarded_call(self._send, method, endpoint, data, params)
+
+    async def _send(self, method: str, endpoint: str, data: dict = None, params: dict = None):
+        """
+        _send_once, retrying read-only requests on Graph-side failures with exponential backoff
+        (or Retry-After). A retry is only attempted when its wait still fits before the tool call's deadline.
+        """
+        read_only = method == "GET" or endpoint.endswith(circuit_breaker.READ_ONLY_ACTIONS)
+        attempt = 0
+        while True:
+            try:
+                return await self._send_attempt(method, endpoint, data, params)
+            except Exception as e:
+                attempt += 1
+                if not read_only or attempt > GRAPH_MAX_RETRIES or not circuit_breaker.is_failure(e):
+                    raise
+                delay = min(_retry_after(e) or GRAPH_RETRY_BASE_SECONDS * 2 ** (attempt - 1), GRAPH_RETRY_MAX_DELAY_SECONDS)
+                left = deadlines.remaining()
+                if left is not None and left <= delay:
+                    raise
+                REGISTRY.inc("graph.retries", endpoint=circuit_breaker.endpoint_name(endpoint))
+                logger.info(f"Retrying {method} {endpoint} in {delay:.1f}s (attempt {attempt + 1}): {e}")
+                with tracing.span("graph.retry_backoff", **{"graph.attempt": attempt + 1, "graph.retry_delay_s": delay}):
+                    await asyncio.sleep(delay)
+
+    async def _send_attempt(self, method: str, endpoint: str, data: dict = None, params: dict = None):
+        """One attempt of _send; subclasses may queue it for a slot (the retry backoff waits outside)."""
+        return await self._send_once(method, endpoint, data, params)
+
+    async def _send_once(self, method: str, endpoint: str, data: dict = None, params: dict = None):
+        deadlines.check(f"{method} {endpoint}")
+        with tracing.span("auth.token"):
+            token = self.get_token(endpoint)
+        headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+            "Accept-Encoding": "gzip"
+        }
+        # @odata.nextLink values are absolute URLs (only ever followed on our own Graph base URL)
+        url = endpoint if endpoint.startswith(self.base_url) else f"{self.base_url}{endpoint}"
+        # Never wait longer than the tool call's deadline allows
+        timeout = deadlines.timeout(GRAPH_TIMEOUT_SECONDS)
+
+        try:
+            with tracing.span("http.request", tracing.KIND_CLIENT, **{"http.request.method": method}) as request_span:
+                if method in ("POST", "PATCH"):
+                    resp = await shared_client().request(method, url, headers=headers, json=data, params=params, timeout=timeout)
+                else:
+                    resp = await shared_client().request(method, url, headers=headers, params=params, timeout=timeout)
+                request_span.set_attributes(**{
+                    "http.response.status_code": resp.status_code,
+                    "http.response.body.size": len(resp.content)
+                })
+
+            resp.raise_for_status()
+            return resp.json() if resp.status_code != 204 else {"status": "success"}
+        except httpx.HTTPStatusError as e:
+            # Catch detailed graph errors
+            logger.error(f"Graph API Error: {e.response.text}")
+            raise Exception(f"Graph API Error ({e.response.status_code}): {e.response.text}") from e
+        except httpx.TimeoutException:
+            if timeout < GRAPH_TIMEOUT_SECONDS:
+                # Cut short by the deadline: not a sign of Graph trouble, keep it out of the breaker
+                raise deadlines.DeadlineExceeded(f"{method} {endpoint} abandoned at the tool call's deadline") from None
+            raise
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds from a throttled response's Retry-After header, if any."""
+    cause = error if isinstance(error, httpx.HTTPStatusError) else error.__cause__
+    if not isinstance(cause, httpx.HTTPStatusError):
+        return None
+    return circuit_breaker.retry_after_seconds(cause.response.headers.get("Retry-After"))
+
+
+# ============================================================================
+# TOOL CORE
+# ============================================================================
+
+async def search_users(call, query: str, output_format: Optional[str] = None, max_results: int = 25):
+    """Up to `max_results` users whose name, UPN or mail starts with `query`; empty list if none."""
+    params = {
+        "$select": "displayName,userPrincipalName,mail",
+        "$filter": f"startsWith(displayName,'{query}') or startsWith(userPrincipalName,'{query}') or startsWith(mail,'{query}')"
+    }
+    users = await paging.take(call, "/users", params, limit=max_results)
+
+    results = []
+    for u in users:
+        results.append({"name": u.get("displayName"), "email": u.get("mail") or u.get("userPrincipalName")})
+    if not results:
+        return []
+    return compact.format_records(results, ("name", "email"), output_format)
+
+
+async def find_common_availability(call, attendee_emails: List[str], date_str: str, duration_minutes: int = 30,
+                                   output_format: Optional[str] = None, mode: str = "standard", days: int = 1,
+                                   optional_attendees: Optional[List[str]] = None, need_room: bool = False):
+    # Groups and distribution lists are expanded to their members (membership index, see directory.py)
+    attendee_emails, groups = await directory.expand_attendees(call, attendee_emails)
+    if groups or mode == "max_attendance":
+        return await max_attendance_slots(call, attendee_emails, groups, date_str, duration_minutes, output_format, days)
+
+    if mode == "ranked" or optional_attendees or need_room:
+        return await ranked_slots(call, attendee_emails, optional_attendees or [], date_str, duration_minutes,
+                                  output_format, days, need_room)
+
+    if mode == "adaptive":
+        day = datetime.strptime(date_str, "%Y-%m-%d").date()
+        result = await adaptive.common_free_windows(call, attendee_emails, day, days, duration_minutes)
+        return {"free_windows": compact.format_slots(result["slots"], output_format), "metrics": result["metrics"]}
+
+    # Frequent collaborators are answered from the free/busy snapshot cache (refreshed in the background)
+    cached_slots = await scheduling.cached_common_slots(call, attendee_emails, date_str, duration_minutes)
+    if cached_slots is not None:
+        return compact.format_slots([(slot["start"], slot["end"]) for slot in cached_slots], output_format)
+
+    start_time = f"{date_str}T{scheduling.WORK_START_HOUR:02d}:00:00"
+    end_time = f"{date_str}T{scheduling.WORK_END_HOUR:02d}:00:00"  # Work hours assumption
+
+    # (API 'me/findMeetingTimes' considers 'me' automatically)
+    attendees = [{"emailAddress": {"address": email}, "type": "required"} for email in attendee_emails]
+
+    payload = {
+        "attendees": attendees,
+        "timeConstraint": {
+            "activityDomain": "work",
+            "timeslots": [{
+                "start": {"dateTime": start_time, "timeZone": scheduling.GRAPH_TIMEZONE},
+                "end": {"dateTime": end_time, "timeZone": scheduling.GRAPH_TIMEZONE}
+            }]
+        },
+        "meetingDuration": f"PT{duration_minutes}M",
+        "returnSuggestionReasons": False,
+        "minimumAttendeePercentage": 100
+    }
+
+    data = await call("POST", "/me/findMeetingTimes", payload)
+    # Suggestions come back in UTC; report them in MEETING_ZONE like the cached path
+    available_slots = []
+    for slot in sorted(data.get("meetingTimeSuggestions", []), key=lambda s: s["meetingTimeSlot"]["start"]["dateTime"]):
+        time_slot = slot["meetingTimeSlot"]
+        available_slots.append((scheduling.local_iso_from_graph(time_slot["start"]),
+                                scheduling.local_iso_from_graph(time_slot["end"])))
+
+    return compact.format_slots(available_slots, output_format)
+
+
+async def max_attendance_slots(call, attendee_emails: List[str], groups: Dict[str, int], date_str: str,
+                               duration_minutes: int = 30, output_format: Optional[str] = None, days: int = 1,
+                               max_results: int = 10) -> dict:
+    """Top work-hour slots by number of free attendees, from one bulk getSchedule over the whole set."""
+    first_day = datetime.strptime(date_str, "%Y-%m-%d").date()
+    emails = list(dict.fromkeys([(await scheduling.get_my_address(call)).lower(), *attendee_emails]))
+    views, grid_start = await scheduling.get_local_schedules(call, emails, first_day, days)
+    slots = scheduling.attendance_slots(views, grid_start, first_day, days, duration_minutes, max_results=max_results)
+    return {
+        "slots": compact.format_records(slots, ("start", "end", "attending"), output_format),
+        "attendees": len(emails),
+        "expanded_groups": groups,
+        "unresolved": [e for e in emails if e not in views]
+    }
+
+
+async def ranked_slots(call, attendee_emails: List[str], optional_emails: List[str], date_str: str,
+                       duration_minutes: int = 30, output_format: Optional[str] = None, days: int = 1,
+                       need_room: bool = False, max_results: int = 10) -> dict:
+    """Top slots where all required attendees are free, scored locally (see slot_ranking.py)."""
+    first_day = datetime.strptime(date_str, "%Y-%m-%d").date()
+    required = list(dict.fromkeys([(await scheduling.get_my_address(call)).lower(), *attendee_emails]))
+    optional = [e for e in dict.fromkeys(e.lower() for e in optional_emails) if e not in required]
+    rooms = []
+    if need_room:
+        rooms = [r["emailAddress"].lower() for r in await directory.get_rooms(call) if r.get("emailAddress")]
+        rooms = rooms[:RANKING_MAX_ROOMS]
+
+    views, grid_start = await scheduling.get_local_schedules(call, required + optional + rooms, first_day, days)
+    slots = slot_ranking.rank_slots(
+        {e: views[e] for e in required if e in views}, grid_start, first_day, days, duration_minutes,
+        optional_views={e: views[e] for e in optional if e in views},
+        room_views={e: views[e] for e in rooms if e in views},
+        max_results=max_results
+    )
+    fields = ("start", "end", "score") + (("optional_free",) if optional else ()) + (("rooms_free",) if rooms else ())
+    return {
+        "slots": compact.format_records(slots, fields, output_format),
+        "unresolved": [e for e in required + optional if e not in views]
+    }
+
+
+async def find_available_rooms(call, date_str: str, start_time_str: str, end_time_str: str,
+                               output_format: Optional[str] = None, mode: str = "standard",
+                               duration_minutes: Optional[int] = None):
+    """Rooms free for the window. Raises LookupError when the directory has no rooms."""
+    # 1. List all rooms (catalog is cached, see directory.py)
+    rooms = await directory.get_rooms(call)
+    if not rooms:
+        raise LookupError("No meeting rooms found in the directory.")
+
+    if mode == "adaptive":
+        result = await adaptive.free_rooms(call, rooms, date_str, start_time_str, end_time_str, duration_minutes)
+        fields = ("name", "email", "free_from", "free_until")
+        return {"rooms": compact.format_records(result["rooms"], fields, output_format), "metrics": result["metrics"]}
+
+    by_email = {r["emailAddress"].lower(): r for r in rooms if r.get("emailAddress")}
+
+    # 2. Check availability: one availabilityView slot spanning the whole window, in batched getSchedule calls
+    day = datetime.strptime(date_str, "%Y-%m-%d").date()
+    table = timegrid.offset_table(scheduling.MEETING_ZONE, day, 1)
+    start = table.to_utc(timegrid.to_minutes(datetime.fromisoformat(f"{date_str}T{start_time_str}")))
+    end = table.to_utc(timegrid.to_minutes(datetime.fromisoformat(f"{date_str}T{end_time_str}")))
+    views = await scheduling.fetch_window(call, list(by_email), timegrid.utc_datetime(start), timegrid.utc_datetime(end),
+                                          interval=min(max(end - start, 5), 1440))
+
+    available_rooms = []
+    for email, view in views.items():
+        # Free only when nothing in the window is busy/tentative/oof
+        if view and set(view) == {"0"}:
+            room = by_email[email]
+            available_rooms.append({"name": room.get("displayName") or room["emailAddress"], "email": room["emailAddress"]})
+
+    return compact.format_records(available_rooms, ("name", "email"), output_format)
+
+
+def build_event(subject: str, start_iso: str, end_iso: str, attendee_emails: List[str],
+                room_email: Optional[str] = None, is_online: bool = False,
+                content: str = "Please join us for a meeting.", recurrence_pattern: Optional[str] = None,
+                recurrence_interval: int = 1, recurrence_occurrences: Optional[int] = None,
+                recurrence_end_date: Optional[str] = None) -> dict:
+    """
+    Graph event payload for book_meeting.
+
+    Its transactionId is derived from the meeting itself, so when a booking
+    that was cut off at the deadline is retried, Graph does not create the
+    event a second time.
+    """
+    attendees = [{"emailAddress": {"address": email}, "type": "required"} for email in attendee_emails]
+    if room_email:
+        attendees.append({"emailAddress": {"address": room_email}, "type": "resource"})
+
+    location_display = "Online (Teams)" if is_online else "TBD"
+    if room_email:
+        # Ideally lookup name, but email is functional for booking
+        location_display = room_email
+
+    payload = {
+        "subject": subject,
+        "body": {
+            "contentType": "HTML",
+            "content": content
+        },
+        "start": {
+            "dateTime": start_iso,
+            "timeZone": scheduling.GRAPH_TIMEZONE
+        },
+        "end": {
+            "dateTime": end_iso,
+            "timeZone": scheduling.GRAPH_TIMEZONE
+        },
+        "location": {
+            "displayName": location_display
+        },
+        "attendees": attendees,
+        "isOnlineMeeting": is_online,
+        "onlineMeetingProvider": "teamsForBusiness" if is_online else None,
+        "transactionId": str(uuid.uuid5(uuid.NAMESPACE_URL, "|".join([
+            subject, start_iso, end_iso, ",".join(sorted(e.lower() for e in attendee_emails)), room_email or "",
+            recurrence_pattern or ""
+        ])))
+    }
+    if recurrence_pattern:
+        payload["recurrence"] = scheduling.build_recurrence(
+            start_iso, recurrence_pattern, recurrence_interval,
+            recurrence_occurrences, recurrence_end_date
+        )
+    return payload
+
+
+async def book_meeting(call, **meeting) -> Optional[str]:
+    """Create the event described by build_event's arguments; returns its webLink."""
+    # Only webLink is used from the created event
+    result = await call("POST", "/me/events", build_event(**meeting), params={"$select": "webLink"})
+    return result.get("webLink")
@@ -0,0 +1,51 @@
+"""
+Process-wide metrics registry shared by every tool and Graph client.
+
+Counters are summed; observations keep count/sum/min/max. Names may carry
+labels as keyword arguments, e.g. inc("graph.requests", endpoint="/users").
+"""
+import threading
+from typing import Dict, Tuple
+
+
+def _key(name: str, labels: dict) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in sorted(labels.items())) + "}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, float] = {}
+        self.observations: Dict[str, Tuple[int, float, float, float]] = {}
+        self.gauges: Dict[str, float] = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            count, total, low, high = self.observations.get(key, (0, 0.0, value, value))
+            self.observations[key] = (count + 1, total + value, min(low, value), max(high, value))
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            self.gauges[_key(name, labels)] = value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "observations": {
+                    key: {"count": count, "sum": round(total, 3), "avg": round(total / count, 3), "min": low, "max": high}
+                    for key, (count, total, low, high) in self.observations.items()
+                }
+            }
+
+
+REGISTRY = MetricsRegistry()
@@ -0,0 +1,49 @@
+"""
+Local stand-in for Graph change notifications.
+
+Runs the validation handshake against the webhook, then posts a synthetic
+notification, so the receiver in src/main.py can be exercised without a tenant.
+Start the app and this script with the same GRAPH_NOTIFICATION_CLIENT_STATE.
+
+    python notification_standin.py --mailbox room1@contoso.com --change updated
+"""
+import argparse
+import os
+import secrets
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Post synthetic Graph change notifications")
+    parser.add_argument("--url", default="http://localhost:8000/notifications")
+    parser.add_argument("--mailbox", required=True, help="Mailbox whose calendar changed")
+    parser.add_argument("--change", default="updated", choices=["created", "updated", "deleted"])
+    parser.add_argument("--subscription-id", default="standin-subscription")
+    parser.add_argument("--client-state", default=os.getenv("GRAPH_NOTIFICATION_CLIENT_STATE", ""))
+    args = parser.parse_args()
+
+    # 1. Validation handshake: the webhook must echo the token as text/plain
+    token = secrets.token_urlsafe(16)
+    resp = httpx.post(args.url, params={"validationToken": token})
+    print(f"Validation: {resp.status_code} {'OK' if resp.text == token else 'MISMATCH: ' + resp.text}")
+
+    # 2. Synthetic change notification
+    event_id = "AAMkStandIn" + secrets.token_hex(8)
+    notification = {
+        "subscriptionId": args.subscription_id,
+        "clientState": args.client_state,
+        "changeType": args.change,
+        "resource": f"Users/{args.mailbox}/Events/{event_id}",
+        "resourceData": {"@odata.type": "#Microsoft.Graph.Event", "id": event_id},
+        "tenantId": "00000000-0000-0000-0000-000000000000"
+    }
+    resp = httpx.post(args.url, json={"value": [notification]})
+    print(f"Notification ({args.change} on {args.mailbox}): {resp.status_code}")
+
+
+if __name__ == "__main__":
+    main()
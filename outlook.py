@@ -1,17 +1,30 @@
-import win32com.client
 from datetime import datetime, timedelta
+from itertools import groupby
 
-def get_weekly_availability(email_address):
+import com_pool
+
+STATUS_MAP = {'0': '空闲', '1': '暂定', '2': '忙碌', '3': '不在办公室'}
+
+
+def iter_status_runs(fb_data, start_date, interval):
+    """
+    惰性地产生合并后的忙闲时段 (run_start, run_end, status)。
+    连续相同状态的刻度合并为一段, 跨越午夜时按天拆分; 每段只计算一次时间。
+    """
+    slots_per_day = 24 * 60 // interval
+    position = 0
+    # 按 (第几天, 状态字符) 分组, 不为单个刻度创建任何对象
+    for (_, char), group in groupby(enumerate(fb_data), key=lambda item: (item[0] // slots_per_day, item[1])):
+        length = sum(1 for _ in group)
+        run_start = start_date + timedelta(minutes=position * interval)
+        position += length
+        yield run_start, start_date + timedelta(minutes=position * interval), STATUS_MAP.get(char, '未知')
+
+
+def get_weekly_availability(email_address, pool=None):
     try:
-        # 1. 连接 Outlook
-        outlook = win32com.client.Dispatch("Outlook.Application")
-        ns = outlook.GetNamespace("MAPI")
-        
-        recipient = ns.CreateRecipient(email_address)
-        recipient.Resolve()
-        
-        if not recipient.Resolved:
-            return f"无法识别联系人: {email_address}"
+        # 1. Outlook 在 COM 工作线程上访问 (见 com_pool.py), 这里只排队等待结果
+        pool = pool or com_pool.default_pool()
 
         # 2. 定义查询参数
         # 从今天午夜 (00:00) 开始查询，方便日期对齐
@@ -19,27 +32,17 @@ def get_weekly_availability(email_address):
         interval = 30  # 30分钟一个刻度
         
         # 获取未来 7 天的数据 (7天 * 24小时 * 2个刻度/小时 = 336个字符)
-        # 注意：在 pywin32 中方法名通常是 FreeBusy
-        fb_data = recipient.FreeBusy(start_date, interval, False)
+        # 注意：在 pywin32 中方法名通常是 FreeBusy; 无法解析的联系人返回 None
+        fb_data = pool.free_busy(email_address, start_date, interval, False).result()
+        if fb_data is None:
+            return f"无法识别联系人: {email_address}"
 
-        # 3. 解析字符串
-        status_map = {'0': '空闲', '1': '暂定', '2': '忙碌', '3': '不在办公室'}
+        # 3. 解析字符串: 按天合并连续相同状态的时段, 而不是每个刻度生成一条记录
         daily_schedule = {}
-
-        for i, char in enumerate(fb_data):
-            # 计算当前刻度对应的时间
-            current_slot_time = start_date + timedelta(minutes=i * interval)
-            date_str = current_slot_time.strftime("%Y-%m-%d (%A)")
-            time_range = f"{current_slot_time.strftime('%H:%M')} - {(current_slot_time + timedelta(minutes=interval)).strftime('%H:%M')}"
-            
-            status = status_map.get(char, '未知')
-            
-            # 只记录非空闲的状态，或者根据需求记录所有
-            if date_str not in daily_schedule:
-                daily_schedule[date_str] = []
-            
-            daily_schedule[date_str].append({
-                "time": time_range,
+        for run_start, run_end, status in iter_status_runs(fb_data, start_date, interval):
+            date_str = run_start.strftime("%Y-%m-%d (%A)")
+            daily_schedule.setdefault(date_str, []).append({
+                "time": f"{run_start.strftime('%H:%M')} - {run_end.strftime('%H:%M')}",
                 "status": status
             })
 
@@ -49,14 +52,14 @@ def get_weekly_availability(email_address):
         return f"发生错误: {str(e)}"
 
 # 示例调用
+if __name__ == "__main__":
+    availability = get_weekly_availability("Zitengzhang@Ttt830.onmicrosoft.com")
 
-availability = get_weekly_availability("Zitengzhang@Ttt830.onmicrosoft.com")
-
-print(availability)
+    print(availability)
 
-# 打印结果示例
-for date, slots in availability.items():
-    print(f"\n日期: {date}")
-    # 为了简洁，这里只打印前 4 个时段作为演示
-    for slot in slots[:4]: 
-        print(f"  {slot['time']}: {slot['status']}")
\ No newline at end of file
+    # 打印结果示例
+    for date, slots in availability.items():
+        print(f"\n日期: {date}")
+        # 为了简洁，这里只打印前 4 个时段作为演示
+        for slot in slots[:4]:
+            print(f"  {slot['time']}: {slot['status']}")
@@ -0,0 +1,95 @@
+"""
+Streaming pagination over Graph collections (@odata.nextLink).
+
+iter_pages yields one page (list of items) at a time while a producer task
+already fetches the following pages, up to `prefetch` pages ahead, so network
+time overlaps with the caller's processing and at most prefetch + 1 pages are
+held in memory. Leaving the loop early (or closing the iterator) cancels the
+producer, so nothing more is requested than the caller consumed plus the
+prefetch window.
+
+    async with aclosing(paging.iter_items(call, "/users", params)) as users:
+        async for user in users:
+            ...
+
+take() covers the common "first N matching items" case.
+
+Configuration:
+    GRAPH_PAGE_SIZE       $top per page (default 100)
+    GRAPH_PREFETCH_PAGES  pages fetched ahead of the consumer (default 1, 0 = none)
+"""
+import asyncio
+import os
+from contextlib import aclosing
+from typing import AsyncIterator, Callable, List, Optional
+
+PAGE_SIZE = int(os.getenv("GRAPH_PAGE_SIZE", "100"))
+PREFETCH_PAGES = int(os.getenv("GRAPH_PREFETCH_PAGES", "1"))
+
+
+async def iter_pages(call, endpoint: str, params: Optional[dict] = None, page_size: Optional[int] = PAGE_SIZE,
+                     prefetch: int = PREFETCH_PAGES) -> AsyncIterator[List[dict]]:
+    """Pages of a Graph collection, following @odata.nextLink (absolute URLs) until exhausted."""
+    params = dict(params or {})
+    if page_size:
+        params["$top"] = page_size
+
+    if prefetch < 1:
+        url, query = endpoint, params
+        while url:
+            data = await call("GET", url, params=query)
+            yield data.get("value", [])
+            # nextLink already carries the query (filter, select, skip token)
+            url, query = data.get("@odata.nextLink"), None
+        return
+
+    pages: asyncio.Queue = asyncio.Queue(maxsize=prefetch)
+
+    async def produce():
+        url, query = endpoint, params
+        try:
+            while url:
+                data = await call("GET", url, params=query)
+                await pages.put((data.get("value", []), None))
+                url, query = data.get("@odata.nextLink"), None
+        except Exception as e:
+            await pages.put((None, e))
+            return
+        await pages.put((None, None))
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            items, error = await pages.get()
+            if error is not None:
+                raise error
+            if items is None:
+                return
+            yield items
+    finally:
+        producer.cancel()
+
+
+async def iter_items(call, endpoint: str, params: Optional[dict] = None, page_size: Optional[int] = PAGE_SIZE,
+                     prefetch: int = PREFETCH_PAGES) -> AsyncIterator[dict]:
+    """Items of a Graph collection, streamed page by page."""
+    async with aclosing(iter_pages(call, endpoint, params, page_size, prefetch)) as pages:
+        async for page in pages:
+            for item in page:
+                yield item
+
+
+async def take(call, endpoint: str, params: Optional[dict] = None, limit: Optional[int] = None,
+               predicate: Optional[Callable[[dict], bool]] = None, page_size: Optional[int] = PAGE_SIZE,
+               prefetch: int = PREFETCH_PAGES) -> List[dict]:
+    """Up to `limit` items (all when None) matching `predicate`, stopping as soon as there are enough."""
+    if limit is not None and page_size and predicate is None:
+        page_size = min(page_size, limit)
+    results = []
+    async with aclosing(iter_items(call, endpoint, params, page_size, prefetch)) as items:
+        async for item in items:
+            if predicate is None or predicate(item):
+                results.append(item)
+                if limit is not None and len(results) >= limit:
+                    break
+    return results
@@ -0,0 +1,208 @@
+"""
+On-demand profiling of individual tool calls (server.py and main.py).
+
+Tools decorated with @profiled are profiled when profiling is switched on,
+either at startup (env vars below) or at runtime with the set_profiling tool:
+    off     nothing is recorded (default)
+    sample  a background thread samples the event loop thread's stack every
+            MCP_PROFILE_INTERVAL_MS and writes folded stacks (<name>.folded),
+            the input format of flamegraph.pl / speedscope / inferno
+    full    as sample, plus a deterministic cProfile dump (<name>.prof, open
+            with snakeviz or pstats)
+
+Each profiled call writes its own files, named
+<timestamp>_<tool>_<args hash>.*, into MCP_PROFILE_DIR. Time spent waiting for
+Graph shows up as the event loop's select() frame; MSAL, JSON decoding and our
+own loops appear under their own frames. Concurrent tool calls share the event
+loop thread, so their frames can show up in each other's profiles.
+
+Retention is bounded: after each write the oldest files are deleted until at
+most MCP_PROFILE_MAX_FILES files and MCP_PROFILE_MAX_MB megabytes remain.
+
+The set_profiling tool is an admin tool: the stdio server (server.py) only
+registers it when MCP_PROFILE_ADMIN_TOOL is on, and the shared North server
+(main.py) only accepts it from users listed in MCP_ADMIN_EMAILS.
+
+Configuration:
+    MCP_PROFILE              off | sample | full
+    MCP_PROFILE_TOOLS        comma-separated tool names to profile (default: all)
+    MCP_PROFILE_RATE         fraction of matching calls to profile (default 1.0)
+    MCP_PROFILE_INTERVAL_MS  stack sampling interval (default 5)
+    MCP_PROFILE_DIR          output directory (default ./profiles)
+    MCP_PROFILE_MAX_FILES    retention: number of files (default 200)
+    MCP_PROFILE_MAX_MB       retention: total size (default 100)
+    MCP_PROFILE_ADMIN_TOOL   'on' to register set_profiling in server.py (default off)
+    MCP_ADMIN_EMAILS         comma-separated users allowed to call set_profiling in main.py
+"""
+import cProfile
+import functools
+import hashlib
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import List, Optional
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+MODES = ("off", "sample", "full")
+
+PROFILE_DIR = os.getenv("MCP_PROFILE_DIR", os.path.join(os.path.dirname(__file__), "profiles"))
+INTERVAL_MS = float(os.getenv("MCP_PROFILE_INTERVAL_MS", "5"))
+MAX_FILES = int(os.getenv("MCP_PROFILE_MAX_FILES", "200"))
+MAX_MB = float(os.getenv("MCP_PROFILE_MAX_MB", "100"))
+ADMIN_TOOL_ENABLED = os.getenv("MCP_PROFILE_ADMIN_TOOL", "off").lower() in ("1", "on", "true")
+ADMIN_EMAILS = {e.strip().lower() for e in os.getenv("MCP_ADMIN_EMAILS", "").split(",") if e.strip()}
+
+settings = {
+    "mode": os.getenv("MCP_PROFILE", "off").lower(),
+    "tools": [t.strip() for t in os.getenv("MCP_PROFILE_TOOLS", "").split(",") if t.strip()],
+    "rate": float(os.getenv("MCP_PROFILE_RATE", "1.0"))
+}
+
+# Only one cProfile profiler can be active per interpreter
+_full_profile_lock = threading.Lock()
+_retention_lock = threading.Lock()
+
+
+def configure(mode: Optional[str] = None, tools: Optional[List[str]] = None, rate: Optional[float] = None) -> dict:
+    """Change profiling settings at runtime; returns the current settings."""
+    if mode is not None:
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode '{mode}', use one of {MODES}")
+        settings["mode"] = mode
+    if tools is not None:
+        settings["tools"] = list(tools)
+    if rate is not None:
+        settings["rate"] = min(max(rate, 0.0), 1.0)
+    logger.info(f"Profiling settings: {settings}")
+    return dict(settings)
+
+
+def _selected(tool_name: str) -> bool:
+    if settings["mode"] == "off":
+        return False
+    if settings["tools"] and tool_name not in settings["tools"]:
+        return False
+    return random.random() < settings["rate"]
+
+
+def args_hash(args: tuple, kwargs: dict) -> str:
+    payload = json.dumps([args, kwargs], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:12]
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval into folded-stack counts."""
+
+    def __init__(self, thread_id: int, interval_ms: float = INTERVAL_MS):
+        super().__init__(daemon=True, name="profile-sampler")
+        self.thread_id = thread_id
+        self.interval = interval_ms / 1000
+        self.stacks = Counter()
+        self._finished = threading.Event()
+
+    def run(self):
+        while not self._finished.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self) -> Counter:
+        self._finished.set()
+        self.join()
+        return self.stacks
+
+
+def _write_folded(path: str, stacks: Counter):
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+
+
+def enforce_retention(directory: str = PROFILE_DIR, max_files: int = MAX_FILES, max_mb: float = MAX_MB):
+    """Delete the oldest profiles until the directory is within both limits."""
+    with _retention_lock:
+        entries = []
+        for entry in os.scandir(directory):
+            if entry.is_file() and entry.name.endswith((".folded", ".prof")):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        while entries and (len(entries) > max_files or total > max_mb * 1024 * 1024):
+            _, size, path = entries.pop(0)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+
+def recent_profiles(limit: int = 10) -> List[str]:
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    names = [e for e in os.scandir(PROFILE_DIR) if e.is_file()]
+    names.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+    return [e.name for e in names[:limit]]
+
+
+def profiled(tool):
+    """Tool decorator: profile the call when profiling is on and the tool is selected."""
+    @functools.wraps(tool)
+    async def wrapper(*args, **kwargs):
+        if not _selected(tool.__name__):
+            return await tool(*args, **kwargs)
+
+        mode = settings["mode"]
+        base = f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}_{tool.__name__}_{args_hash(args, kwargs)}"
+        sampler = StackSampler(threading.get_ident())
+        profile = None
+        if mode == "full" and _full_profile_lock.acquire(blocking=False):
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Another profiler (e.g. a debugger) is active: fall back to sampling only
+                _full_profile_lock.release()
+                profile = None
+
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            return await tool(*args, **kwargs)
+        finally:
+            stacks = sampler.stop()
+            if profile is not None:
+                profile.disable()
+                _full_profile_lock.release()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            try:
+                os.makedirs(PROFILE_DIR, exist_ok=True)
+                _write_folded(os.path.join(PROFILE_DIR, base + ".folded"), stacks)
+                if profile is not None:
+                    profile.dump_stats(os.path.join(PROFILE_DIR, base + ".prof"))
+                enforce_retention()
+                REGISTRY.inc("profiling.profiles", tool=tool.__name__, mode=mode)
+                REGISTRY.observe("profiling.tool_ms", elapsed_ms, tool=tool.__name__)
+                logger.info(f"Profiled {tool.__name__} ({elapsed_ms:.0f} ms) -> {base}")
+            except OSError as e:
+                logger.warning(f"Could not write profile for {tool.__name__}: {e}")
+
+    return wrapper
@@ -0,0 +1,391 @@
+"""
+Free/busy helpers shared by the Graph based MCP servers (server.py and main.py).
+
+Schedules are handled as bitsets: a Python int where bit i is set when slot i
+(of `interval` minutes, counted from the start of the queried range) is free.
+Intersecting many people or many meeting instances is then a couple of `&`
+operations instead of nested loops over availabilityView strings.
+
+Views are requested in UTC over whole UTC days, so slot i starts at
+`grid_start + i * interval` UTC minutes; local dates and working hours are
+mapped onto that grid with timegrid offset tables (correct across DST).
+
+All functions that talk to Graph take a `call` coroutine with the signature of
+`OutlookManager.call_graph` / `GraphClient.call_api`:
+    await call(method, endpoint, data=None, params=None)
+"""
+import functools
+import json
+import logging
+import os
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+import deadlines
+import timegrid
+import tracing
+from freebusy_cache import freebusy_cache
+
+logger = logging.getLogger(__name__)
+
+# Zone of the dates and working hours tools talk about (MEETING_TIMEZONE)
+MEETING_ZONE = timegrid.DEFAULT_ZONE
+GRAPH_TIMEZONE = timegrid.graph_zone_name(MEETING_ZONE)
+WORK_START_HOUR = 8
+WORK_END_HOUR = 18
+# How long the signed-in user's mailbox is remembered
+MY_ADDRESS_TTL_SECONDS = int(os.getenv("MY_ADDRESS_TTL_SECONDS", "86400"))
+
+# getSchedule limits: at most 62 days per request, keep schedule batches small
+MAX_SCHEDULE_DAYS = 62
+SCHEDULES_PER_CALL = 20
+
+RECURRENCE_PATTERNS = ("daily", "weekly")
+
+# availabilityView digit -> free bit ('0' is the only free status)
+_FREE_TABLE = str.maketrans("01234", "10000")
+
+
+def view_to_free_mask(view: str) -> int:
+    """Convert an availabilityView string into a free-slot bitset (bit i = slot i)."""
+    if not view:
+        return 0
+    return int(view.translate(_FREE_TABLE)[::-1], 2)
+
+
+def run_mask(mask: int, length: int) -> int:
+    """
+    Keep only the bits that start a run of `length` consecutive set bits.
+    Bit k of the result is set when slots k .. k+length-1 are all free.
+    """
+    result = mask
+    for shift in range(1, length):
+        result &= mask >> shift
+    return result
+
+
+def expand_recurrence(first_date: str, pattern: str = "weekly", interval: int = 1, occurrences: int = 4) -> List[date]:
+    """
+    Expand a simple recurrence into the list of instance dates.
+
+    Args:
+        first_date: Date of the first instance ('YYYY-MM-DD')
+        pattern: 'daily' or 'weekly'
+        interval: Every N days/weeks (e.g. 2 with 'weekly' for biweekly)
+        occurrences: Number of instances in the series
+    """
+    if pattern not in RECURRENCE_PATTERNS:
+        raise ValueError(f"Unsupported recurrence pattern '{pattern}', use one of {RECURRENCE_PATTERNS}")
+    if interval < 1 or occurrences < 1:
+        raise ValueError("interval and occurrences must be positive")
+
+    start = datetime.strptime(first_date, "%Y-%m-%d").date()
+    step = timedelta(days=interval) if pattern == "daily" else timedelta(weeks=interval)
+    return [start + step * i for i in range(occurrences)]
+
+
+def build_recurrence(start_iso: str, pattern: str, interval: int = 1, occurrences: Optional[int] = None, end_date: Optional[str] = None) -> dict:
+    """Build the Graph `recurrence` property for an event starting at `start_iso`."""
+    if pattern not in RECURRENCE_PATTERNS:
+        raise ValueError(f"Unsupported recurrence pattern '{pattern}', use one of {RECURRENCE_PATTERNS}")
+
+    start = datetime.fromisoformat(start_iso)
+    recurrence_pattern = {"type": pattern, "interval": interval}
+    if pattern == "weekly":
+        recurrence_pattern["daysOfWeek"] = [start.strftime("%A").lower()]
+
+    recurrence_range = {"startDate": start.date().isoformat(), "recurrenceTimeZone": GRAPH_TIMEZONE}
+    if end_date:
+        recurrence_range.update({"type": "endDate", "endDate": end_date})
+    elif occurrences:
+        recurrence_range.update({"type": "numbered", "numberOfOccurrences": occurrences})
+    else:
+        recurrence_range["type"] = "noEnd"
+
+    return {"pattern": recurrence_pattern, "range": recurrence_range}
+
+
+# call -> (signed-in user's mailbox, time it was looked up)
+_my_addresses: Dict = {}
+
+
+def _my_address_key(call) -> str:
+    # One signed-in user per Graph client, persisted so it is known right after a restart
+    return f"me:{getattr(call, '__qualname__', call)}"
+
+
+async def get_my_address(call) -> str:
+    """Mailbox of the signed-in user (getSchedule, unlike findMeetingTimes, does not add it implicitly)."""
+    my_address = cached_my_address(call)
+    if my_address is None:
+        me = await call("GET", "/me", params={"$select": "mail,userPrincipalName"})
+        my_address = me.get("mail") or me.get("userPrincipalName")
+        _my_addresses[call] = (my_address, time.time())
+        freebusy_cache.set_meta(_my_address_key(call), my_address, MY_ADDRESS_TTL_SECONDS)
+    return my_address
+
+
+def cached_my_address(call) -> Optional[str]:
+    """
+    Signed-in user's mailbox if looked up within MY_ADDRESS_TTL_SECONDS (memory or snapshot
+    cache), without calling Graph. The expiry picks up a different account after re-authentication.
+    """
+    entry = _my_addresses.get(call)
+    if entry and time.time() - entry[1] < MY_ADDRESS_TTL_SECONDS:
+        return entry[0]
+    my_address = freebusy_cache.get_meta(_my_address_key(call))
+    if my_address:
+        _my_addresses[call] = (my_address, time.time())
+    return my_address
+
+
+async def fetch_window(call, emails: List[str], start: datetime, end: datetime, interval: int = 30,
+                       stats: Optional[dict] = None) -> Dict[str, str]:
+    """
+    availabilityView per mailbox for one [start, end) UTC window (naive UTC datetimes, at most
+    MAX_SCHEDULE_DAYS long), requested in concurrent batches of SCHEDULES_PER_CALL mailboxes.
+    `stats`, if given, accumulates request count, response bytes and availabilityView characters.
+    """
+    async def fetch(batch):
+        payload = {
+            "schedules": batch,
+            "startTime": {"dateTime": start.isoformat(timespec="seconds"), "timeZone": "UTC"},
+            "endTime": {"dateTime": end.isoformat(timespec="seconds"), "timeZone": "UTC"},
+            "availabilityViewInterval": interval
+        }
+        data = await call("POST", "/me/calendar/getSchedule", payload)
+        if stats is not None:
+            stats["requests"] = stats.get("requests", 0) + 1
+            stats["bytes"] = stats.get("bytes", 0) + len(json.dumps(data))
+            stats["view_chars"] = stats.get("view_chars", 0) + sum(len(i.get("availabilityView", "")) for i in data.get("value", []))
+        return data.get("value", [])
+
+    batches = [emails[i:i + SCHEDULES_PER_CALL] for i in range(0, len(emails), SCHEDULES_PER_CALL)]
+    responses = await deadlines.gather_partial(*(fetch(batch) for batch in batches), what="getSchedule batches")
+
+    slots = int((end - start).total_seconds() // 60) // interval
+    views = {}
+    for items in responses:
+        for item in items or []:
+            if "error" in item:
+                logger.warning(f"getSchedule error for {item.get('scheduleId')}: {item['error']}")
+                continue
+            views[item["scheduleId"].lower()] = item.get("availabilityView", "").ljust(slots, "2")
+    return views
+
+
+async def fetch_schedules(call, emails: List[str], start_day: date, num_days: int, interval: int = 30,
+                          stats: Optional[dict] = None) -> Dict[str, str]:
+    """
+    Fetch availabilityView strings for `emails` covering `num_days` whole UTC days from `start_day`.
+
+    The range is split into getSchedule-sized windows which are requested
+    concurrently, then stitched back together per mailbox.
+    Mailboxes Graph could not resolve, or not fetched before the deadline, are left out of the result.
+    `stats` is passed on to fetch_window.
+    """
+    windows = []
+    offset = 0
+    while offset < num_days:
+        span = min(MAX_SCHEDULE_DAYS, num_days - offset)
+        window_start = datetime.combine(start_day + timedelta(days=offset), datetime.min.time())
+        windows.append((window_start, window_start + timedelta(days=span)))
+        offset += span
+
+    responses = await deadlines.gather_partial(
+        *(fetch_window(call, emails, start, end, interval, stats) for start, end in windows), what="getSchedule windows"
+    )
+    responses = [views or {} for views in responses]
+    return {
+        email: "".join(views[email] for views in responses)
+        for email in responses[0] if all(email in views for views in responses)
+    } if responses else {}
+
+
+async def get_schedules(call, emails: List[str], start_day: date, num_days: int, interval: int = 30,
+                        stats: Optional[dict] = None) -> Dict[str, str]:
+    """fetch_schedules served through the persistent free/busy snapshot cache (`stats` counts only what Graph sent)."""
+    fetch = fetch_schedules if stats is None else functools.partial(fetch_schedules, stats=stats)
+    return await freebusy_cache.fetch_schedules(call, fetch, emails, start_day, num_days, interval)
+
+
+def local_days_grid(first_day: date, num_days: int):
+    """(first UTC day, number of UTC days, grid_start) of the UTC days covering local days first_day .. +num_days."""
+    table = timegrid.offset_table(MEETING_ZONE, first_day, num_days)
+    utc_day, utc_num_days = timegrid.utc_days(
+        table.local_midnight(first_day), table.local_midnight(first_day + timedelta(days=num_days))
+    )
+    return utc_day, utc_num_days, timegrid.day_minutes(utc_day)
+
+
+async def get_local_schedules(call, emails: List[str], first_day: date, num_days: int, interval: int = 30,
+                              stats: Optional[dict] = None):
+    """get_schedules for local days (MEETING_ZONE); returns (views, grid_start in UTC minutes)."""
+    utc_day, utc_num_days, grid_start = local_days_grid(first_day, num_days)
+    return await get_schedules(call, emails, utc_day, utc_num_days, interval, stats), grid_start
+
+
+def local_iso_from_graph(value: dict) -> str:
+    """Graph dateTimeTimeZone (e.g. a findMeetingTimes suggestion, UTC by default) as local MEETING_ZONE wall time."""
+    moment = datetime.fromisoformat(value["dateTime"][:19])
+    zone_name = value.get("timeZone") or "UTC"
+    if zone_name != "UTC":
+        moment = moment.replace(tzinfo=timegrid.get_zone(zone_name))
+    minutes = timegrid.to_minutes(moment)
+    return timegrid.offset_table(MEETING_ZONE, moment.date(), 1).local_iso(minutes)
+
+
+@tracing.traced("compute.common_slots")
+def common_slots(views: Dict[str, str], grid_start: int, date_str: str, duration_minutes: int,
+                 slot_interval: int = 30) -> List[dict]:
+    """Start/end pairs within work hours on local `date_str` where every mailbox in `views` is free."""
+    combined = 0 if not views else -1
+    for view in views.values():
+        combined &= view_to_free_mask(view)
+
+    day = datetime.strptime(date_str, "%Y-%m-%d").date()
+    table = timegrid.offset_table(MEETING_ZONE, day, 1)
+    work_start_utc, work_end_utc = table.work_window(day, WORK_START_HOUR, WORK_END_HOUR)
+    work_start = -(-(work_start_utc - grid_start) // slot_interval)
+    work_slots = (work_end_utc - grid_start) // slot_interval - work_start
+    duration_slots = -(-duration_minutes // slot_interval)
+    fits = run_mask((combined >> work_start) & ((1 << work_slots) - 1), duration_slots)
+
+    slots = []
+    for k in range(work_slots - duration_slots + 1):
+        if (fits >> k) & 1:
+            start = grid_start + (work_start + k) * slot_interval
+            slots.append({"start": table.local_iso(start), "end": table.local_iso(start + duration_minutes)})
+    return slots
+
+
+def work_starts(table, grid_start: int, first_day: date, num_days: int, duration_slots: int,
+                slot_interval: int = 30) -> List[int]:
+    """Grid indexes of every start on local days first_day .. +num_days where the meeting ends within work hours."""
+    starts = []
+    for offset in range(num_days):
+        work_start, work_end = table.work_window(first_day + timedelta(days=offset), WORK_START_HOUR, WORK_END_HOUR)
+        first = -(-(work_start - grid_start) // slot_interval)
+        last = (work_end - grid_start) // slot_interval - duration_slots
+        starts.extend(range(max(first, 0), last + 1))
+    return starts
+
+
+@tracing.traced("compute.attendance_slots")
+def attendance_slots(views: Dict[str, str], grid_start: int, first_day: date, num_days: int, duration_minutes: int,
+                     slot_interval: int = 30, max_results: int = 10) -> List[dict]:
+    """
+    Rank work-hour start times on local days first_day .. +num_days by how many mailboxes are free.
+
+    Each row of the people x slots matrix is one mailbox's "whole meeting fits
+    from here" bitset; a slot's attendance is the column sum, accumulated by
+    walking the set bits of each row.
+    """
+    table = timegrid.offset_table(MEETING_ZONE, first_day, num_days)
+    duration_slots = -(-duration_minutes // slot_interval)
+    starts = work_starts(table, grid_start, first_day, num_days, duration_slots, slot_interval)
+    candidates = 0
+    for k in starts:
+        candidates |= 1 << k
+
+    counts = dict.fromkeys(starts, 0)
+    for view in views.values():
+        fits = run_mask(view_to_free_mask(view), duration_slots) & candidates
+        while fits:
+            low = fits & -fits
+            counts[low.bit_length() - 1] += 1
+            fits ^= low
+
+    best = sorted(starts, key=lambda k: (-counts[k], k))[:max_results]
+    return [{
+        "start": table.local_iso(grid_start + k * slot_interval),
+        "end": table.local_iso(grid_start + k * slot_interval + duration_minutes),
+        "attending": counts[k]
+    } for k in best]
+
+
+async def cached_common_slots(call, attendee_emails: List[str], date_str: str, duration_minutes: int = 30,
+                              slot_interval: int = 30) -> Optional[List[dict]]:
+    """
+    Answer a common-availability query from the free/busy snapshot cache only.
+
+    Returns None when the organizer or an attendee is not cached (a background
+    fetch is started so the next query hits), in which case the caller falls
+    back to findMeetingTimes.
+    """
+    my_address = cached_my_address(call)
+    if not my_address:
+        freebusy_cache.spawn(get_my_address(call))
+        return None
+
+    day = datetime.strptime(date_str, "%Y-%m-%d").date()
+    utc_day, utc_num_days, grid_start = local_days_grid(day, 1)
+    emails = list(dict.fromkeys(e.lower() for e in [my_address, *attendee_emails] if e))
+    views = freebusy_cache.peek(call, fetch_schedules, emails, utc_day, utc_num_days, slot_interval)
+    if views is None:
+        return None
+    return common_slots(views, grid_start, date_str, duration_minutes, slot_interval)
+
+
+async def find_recurring_slots(call, attendee_emails: List[str], first_date: str, pattern: str = "weekly",
+                               interval: int = 1, occurrences: int = 4, duration_minutes: int = 30,
+                               slot_interval: int = 30, max_results: int = 5) -> dict:
+    """
+    Rank start times of day by how many instances of a recurring series are conflict-free.
+
+    Free/busy for the organizer and all attendees is fetched once for the whole
+    series horizon, intersected across people, and then every instance day is
+    reduced to a "fits here" bitset so counting per start time is pure bit math.
+    """
+    instance_dates = expand_recurrence(first_date, pattern, interval, occurrences)
+    horizon_days = (instance_dates[-1] - instance_dates[0]).days + 1
+
+    emails = [await get_my_address(call)] + list(attendee_emails)
+    emails = list(dict.fromkeys(e.lower() for e in emails if e))
+    views, grid_start = await get_local_schedules(call, emails, instance_dates[0], horizon_days, slot_interval)
+    unresolved = [e for e in emails if e not in views]
+
+    with tracing.span("compute.recurring_slots", **{"slots.instances": len(instance_dates), "slots.mailboxes": len(views)}):
+        # 1. Intersect everybody's free slots over the whole horizon
+        combined = -1
+        for view in views.values():
+            combined &= view_to_free_mask(view)
+        if not views:
+            combined = 0
+
+        # 2. Per instance: which start slots (within work hours) fit the whole meeting.
+        #    Each instance's local work start is placed on the UTC grid, so DST changes inside the series shift correctly.
+        table = timegrid.offset_table(MEETING_ZONE, instance_dates[0], horizon_days)
+        work_slots = (WORK_END_HOUR - WORK_START_HOUR) * 60 // slot_interval
+        duration_slots = -(-duration_minutes // slot_interval)
+        if duration_slots > work_slots:
+            raise ValueError("Meeting duration does not fit in working hours")
+        window = (1 << work_slots) - 1
+
+        fits = []
+        for day in instance_dates:
+            day_start = (table.work_window(day, WORK_START_HOUR, WORK_END_HOUR)[0] - grid_start) // slot_interval
+            day_mask = (combined >> day_start) & window
+            fits.append(run_mask(day_mask, duration_slots))
+
+        # 3. Count conflict-free instances per start slot and rank
+        candidates = []
+        for k in range(work_slots - duration_slots + 1):
+            conflicts = [d.isoformat() for d, fit in zip(instance_dates, fits) if not (fit >> k) & 1]
+            start_min = WORK_START_HOUR * 60 + k * slot_interval
+            end_min = start_min + duration_minutes
+            candidates.append({
+                "start_time": f"{start_min // 60:02d}:{start_min % 60:02d}:00",
+                "end_time": f"{end_min // 60:02d}:{end_min % 60:02d}:00",
+                "free_instances": len(instance_dates) - len(conflicts),
+                "total_instances": len(instance_dates),
+                "conflicts": conflicts
+            })
+        candidates.sort(key=lambda c: -c["free_instances"])
+
+    return {
+        "instances": [d.isoformat() for d in instance_dates],
+        "slots": candidates[:max_results],
+        "unresolved": unresolved
+    }
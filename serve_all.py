@@ -0,0 +1,27 @@
+"""
+Run the FastMCP server (server.py, stdio) and the North MCP server (main.py,
+streamable HTTP on its configured port) in one process.
+
+Both are thin layers over meeting_core, so in one process they share the Graph
+connection pool, the free/busy, directory and last-known-good caches, the
+circuit breakers and metrics.REGISTRY instead of paying for each twice.
+
+Usage:
+    python serve_all.py
+"""
+import asyncio
+
+import main
+import server
+
+
+async def serve():
+    # Warm-up (MCP_WARMUP=1) starts from the stdio server's lifespan, on this loop
+    await asyncio.gather(
+        server.mcp.run_stdio_async(),
+        main.server.run_streamable_http_async()
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(serve())
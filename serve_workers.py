@@ -0,0 +1,43 @@
+"""
+Run the North MCP server (main.py) as several worker processes behind one port.
+
+uvicorn binds the port once and forks MCP_WORKERS processes that accept on it,
+so JSON decoding and slot computation use as many cores as there are workers.
+The workers share one cache tier (shared_cache.py, SQLite WAL at
+SHARED_CACHE_PATH): tokens, the room catalog, group memberships, last known good
+answers, booking tickets and the free/busy snapshots are fetched once for all
+of them, and invalidations reach every worker.
+
+Other settings for multi-worker mode:
+- streamable HTTP runs stateless, since consecutive requests of one MCP session
+  may land on different workers;
+- GRAPH_MAX_CONCURRENCY is the cap for the whole host and is split evenly
+  across the workers' fair schedulers.
+
+Usage:
+    MCP_WORKERS=4 python serve_workers.py
+"""
+import os
+
+import uvicorn
+
+WORKERS = int(os.getenv("MCP_WORKERS", str(os.cpu_count() or 1)))
+HOST = os.getenv("MCP_HOST", "0.0.0.0")
+PORT = int(os.getenv("MCP_PORT", "3001"))
+
+
+def create_app():
+    """ASGI app for one worker (called by uvicorn in each worker process)."""
+    import main
+
+    main.server.settings.stateless_http = True
+    return main.server.streamable_http_app()
+
+
+if __name__ == "__main__":
+    # Inherited by the worker processes
+    os.environ.setdefault("SHARED_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "shared_cache.db"))
+    host_cap = int(os.getenv("GRAPH_MAX_CONCURRENCY", "8"))
+    os.environ["GRAPH_MAX_CONCURRENCY"] = str(max(1, host_cap // WORKERS))
+
+    uvicorn.run("serve_workers:create_app", factory=True, host=HOST, port=PORT, workers=WORKERS)
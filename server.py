@@ -1,13 +1,20 @@
 import os
-import json
-import logging
-import httpx
-from datetime import datetime, timedelta
+from contextlib import asynccontextmanager
 from typing import List, Optional
-import msal
 from mcp.server.fastmcp import FastMCP
 from dotenv import load_dotenv
 
+import booking_queue
+import caches
+import circuit_breaker
+import deadlines
+import meeting_core
+import metrics
+import profiling
+import scheduling
+import tracing
+import warmup
+
 # Load environment variables
 load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
 
@@ -25,147 +32,110 @@ SCOPES = [
 ]
 CACHE_FILE = os.path.join(os.path.dirname(__file__), "token_cache.bin")
 
+@asynccontextmanager
+async def lifespan(_server):
+    """Warm caches (MCP_WARMUP=1) on the server's own loop while it starts serving."""
+    async with warmup.running(outlook.call_graph, outlook._get_token):
+        yield {}
+
 # Initialize MCP
-mcp = FastMCP("Outlook-Pro-Assistant")
+mcp = FastMCP("Outlook-Pro-Assistant", lifespan=lifespan)
 
-class OutlookManager:
+class OutlookManager(meeting_core.GraphEngine):
+    """Graph engine signed in with the MSAL token cache written by auth_setup.py"""
     def __init__(self):
-        self.cache = msal.SerializableTokenCache()
-        if os.path.exists(CACHE_FILE):
-             self.cache.deserialize(open(CACHE_FILE, "r").read())
-        
-        self.app = msal.PublicClientApplication(
-            CLIENT_ID,
-            authority=AUTHORITY,
-            token_cache=self.cache
-        )
+        super().__init__(meeting_core.MsalCacheAuth(CLIENT_ID, AUTHORITY, SCOPES, CACHE_FILE))
 
     def _get_token(self):
         """Get token from cache (refreshed automatically)"""
-        accounts = self.app.get_accounts()
-        if not accounts:
-            raise Exception("No accounts found. Please run 'python auth_setup.py' first.")
-        
-        result = self.app.acquire_token_silent(SCOPES, account=accounts[0])
-        
-        if self.cache.has_state_changed:
-            with open(CACHE_FILE, "w") as f:
-                f.write(self.cache.serialize())
-
-        if result and "access_token" in result:
-            return result["access_token"]
-        
-        raise Exception("Failed to acquire token silently. Please re-run 'python auth_setup.py'.")
+        return self.get_token()
 
     async def call_graph(self, method: str, endpoint: str, data: dict = None, params: dict = None):
-        """Generic Graph API caller"""
-        token = self._get_token()
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
-        url = f"https://graph.microsoft.com/v1.0{endpoint}"
-        
-        async with httpx.AsyncClient() as client:
-            try:
-                if method == "POST":
-                    resp = await client.post(url, headers=headers, json=data, params=params)
-                elif method == "GET":
-                    resp = await client.get(url, headers=headers, params=params)
-                
-                resp.raise_for_status()
-                return resp.json() if resp.status_code != 204 else {"status": "success"}
-            except httpx.HTTPStatusError as e:
-                # Catch detailed graph errors
-                print(f"Graph API Error: {e.response.text}")
-                raise e
+        """Generic Graph API caller (fails fast / serves cached reads while the endpoint's circuit is open)"""
+        return await self.call(method, endpoint, data, params)
 
 # Initialize Manager
 outlook = OutlookManager()
 
 @mcp.tool()
-async def search_users(query: str):
+@tracing.traced_tool
+@deadlines.bounded
+@circuit_breaker.serve_stale
+@profiling.profiled
+async def search_users(query: str, output_format: Optional[str] = None, max_results: int = 25):
     """
     Search for users in the organization by name or email keyword, also used for meeting room finding.
     Use this to verify a user's exact email address before booking or checking availability.
     
     Args:
         query: Name or part of an email to search for (e.g., "John", "service")
+        output_format: (Optional) 'compact' for a columnar result
+        max_results: (Optional) Maximum number of users to return (default 25)
     """
     try:
-        # Use $search for better keyword matching if supported, but $filter startsWith is safer for Basic Read
-        # We'll use filter on displayName and userPrincipalName
-        endpoint = "/users"
-        params = {
-            "$select": "displayName,userPrincipalName,mail",
-            "$filter": f"startsWith(displayName,'{query}') or startsWith(userPrincipalName,'{query}') or startsWith(mail,'{query}')",
-            "$top": 10
-        }
-        
-        data = await outlook.call_graph("GET", endpoint, params=params)
-        users = data.get("value", [])
-        
+        users = await meeting_core.search_users(outlook.call_graph, query, output_format, max_results)
         if not users:
             return f"No users found matching '{query}'."
-            
-        results = []
-        for u in users:
-            name = u.get("displayName")
-            email = u.get("mail") or u.get("userPrincipalName")
-            results.append({"name": name, "email": email})
-            
-        return results
+        return users
     except Exception as e:
         return f"Error searching users: {str(e)}"
 
 @mcp.tool()
-async def find_common_availability(attendee_emails: List[str], date_str: str, duration_minutes: int = 30):
+@tracing.traced_tool
+@deadlines.bounded
+@circuit_breaker.serve_stale
+@profiling.profiled
+async def find_common_availability(
+    attendee_emails: List[str],
+    date_str: str,
+    duration_minutes: int = 30,
+    output_format: Optional[str] = None,
+    mode: str = "standard",
+    days: int = 1,
+    optional_attendees: Optional[List[str]] = None,
+    need_room: bool = False
+):
     """
     Find common available time slots for the user and a list of attendees on a specific date.
     
     Args:
-        attendee_emails: List of email addresses (e.g., ["aaa@example.com", "bbb@example.com"])
+        attendee_emails: List of email addresses (e.g., ["aaa@example.com", "bbb@example.com"]);
+                         group / distribution list addresses are expanded to their members
         date_str: Date in 'YYYY-MM-DD' format
         duration_minutes: Duration of the meeting in minutes (default 30)
+        output_format: (Optional) 'compact' to group slots per day as [start, end] pairs
+        mode: (Optional) 'adaptive' for a coarse-to-fine search over several days,
+              returning free windows plus bytes/latency metrics;
+              'max_attendance' for the top slots ranked by how many attendees are free
+              (used automatically when a group or distribution list address is given);
+              'ranked' for the top slots where everyone is free, scored by time of day,
+              calendar fragmentation, optional attendees and rooms
+              (used automatically when optional_attendees or need_room is given)
+        days: (Optional) Number of days to search from date_str in adaptive / max_attendance / ranked mode
+        optional_attendees: (Optional) Email addresses of optional attendees (slots where more of them are free rank higher)
+        need_room: (Optional) Rank slots by how many meeting rooms are free
     """
-    start_time = f"{date_str}T08:00:00"
-    end_time = f"{date_str}T18:00:00" # Work hours assumption
-    
-    # 1. Resolve attendees
-    attendees = [{"emailAddress": {"address": email}, "type": "required"} for email in attendee_emails]
-    
-    # 2. Construct payload for findMeetingTimes
-    payload = {
-        "attendees": attendees,
-        "timeConstraint": {
-            "activityDomain": "work",
-            "timeslots": [{
-                "start": {"dateTime": start_time, "timeZone": "Pacific Standard Time"}, # Adjust TimeZone as needed or make configurable
-                "end": {"dateTime": end_time, "timeZone": "Pacific Standard Time"}
-            }]
-        },
-        "meetingDuration": f"PT{duration_minutes}M",
-        "returnSuggestionReasons": True,
-        "minimumAttendeePercentage": 100
-    }
-    
     try:
-        data = await outlook.call_graph("POST", "/me/findMeetingTimes", payload)
-        suggestions = data.get("meetingTimeSuggestions", [])
-        
-        # Format for easier reading
-        available_slots = []
-        for slot in suggestions:
-            start = slot["meetingTimeSlot"]["start"]["dateTime"]
-            end = slot["meetingTimeSlot"]["end"]["dateTime"]
-            available_slots.append(f"{start} to {end}")
-            
-        return available_slots
+        return await meeting_core.find_common_availability(
+            outlook.call_graph, attendee_emails, date_str, duration_minutes, output_format, mode, days,
+            optional_attendees, need_room
+        )
     except Exception as e:
         return f"Error finding availability: {str(e)}"
 
 @mcp.tool()
-async def find_available_rooms(date_str: str, start_time_str: str, end_time_str: str):
+@tracing.traced_tool
+@deadlines.bounded
+@circuit_breaker.serve_stale
+@profiling.profiled
+async def find_available_rooms(
+    date_str: str,
+    start_time_str: str,
+    end_time_str: str,
+    output_format: Optional[str] = None,
+    mode: str = "standard",
+    duration_minutes: Optional[int] = None
+):
     """
     Find available meeting rooms for a specific time slot.
     
@@ -173,51 +143,59 @@ async def find_available_rooms(date_str: str, start_time_str: str, end_time_str:
         date_str: 'YYYY-MM-DD'
         start_time_str: 'HH:MM:SS' (e.g. '14:00:00')
         end_time_str: 'HH:MM:SS' (e.g. '15:00:00')
+        output_format: (Optional) 'compact' for a columnar result
+        mode: (Optional) 'adaptive' for a coarse-to-fine check that also finds rooms
+              free for only part of the window, with bytes/latency metrics
+        duration_minutes: (Optional) In adaptive mode, minutes the room must be free (default: whole window)
     """
-    # 1. List all rooms (limit to 20 for performance)
     try:
-        rooms_data = await outlook.call_graph("GET", "/places/microsoft.graph.room")
-        rooms = rooms_data.get("value", [])
-        if not rooms:
-            return "No meeting rooms found in the directory."
-            
-        room_emails = [r.get("emailAddress") for r in rooms if r.get("emailAddress")]
-        
-        # 2. Check availability (getSchedule)
-        start_dt = f"{date_str}T{start_time_str}"
-        end_dt = f"{date_str}T{end_time_str}"
-        
-        payload = {
-            "schedules": room_emails,
-            "startTime": {"dateTime": start_dt, "timeZone": "Pacific Standard Time"},
-            "endTime": {"dateTime": end_dt, "timeZone": "Pacific Standard Time"},
-            "availabilityViewInterval": 60 # Check the whole block
-        }
-        
-        schedule_data = await outlook.call_graph("POST", "/me/calendar/getSchedule", payload)
-        
-        available_rooms = []
-        for item in schedule_data.get("value", []):
-            email = item["scheduleId"]
-            # key: 0=free, 1=tentative, 2=busy, 3=ood, 4=workingElsewhere
-            # We look for simple '0' (Free) in the schedule items or just check if there are NO busy blocks in the requested window
-            # The API returns 'scheduleItems'. If empty or status is free, it's good.
-            is_free = True
-            for event in item.get("scheduleItems", []):
-                if event["status"] != "free":
-                    is_free = False
-                    break
-            
-            if is_free:
-                # Find the room name
-                room_name = next((r["displayName"] for r in rooms if r.get("emailAddress") == email), email)
-                available_rooms.append({"name": room_name, "email": email})
-                
-        return available_rooms
+        return await meeting_core.find_available_rooms(
+            outlook.call_graph, date_str, start_time_str, end_time_str, output_format, mode, duration_minutes
+        )
+    except LookupError as e:
+        return str(e)
     except Exception as e:
         return f"Error finding rooms: {str(e)}"
 
 @mcp.tool()
+@tracing.traced_tool
+@deadlines.bounded
+@circuit_breaker.serve_stale
+@profiling.profiled
+async def find_recurring_availability(
+    attendee_emails: List[str],
+    first_date: str,
+    duration_minutes: int = 30,
+    pattern: str = "weekly",
+    interval: int = 1,
+    occurrences: int = 4
+):
+    """
+    Find the best time of day for a recurring meeting (e.g. a weekly or biweekly sync).
+    Slots are ranked by how many instances of the series are conflict-free for everyone.
+    Book the chosen slot with book_meeting using the same recurrence arguments.
+    
+    Args:
+        attendee_emails: List of email addresses
+        first_date: Date of the first instance in 'YYYY-MM-DD' format
+        duration_minutes: Duration of each meeting in minutes (default 30)
+        pattern: 'weekly' or 'daily'
+        interval: Repeat every N weeks/days (e.g. 2 with 'weekly' for biweekly)
+        occurrences: Number of meetings in the series
+    """
+    try:
+        return await scheduling.find_recurring_slots(
+            outlook.call_graph, attendee_emails, first_date,
+            pattern=pattern, interval=interval, occurrences=occurrences,
+            duration_minutes=duration_minutes
+        )
+    except Exception as e:
+        return f"Error finding recurring availability: {str(e)}"
+
+@mcp.tool()
+@tracing.traced_tool
+@deadlines.bounded
+@profiling.profiled
 async def book_meeting(
     subject: str,
     start_iso: str,
@@ -225,7 +203,12 @@ async def book_meeting(
     attendee_emails: List[str],
     room_email: Optional[str] = None,
     is_online: bool = False,
-    content: str = "Please join us for a meeting."
+    content: str = "Please join us for a meeting.",
+    recurrence_pattern: Optional[str] = None,
+    recurrence_interval: int = 1,
+    recurrence_occurrences: Optional[int] = None,
+    recurrence_end_date: Optional[str] = None,
+    wait_for_confirmation: bool = True
 ):
     """
     Book a meeting in Outlook.
@@ -238,45 +221,73 @@ async def book_meeting(
         room_email: (Optional) Email of the meeting room to book
         is_online: (Optional) If True, creates a Teams meeting
         content: Body of the meeting invite
+        recurrence_pattern: (Optional) 'weekly' or 'daily' to book a recurring series
+        recurrence_interval: (Optional) Repeat every N weeks/days (2 = biweekly)
+        recurrence_occurrences: (Optional) Number of meetings in the series
+        recurrence_end_date: (Optional) Last date of the series 'YYYY-MM-DD' (instead of occurrences)
+        wait_for_confirmation: (Optional) False to return a booking ticket immediately instead of
+              waiting for Outlook; check the outcome with get_booking_status
     """
-    
-    attendees = [{"emailAddress": {"address": email}, "type": "required"} for email in attendee_emails]
-    
-    if room_email:
-        attendees.append({"emailAddress": {"address": room_email}, "type": "resource"})
-        
-    location_display = "Online (Teams)" if is_online else "TBD"
-    if room_email:
-        # Ideally lookup name, but email is functional for booking
-        location_display = room_email 
-
-    payload = {
-        "subject": subject,
-        "body": {
-            "contentType": "HTML",
-            "content": content
-        },
-        "start": {
-            "dateTime": start_iso,
-            "timeZone": "Pacific Standard Time"
-        },
-        "end": {
-            "dateTime": end_iso,
-            "timeZone": "Pacific Standard Time"
-        },
-        "location": {
-            "displayName": location_display
-        },
-        "attendees": attendees,
-        "isOnlineMeeting": is_online,
-        "onlineMeetingProvider": "teamsForBusiness" if is_online else None
-    }
-    
     try:
-        result = await outlook.call_graph("POST", "/me/events", payload)
-        return f"Meeting booked successfully! WebLink: {result.get('webLink')}"
+        meeting = dict(
+            subject=subject, start_iso=start_iso, end_iso=end_iso,
+            attendee_emails=attendee_emails, room_email=room_email, is_online=is_online, content=content,
+            recurrence_pattern=recurrence_pattern, recurrence_interval=recurrence_interval,
+            recurrence_occurrences=recurrence_occurrences, recurrence_end_date=recurrence_end_date
+        )
+        if not wait_for_confirmation:
+            ticket = await booking_queue.submit(outlook.call_graph, meeting_core.build_event(**meeting))
+            return f"Booking queued. Ticket: {ticket['ticket']} (status: {ticket['status']}). Check the outcome with get_booking_status."
+        weblink = await meeting_core.book_meeting(outlook.call_graph, **meeting)
+        return f"Meeting booked successfully! WebLink: {weblink}"
     except Exception as e:
         return f"Failed to book meeting: {str(e)}"
 
+@mcp.tool()
+async def get_booking_status(ticket_id: str):
+    """
+    Check the outcome of a booking made with book_meeting(wait_for_confirmation=False).
+    Status is one of 'queued', 'submitting', 'retrying', 'booked' (with web_link) or 'failed' (with error).
+    
+    Args:
+        ticket_id: Ticket returned by book_meeting
+    """
+    ticket = booking_queue.status(ticket_id)
+    if ticket is None:
+        return f"Unknown or expired booking ticket: {ticket_id}"
+    return ticket
+
+@mcp.tool()
+async def server_metrics():
+    """
+    Diagnostics: counters and timings collected by this server (e.g. bytes and latency of adaptive searches).
+    """
+    return metrics.REGISTRY.snapshot()
+
+@mcp.tool()
+async def cache_stats():
+    """
+    Diagnostics: memory budget usage and per-cache entries, bytes, hit rate and evictions.
+    """
+    return caches.MANAGER.stats()
+
+# Admin tool: only exposed when explicitly enabled (see profiling.py)
+if profiling.ADMIN_TOOL_ENABLED:
+    @mcp.tool()
+    async def set_profiling(mode: Optional[str] = None, tools: Optional[List[str]] = None, sample_rate: Optional[float] = None):
+        """
+        Admin: switch per-tool profiling on or off at runtime and list the latest profile files.
+        Profiles (folded stacks for flamegraphs, plus cProfile dumps in 'full' mode) are written to MCP_PROFILE_DIR.
+    
+        Args:
+            mode: (Optional) 'off', 'sample' or 'full'
+            tools: (Optional) Tool names to profile (empty list = all tools)
+            sample_rate: (Optional) Fraction of matching calls to profile (0.0 - 1.0)
+        """
+        try:
+            return {"settings": profiling.configure(mode, tools, sample_rate), "recent_profiles": profiling.recent_profiles()}
+        except Exception as e:
+            return {"error": str(e)}
+
 if __name__ == "__main__":
     mcp.run()
\ No newline at end of file
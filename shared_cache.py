@@ -0,0 +1,179 @@
+"""
+Cross-process cache tier for multi-worker deployments (see serve_workers.py).
+
+When SHARED_CACHE_PATH is set, TTLCaches created with shared=True keep their
+entries in a SQLite database in WAL mode, which all worker processes on the
+host read and write concurrently. Each process keeps its in-memory copy as a
+first level. Writes and invalidations are appended to an invalidation log, and
+other workers drop their in-memory copies of those keys when they next read
+that cache (polled at most every SHARED_CACHE_SYNC_SECONDS; a read only, expired
+entries and old log rows are pruned by a background thread). So one worker's
+fetch (room catalog, group memberships, last known good Graph answers,
+booking tickets, tokens) serves every worker, and an invalidation, e.g. from a
+change notification, reaches all of them.
+
+Free/busy snapshots already live in SQLite (freebusy_cache.py) and use the same
+WAL settings, so they are shared as well.
+
+Without SHARED_CACHE_PATH (one process) nothing changes: `store` is None and
+shared caches are plain in-memory TTLCaches.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", "")
+SYNC_SECONDS = float(os.getenv("SHARED_CACHE_SYNC_SECONDS", "0.5"))
+# Invalidation log entries older than this are pruned (workers sync far more often)
+LOG_RETENTION_SECONDS = 600
+PRUNE_EVERY_SECONDS = 60
+BUSY_TIMEOUT_SECONDS = 5
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """SQLite connection set up for concurrent use by several processes."""
+    db = sqlite3.connect(path, check_same_thread=False, timeout=BUSY_TIMEOUT_SECONDS)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+
+def encode_key(key: Hashable) -> str:
+    return json.dumps(key, sort_keys=True, default=str)
+
+
+def decode_key(text: str) -> Hashable:
+    def freeze(value):
+        return tuple(freeze(v) for v in value) if isinstance(value, list) else value
+    return freeze(json.loads(text))
+
+
+class SharedStore:
+    def __init__(self, path: str):
+        self.path = path
+        self.db = connect(path)
+        # Token refreshes (asyncio.to_thread) and the server loop share this connection
+        self.lock = threading.Lock()
+        self.origin = os.getpid()
+        with self.lock:
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " namespace TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " stored_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS invalidations ("
+                " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " namespace TEXT NOT NULL,"
+                " key TEXT,"
+                " origin INTEGER NOT NULL,"
+                " at REAL NOT NULL)"
+            )
+            self.db.commit()
+            self.last_seq = self.db.execute("SELECT COALESCE(MAX(seq), 0) FROM invalidations").fetchone()[0]
+        self.synced_at = time.monotonic()
+
+    def get(self, namespace: str, key: Hashable) -> Optional[Tuple[Any, float]]:
+        """(value, stored_at) or None."""
+        with self.lock:
+            row = self.db.execute(
+                "SELECT value, stored_at FROM entries WHERE namespace = ? AND key = ?", (namespace, encode_key(key))
+            ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def put(self, namespace: str, key: Hashable, value: Any, stored_at: float):
+        encoded = encode_key(key)
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                            (namespace, encoded, json.dumps(value, default=str), stored_at))
+            self._log(namespace, encoded)
+            self.db.commit()
+
+    def delete(self, namespace: str, key: Optional[Hashable] = None):
+        """Drop one key, or the whole namespace when key is None, in every worker."""
+        encoded = None if key is None else encode_key(key)
+        with self.lock:
+            if encoded is None:
+                self.db.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+            else:
+                self.db.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, encoded))
+            self._log(namespace, encoded)
+            self.db.commit()
+
+    def keys(self, namespace: str) -> List[Hashable]:
+        with self.lock:
+            rows = self.db.execute("SELECT key FROM entries WHERE namespace = ?", (namespace,)).fetchall()
+        return [decode_key(row[0]) for row in rows]
+
+    def _log(self, namespace: str, encoded_key: Optional[str]):
+        self.db.execute("INSERT INTO invalidations (namespace, key, origin, at) VALUES (?, ?, ?, ?)",
+                        (namespace, encoded_key, self.origin, time.time()))
+
+    def changes(self) -> List[Tuple[str, Optional[Hashable]]]:
+        """(namespace, key or None for all) written or invalidated by other workers since the last call."""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT seq, namespace, key, origin FROM invalidations WHERE seq > ? ORDER BY seq", (self.last_seq,)
+            ).fetchall()
+            if rows:
+                self.last_seq = rows[-1][0]
+        return [(namespace, None if key is None else decode_key(key))
+                for _, namespace, key, origin in rows if origin != self.origin]
+
+    def prune(self, max_age_seconds: Dict[str, float]):
+        """
+        Drop entries older than their namespace's TTL and old invalidation log rows.
+        Uses its own connection, so lookups on the shared one are not held up meanwhile.
+        """
+        now = time.time()
+        db = connect(self.path)
+        try:
+            for namespace, max_age in max_age_seconds.items():
+                db.execute("DELETE FROM entries WHERE namespace = ? AND stored_at < ?", (namespace, now - max_age))
+            db.execute("DELETE FROM invalidations WHERE at < ?", (now - LOG_RETENTION_SECONDS,))
+            db.commit()
+        finally:
+            db.close()
+
+
+store: Optional[SharedStore] = SharedStore(SHARED_CACHE_PATH) if SHARED_CACHE_PATH else None
+# name -> TTLCache, for applying other workers' invalidations
+_caches: Dict[str, Any] = {}
+
+
+def register(cache):
+    _caches[cache.name] = cache
+
+
+def sync():
+    """Apply other workers' writes and invalidations to the in-memory copies (rate limited)."""
+    if store is None or time.monotonic() - store.synced_at < SYNC_SECONDS:
+        return
+    store.synced_at = time.monotonic()
+    for namespace, key in store.changes():
+        cache = _caches.get(namespace)
+        if cache is not None:
+            cache.drop_local(key)
+
+
+def _prune_periodically():
+    """Background thread: the DELETEs stay off the event loop and out of cache lookups."""
+    while True:
+        time.sleep(PRUNE_EVERY_SECONDS)
+        try:
+            store.prune({name: cache.ttl_seconds for name, cache in list(_caches.items())})
+        except Exception as e:
+            logger.warning(f"Pruning the shared cache failed: {e}")
+
+
+if store is not None:
+    threading.Thread(target=_prune_periodically, name="shared-cache-prune", daemon=True).start()
@@ -0,0 +1,150 @@
+"""
+Local ranking of candidate meeting slots.
+
+Candidates are the work-hour start times (on the scheduling.py slot grid) where
+every required attendee is free for the whole meeting. Each candidate gets one
+row of features, all in [0, 1]:
+
+    time_of_day    how close the meeting's middle is to PREFERRED_HOUR (local)
+    fragmentation  share of required attendees left with a short, hardly usable
+                   free gap (< MIN_USEFUL_GAP_MINUTES) right before or after it
+    adjacency      share of required attendees for whom it is back to back with
+                   an existing meeting (keeps the rest of their day in one piece)
+    optional       share of optional attendees free for the whole meeting
+    rooms          share of the candidate rooms free for the whole meeting
+
+and its score is the dot product with WEIGHTS. The top k are picked with a heap.
+
+The features are computed column-wise over the people x slots matrix with
+numpy: per person, the length of the free run ending at / starting at every
+slot, then a gather at the candidate indexes.
+"""
+import heapq
+import os
+from datetime import date
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import scheduling
+import timegrid
+import tracing
+
+PREFERRED_HOUR = float(os.getenv("SLOT_PREFERRED_HOUR", "11"))
+MIN_USEFUL_GAP_MINUTES = int(os.getenv("SLOT_MIN_USEFUL_GAP_MINUTES", "60"))
+
+FEATURES = ("time_of_day", "fragmentation", "adjacency", "optional", "rooms")
+WEIGHTS = {"time_of_day": 1.0, "fragmentation": -1.5, "adjacency": 0.5, "optional": 2.0, "rooms": 1.0}
+
+
+def _time_of_day(table, grid_start: int, candidates: List[int], duration_minutes: int, slot_interval: int) -> List[float]:
+    """1 at PREFERRED_HOUR, falling linearly to 0 half a work day away."""
+    half_span = (scheduling.WORK_END_HOUR - scheduling.WORK_START_HOUR) * 30
+    preferred = PREFERRED_HOUR * 60
+    scores = []
+    for k in candidates:
+        middle = table.to_local(grid_start + k * slot_interval + duration_minutes // 2) % timegrid.MINUTES_PER_DAY
+        scores.append(max(0.0, 1 - abs(middle - preferred) / half_span))
+    return scores
+
+
+def _free_matrix(views: List[str], num_slots: int):
+    """people x slots bool matrix (slots past the end of a view count as busy)."""
+    if not views:
+        return np.zeros((0, num_slots), dtype=bool)
+    raw = "".join(view[:num_slots].ljust(num_slots, "2") for view in views).encode()
+    return (np.frombuffer(raw, dtype=np.uint8) == ord("0")).reshape(len(views), num_slots)
+
+
+def _runs(free):
+    """Length of the free run ending at (inclusive) and starting at every slot, per row."""
+    index = np.arange(free.shape[1])
+    ending = index - np.maximum.accumulate(np.where(free, -1, index), axis=1)
+    reverse = free[:, ::-1]
+    starting = (index - np.maximum.accumulate(np.where(reverse, -1, index), axis=1))[:, ::-1]
+    return ending, starting
+
+
+def _features(required, optional, rooms, work, starts, duration_slots, min_gap):
+    num_slots = len(work)
+    starts = np.asarray(starts, dtype=np.int64)
+    work = np.asarray(work, dtype=bool)
+
+    free = _free_matrix(required, num_slots)
+    ending, _ = _runs(free)
+    candidates = starts[(ending[:, starts + duration_slots - 1] >= duration_slots).all(axis=0)]
+    if not len(candidates):
+        return [], None
+
+    # Gaps inside work hours only: evenings do not make a 30 minute leftover usable
+    before_ending, _ = _runs(free & work)
+    _, after_starting = _runs(np.pad(free & work, ((0, 0), (0, 1))))
+    prev, after = candidates - 1, candidates + duration_slots
+    before_gap = np.where(prev >= 0, before_ending[:, np.maximum(prev, 0)], 0)
+    after_gap = after_starting[:, after]
+    fragmented = ((before_gap > 0) & (before_gap < min_gap)) | ((after_gap > 0) & (after_gap < min_gap))
+
+    padded = np.pad(free, ((0, 0), (0, 1)), constant_values=True)
+    work_padded = np.append(work, False)
+    busy_before = (prev >= 0) & work_padded[np.maximum(prev, 0)] & ~padded[:, np.maximum(prev, 0)]
+    busy_after = work_padded[after] & ~padded[:, after]
+    adjacent = busy_before | busy_after
+
+    def coverage(views):
+        if not views:
+            return np.zeros(len(candidates)), np.zeros(len(candidates), dtype=np.int64)
+        fits = _runs(_free_matrix(views, num_slots))[0][:, candidates + duration_slots - 1] >= duration_slots
+        return fits.mean(axis=0), fits.sum(axis=0)
+
+    optional_share, optional_free = coverage(optional)
+    room_share, rooms_free = coverage(rooms)
+    matrix = np.column_stack([
+        np.zeros(len(candidates)), fragmented.mean(axis=0), adjacent.mean(axis=0), optional_share, room_share
+    ])
+    return candidates.tolist(), (matrix, optional_free.tolist(), rooms_free.tolist())
+
+
+@tracing.traced("compute.rank_slots")
+def rank_slots(views: Dict[str, str], grid_start: int, first_day: date, num_days: int, duration_minutes: int,
+               optional_views: Optional[Dict[str, str]] = None, room_views: Optional[Dict[str, str]] = None,
+               slot_interval: int = 30, max_results: int = 10) -> List[dict]:
+    """
+    Top `max_results` slots on local days first_day .. +num_days where everyone in `views` is free,
+    best first, with their score and how many optional attendees / rooms are free.
+    """
+    table = timegrid.offset_table(scheduling.MEETING_ZONE, first_day, num_days)
+    duration_slots = -(-duration_minutes // slot_interval)
+    everything = [*views.values(), *(optional_views or {}).values(), *(room_views or {}).values()]
+    num_slots = max((len(view) for view in everything), default=0)
+    starts = [k for k in scheduling.work_starts(table, grid_start, first_day, num_days, duration_slots, slot_interval)
+              if k + duration_slots <= num_slots]
+    if not starts or not views:
+        return []
+
+    work_mask = table.work_mask(grid_start, num_slots, slot_interval, scheduling.WORK_START_HOUR, scheduling.WORK_END_HOUR)
+    work = [bool((work_mask >> i) & 1) for i in range(num_slots)]
+    min_gap = -(-MIN_USEFUL_GAP_MINUTES // slot_interval)
+    candidates, result = _features(list(views.values()), list((optional_views or {}).values()),
+                                  list((room_views or {}).values()), work, starts, duration_slots, min_gap)
+    if not candidates:
+        return []
+
+    matrix, optional_free, rooms_free = result
+    time_of_day = _time_of_day(table, grid_start, candidates, duration_minutes, slot_interval)
+    weights = [WEIGHTS[name] for name in FEATURES]
+    matrix[:, 0] = time_of_day
+    scores = (matrix @ np.asarray(weights)).tolist()
+
+    # Ties go to the earlier slot
+    best = heapq.nlargest(max_results, range(len(candidates)), key=lambda j: (scores[j], -j))
+    slots = []
+    for j in best:
+        start = grid_start + candidates[j] * slot_interval
+        slot = {"start": table.local_iso(start), "end": table.local_iso(start + duration_minutes),
+                "score": round(scores[j], 3)}
+        if optional_views:
+            slot["optional_free"] = int(optional_free[j])
+        if room_views:
+            slot["rooms_free"] = int(rooms_free[j])
+        slots.append(slot)
+    return slots
@@ -1,39 +1,23 @@
-import win32com.client
+import os
 from datetime import datetime, timedelta
 
-try:
-    import zoneinfo
-except ImportError:
-    zoneinfo = None
-
-try:
-    from dateutil import tz as dateutil_tz
-except ImportError:
-    dateutil_tz = None
-
-def get_toronto_tz():
-    # 1. Try built-in or backport zoneinfo
-    if zoneinfo:
-        try:
-            return zoneinfo.ZoneInfo("America/Toronto")
-        except Exception:
-            pass # ZoneInfoNotFoundError or similar (no tzdata)
-
-    # 2. Try dateutil (often has internal windows mapping)
-    if dateutil_tz:
-        tz = dateutil_tz.gettz("America/Toronto")
-        if tz:
-            return tz
-
-    # 3. Fallback to fixed EST (UTC-5)
-    # Note: This doesn't handle DST automatically, but is a safe fallback for "now" in Feb.
-    return datetime.timezone(timedelta(hours=-5), name="EST")
+# Repository-root modules (the entry point, ui.py, puts the root on sys.path)
+import com_pool
+import timegrid
+
+# IANA name (or Windows name) of the zone the desktop app works in
+LOCAL_TIMEZONE = os.getenv("MEETING_TIMEZONE", "America/Toronto")
+SLOT_MINUTES = 30
+
+def get_local_tz():
+    # zoneinfo, then dateutil, then a fixed standard-time offset (see timegrid.get_zone)
+    return timegrid.get_zone(LOCAL_TIMEZONE)
 
 def get_next_7_working_days():
     """获取今天起未来7个工作日（含今天）的日期列表"""
     dates = []
     # Make sure we use an aware datetime for local timezone
-    current_date = datetime.now(get_toronto_tz()).replace(hour=0, minute=0, second=0, microsecond=0)
+    current_date = datetime.now(get_local_tz()).replace(hour=0, minute=0, second=0, microsecond=0)
     while len(dates) < 7:
         # 0=Monday, 4=Friday, 5=Saturday, 6=Sunday
         if current_date.weekday() < 5:
@@ -41,119 +25,101 @@ def get_next_7_working_days():
         current_date += timedelta(days=1)
     return dates
 
-def find_free_slots_next_7_working_days(my_email, participant_emails, working_hours_only=False):
+def _slot_range(day_start, first, last, zone):
+    """Slot indices [first, last) of a day starting at UTC minute `day_start` -> aware (start, end)."""
+    return (
+        timegrid.from_minutes(day_start + first * SLOT_MINUTES, zone),
+        timegrid.from_minutes(day_start + last * SLOT_MINUTES, zone)
+    )
+
+def search_free_slots_next_7_working_days(my_email, participant_emails, working_hours_only=False, pool=None):
     """
-    查询包括我在内和所有participants包括今天在内,未来7个工作日内的所有Free time
-    返回格式: { "YYYY-MM-DD": [ (start_datetime, end_datetime), ... ] }
-    working_hours_only: If True, only check times between 9:00 and 17:00
+    Non-blocking version of find_free_slots_next_7_working_days: queues one FreeBusy job per
+    (recipient, day) on the COM worker pool and returns a Future of (daily_slots, error).
     """
     all_emails = [my_email.strip()] + [e.strip() for e in participant_emails if e.strip()]
     working_days = get_next_7_working_days()
-    
-    try:
-        outlook = win32com.client.Dispatch("Outlook.Application")
-        ns = outlook.GetNamespace("MAPI")
-        
-        # 结果字典
-        daily_slots = {day.strftime("%Y-%m-%d"): [] for day in working_days}
-        
-        # 即使无法解析某些收件人，也尽量尝试（这里简化处理，假设都能解析）
-        recipients = []
-        for email in all_emails:
-            recip = ns.CreateRecipient(email)
-            recip.Resolve()
-            if recip.Resolved:
-                recipients.append(recip)
-        
-        if not recipients:
+    pool = pool or com_pool.default_pool()
+
+    # 每个 (收件人, 日期) 一个任务, 由多个 COM 工作线程并行处理; 无法解析的收件人返回 None
+    jobs = [(day, email) for day in working_days for email in all_emails]
+    futures = [pool.free_busy(email, day, SLOT_MINUTES, False) for day, email in jobs]
+
+    def collect(results):
+        fbs = {}
+        for (day, email), fb_str in zip(jobs, results):
+            if fb_str is not None:
+                fbs.setdefault(day.strftime("%Y-%m-%d"), []).append(fb_str)
+        if not fbs:
             return {}, "未能解析任何有效邮箱"
+        return _common_free_slots(working_days, fbs, working_hours_only), None
 
-        # Determine range based on working_hours_only
-        # 9:00 is 18 * 30min
-        # 17:00 is 34 * 30min
-        start_idx = 18 if working_hours_only else 0
-        end_idx = 34 if working_hours_only else 48
-
-        # 遍历7个工作日
-        for day in working_days:
-            # 获取当天的忙闲信息 (00:00 - 23:59)
-            # interval = 30 minutes
-            day_str = day.strftime("%Y-%m-%d")
-            
-            # FreeBusy 方法参数: StartDate, Interval, CompleteFormat
-            # 注意: FreeBusy 返回的是字符串，每位代表 Interval 分钟
-            # 我们请求整天，从 00:00 开始
-            
-            # 获取当天所有人的 FreeBusy 字符串
-            # 长度 = 24 * 60 / 30 = 48 个字符
-            day_fbs = []
-            for recip in recipients:
-                #为了准确，查询时间设为当天0点，长度涵盖全天
-                fb_str = recip.FreeBusy(day, 30, False) # False returns 0/1 string
-                # 截取当天的部分 (前48个字符)
-                day_fbs.append(fb_str[:48]) 
-            
-            # 计算共同空闲 ('0')
-            # 逻辑: 只要某一位所有人都是 '0'，则该时段空闲
-            
-            current_start = None
-            
-            # 遍历刻度
-            # 注意：如果 working_hours_only=True，我们只关心 9:00-17:00
-            for i in range(start_idx, end_idx):
-                # 检查所有人在这个刻度是否都空闲
-                is_free = all(len(fb) > i and fb[i] == '0' for fb in day_fbs)
-                
-                start_time = day + timedelta(minutes=i*30)
-                end_time = day + timedelta(minutes=(i+1)*30)
-                
-                if is_free:
-                    if current_start is None:
-                        current_start = start_time
-                    # 继续延续
-                else:
-                    if current_start:
-                        # 结束一段连续空闲
-                        daily_slots[day_str].append((current_start, start_time)) # start_time 即为上一段的结束
-                        current_start = None
-            
-            # 如果最后还在空闲 (例如 17:00 结束时)
-            if current_start:
-                # 如果是 working_hours_only, 结束时间强制为 last slot end (e.g. 17:00)
-                # 否则 loop 结束是 24:00 (i=47 -> end=i+1=48 -> 00:00 next day)
-                # 上面的 loop `end_time` 已经是当前 slot 的结束时间
-                # 如果 loop 正常结束，`end_time` 是最后一个 slot 的结束时间
-                daily_slots[day_str].append((current_start, end_time))
-
-        return daily_slots, None
+    return com_pool.when_all(futures, collect)
 
+def find_free_slots_next_7_working_days(my_email, participant_emails, working_hours_only=False):
+    """
+    查询包括我在内和所有participants包括今天在内,未来7个工作日内的所有Free time
+    返回格式: { "YYYY-MM-DD": [ (start_datetime, end_datetime), ... ] }
+    working_hours_only: If True, only check times between 9:00 and 17:00
+    """
+    try:
+        return search_free_slots_next_7_working_days(my_email, participant_emails, working_hours_only).result()
     except Exception as e:
         return {}, f"Error: {str(e)}"
 
+def _common_free_slots(working_days, fbs, working_hours_only):
+    """fbs: { "YYYY-MM-DD": [FreeBusy 字符串, ...] } -> { "YYYY-MM-DD": [ (start_datetime, end_datetime), ... ] }"""
+    # 结果字典
+    daily_slots = {day.strftime("%Y-%m-%d"): [] for day in working_days}
+
+    # 每天的刻度换算在 UTC 分钟上进行: 夏令时切换日有 46 或 50 个刻度, 不是固定 48 个
+    zone = get_local_tz()
+    first_day = working_days[0].date()
+    table = timegrid.offset_table(LOCAL_TIMEZONE, first_day, (working_days[-1].date() - first_day).days + 1)
+
+    # 遍历7个工作日
+    for day in working_days:
+        day_str = day.strftime("%Y-%m-%d")
+        day_start = table.local_midnight(day.date())
+        day_end = table.local_midnight(day.date() + timedelta(days=1))
+        day_len = (day_end - day_start) // SLOT_MINUTES
+
+        # Determine range based on working_hours_only (9:00 - 17:00 local)
+        if working_hours_only:
+            work_start, work_end = table.work_window(day.date(), 9, 17)
+            start_idx = (work_start - day_start) // SLOT_MINUTES
+            end_idx = (work_end - day_start) // SLOT_MINUTES
+        else:
+            start_idx, end_idx = 0, day_len
+
+        # FreeBusy 返回的是字符串，每位代表 Interval 分钟, 从当天 00:00 开始; 截取当天的部分
+        day_fbs = [fb_str[:day_len] for fb_str in fbs.get(day_str, [])]
+
+        # 计算共同空闲 ('0'): 只要某一位所有人都是 '0'，则该时段空闲
+        current_start = None
+        for i in range(start_idx, end_idx):
+            is_free = all(len(fb) > i and fb[i] == '0' for fb in day_fbs)
+            if is_free:
+                if current_start is None:
+                    current_start = i
+            elif current_start is not None:
+                # 结束一段连续空闲
+                daily_slots[day_str].append(_slot_range(day_start, current_start, i, zone))
+                current_start = None
+
+        # 如果最后还在空闲 (例如 17:00 结束时)
+        if current_start is not None:
+            daily_slots[day_str].append(_slot_range(day_start, current_start, end_idx, zone))
+
+    return daily_slots
+
 def create_outlook_meeting(subject, body, required_emails, start_time, end_time):
     """
-    创建并显示会议窗口
+    创建并显示会议窗口 (在 COM 工作线程上执行)
     start_time, end_time: datetime objects
     """
     try:
-        outlook = win32com.client.Dispatch("Outlook.Application")
-        meeting = outlook.CreateItem(1) # 1 = olAppointmentItem
-        
-        meeting.Subject = subject
-        meeting.Body = body
-        meeting.Start = start_time
-        meeting.End = end_time
-        meeting.MeetingStatus = 1 # olMeeting
-        
-        for email in required_emails:
-            if email.strip():
-                try:
-                    meeting.Recipients.Add(email.strip())
-                except:
-                    pass
-        
-        meeting.Recipients.ResolveAll()
-        meeting.Display() # 弹出窗口
+        com_pool.default_pool().create_meeting(subject, body, required_emails, start_time, end_time).result()
         return True, "Meeting window opened"
     except Exception as e:
-        return False, str(e)
\ No newline at end of file
+        return False, str(e)
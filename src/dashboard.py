@@ -0,0 +1,91 @@
+html_dashboard = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Meeting Scheduler</title>
+<style>
+  body { font-family: "Segoe UI", sans-serif; background: #f5f5f5; color: #333; margin: 20px; }
+  input, button { font-size: 14px; padding: 6px; margin: 4px 0; }
+  button { background: #0078d4; color: white; border: none; cursor: pointer; }
+  #days { display: flex; gap: 8px; margin-top: 16px; flex-wrap: wrap; }
+  .day { background: white; padding: 8px; min-width: 120px; }
+  .day h4 { margin: 0 0 6px 0; }
+  .slot { cursor: pointer; padding: 2px 4px; }
+  .slot:hover { background: #deecf9; }
+</style>
+</head>
+<body>
+  <h2>Meeting Scheduler</h2>
+  <div>
+    <label>Participants (comma separated): <input id="attendees" size="60"></label><br>
+    <label>From: <input id="start" type="date"></label>
+    <label>Days: <input id="days-count" type="number" value="5" min="1" max="30"></label>
+    <label>Duration (min): <input id="duration" type="number" value="30" step="15"></label>
+    <button onclick="search()">Search Availability</button>
+  </div>
+  <div id="status"></div>
+  <div id="days"></div>
+  <div id="booking" style="display:none">
+    <h3>Book <span id="picked"></span></h3>
+    <label>Subject: <input id="subject" value="Meeting Request"></label>
+    <button onclick="book()">Reserve Meeting</button>
+  </div>
+<script>
+let source = null, picked = null;
+document.getElementById("start").valueAsDate = new Date();
+
+function search() {
+  if (source) source.close();
+  document.getElementById("days").innerHTML = "";
+  document.getElementById("status").textContent = "Searching...";
+  const params = new URLSearchParams({
+    attendees: document.getElementById("attendees").value,
+    start_date: document.getElementById("start").value,
+    days: document.getElementById("days-count").value,
+    duration: document.getElementById("duration").value
+  });
+  source = new EventSource("/api/availability?" + params);
+  source.addEventListener("day", e => showDay(JSON.parse(e.data)));
+  source.addEventListener("error", e => { if (e.data) document.getElementById("status").textContent = JSON.parse(e.data).error; });
+  source.addEventListener("done", () => { source.close(); document.getElementById("status").textContent = ""; });
+}
+
+function showDay(day) {
+  const col = document.createElement("div");
+  col.className = "day";
+  col.innerHTML = "<h4>" + day.date + "</h4>";
+  if (!day.slots.length) col.innerHTML += "<div>No free time</div>";
+  for (const [start, end] of day.slots) {
+    const slot = document.createElement("div");
+    slot.className = "slot";
+    slot.textContent = start + " - " + end;
+    slot.onclick = () => pick(day.date, start, end);
+    col.appendChild(slot);
+  }
+  const columns = [...document.getElementById("days").children, col].sort((a, b) => a.firstChild.textContent.localeCompare(b.firstChild.textContent));
+  document.getElementById("days").replaceChildren(...columns);
+}
+
+function pick(date, start, end) {
+  picked = {start_iso: date + "T" + start + ":00", end_iso: date + "T" + end + ":00"};
+  document.getElementById("picked").textContent = date + " " + start + " - " + end;
+  document.getElementById("booking").style.display = "block";
+}
+
+async function book() {
+  const resp = await fetch("/api/bookings", {
+    method: "POST",
+    headers: {"Content-Type": "application/json"},
+    body: JSON.stringify({
+      ...picked,
+      subject: document.getElementById("subject").value,
+      attendee_emails: document.getElementById("attendees").value.split(",").map(s => s.trim()).filter(s => s)
+    })
+  });
+  const body = await resp.json();
+  document.getElementById("status").textContent = resp.ok ? body.result : "Booking failed: " + (body.error || resp.status + " " + resp.statusText);
+}
+</script>
+</body>
+</html>
+"""
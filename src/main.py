@@ -1,19 +1,36 @@
+import asyncio
+import os
+
 from fastapi import FastAPI
 from fastapi.responses import HTMLResponse
-from src.routers import api
-from src.murals import router as murals_router
-from src import ui
+from src.routers import api, notifications
+from src import dashboard
+
+from server import outlook
+from subscriptions import SubscriptionManager
+
+# The API books meetings as the signed-in user and has no auth of its own: local only unless API_HOST says otherwise
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", "8000"))
 
 app = FastAPI(title="Meeting Booking")
 
+# Graph change notifications keep the Graph caches fresh (enabled by GRAPH_NOTIFICATION_URL)
+app.state.subscriptions = SubscriptionManager(outlook.call_graph)
+
 # Include routers
-# app.include_router(api.router, prefix="/auth", tags=["auth"])
-# app.include_router(murals_router.router, prefix="/murals", tags=["murals"])
+app.include_router(api.router, prefix="/api", tags=["api"])
+app.include_router(notifications.router, prefix="/notifications", tags=["notifications"])
+
+@app.on_event("startup")
+async def start_subscriptions():
+    if app.state.subscriptions.enabled:
+        app.state.subscription_task = asyncio.create_task(app.state.subscriptions.run())
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root():
-    return ui.html_dashboard
+    return dashboard.html_dashboard
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("src.main:app", host="0.0.0.0", port=8000, reload=True)
+    uvicorn.run("src.main:app", host=API_HOST, port=API_PORT, reload=True)
@@ -0,0 +1,119 @@
+import asyncio
+import hashlib
+import json
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+from fastapi import APIRouter, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+import scheduling
+import server
+from caches import TTLCache
+
+router = APIRouter()
+
+# Identical queries from many dashboard users within a few seconds share one computation
+RESULT_TTL_SECONDS = 30
+# Same limit as the dashboard's day picker; each day is one Graph fan-out task
+MAX_SEARCH_DAYS = 30
+results = TTLCache("api_results", RESULT_TTL_SECONDS, max_entries=512)
+
+
+def _etag_response(request: Request, payload) -> Response:
+    """JSON response with a content ETag; 304 when the client already has this version."""
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    etag = '"' + hashlib.sha1(body.encode()).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def _search_days(start_date: str, days: int, weekdays_only: bool) -> List[date]:
+    day = datetime.strptime(start_date, "%Y-%m-%d").date()
+    found = []
+    while len(found) < days:
+        if not weekdays_only or day.weekday() < 5:
+            found.append(day)
+        day += timedelta(days=1)
+    return found
+
+
+async def _day_result(emails: List[str], day: date, duration: int) -> dict:
+    key = ("day", tuple(emails), day, duration)
+    cached = results.get(key)
+    if cached is None:
+        views, grid_start = await scheduling.get_local_schedules(server.outlook.call_graph, emails, day, 1)
+        slots = scheduling.common_slots(views, grid_start, day.isoformat(), duration)
+        cached = {"date": day.isoformat(), "slots": [[s["start"][11:16], s["end"][11:16]] for s in slots]}
+        results.set(key, cached)
+    return cached
+
+
+@router.get("/availability")
+async def availability(request: Request, attendees: str, start_date: str, days: int = 5, duration: int = 30,
+                       weekdays_only: bool = True):
+    """
+    Common free slots for the signed-in user and `attendees` (comma-separated) over `days` days (at most MAX_SEARCH_DAYS).
+    With Accept: text/event-stream each day is streamed as soon as it is computed.
+    """
+    days = max(1, min(days, MAX_SEARCH_DAYS))
+    me = await scheduling.get_my_address(server.outlook.call_graph)
+    emails = sorted({e.strip().lower() for e in [me, *attendees.split(",")] if e.strip()})
+    search_days = _search_days(start_date, days, weekdays_only)
+
+    if "text/event-stream" not in request.headers.get("accept", ""):
+        day_results = await asyncio.gather(*(_day_result(emails, day, duration) for day in search_days))
+        return _etag_response(request, {"attendees": emails, "days": list(day_results)})
+
+    async def stream():
+        tasks = [asyncio.create_task(_day_result(emails, day, duration)) for day in search_days]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                if await request.is_disconnected():
+                    break
+                try:
+                    day_result = await next_done
+                except Exception as e:
+                    yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+                    continue
+                yield f"event: day\ndata: {json.dumps(day_result)}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@router.get("/rooms")
+async def rooms(request: Request, date_str: str, start_time: str, end_time: str):
+    """Rooms free for the whole window ('HH:MM:SS' times)."""
+    key = ("rooms", date_str, start_time, end_time)
+    available = results.get(key)
+    if available is None:
+        available = await server.find_available_rooms(date_str, start_time, end_time)
+        if isinstance(available, str):
+            return Response(json.dumps({"error": available}), status_code=502, media_type="application/json")
+        results.set(key, available)
+    return _etag_response(request, available)
+
+
+class BookingRequest(BaseModel):
+    subject: str
+    start_iso: str
+    end_iso: str
+    attendee_emails: List[str]
+    room_email: Optional[str] = None
+    is_online: bool = False
+    content: str = "Please join us for a meeting."
+
+
+@router.post("/bookings")
+async def bookings(booking: BookingRequest):
+    message = await server.book_meeting(**booking.model_dump())
+    if not message.startswith(("Meeting booked", "Booking queued")):
+        return Response(json.dumps({"error": message}), status_code=502, media_type="application/json")
+    return {"result": message}
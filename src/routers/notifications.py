@@ -0,0 +1,36 @@
+from typing import Optional
+
+from fastapi import APIRouter, BackgroundTasks, Request, Response
+from fastapi.responses import PlainTextResponse
+
+router = APIRouter()
+
+
+async def _handle_all(handler, notifications: list):
+    for notification in notifications:
+        await handler(notification)
+
+
+@router.post("")
+async def receive_notifications(request: Request, background_tasks: BackgroundTasks, validationToken: Optional[str] = None):
+    """Graph change notifications (and the validation handshake when subscribing)."""
+    if validationToken is not None:
+        return PlainTextResponse(validationToken)
+
+    # Graph wants an answer within 3 seconds: acknowledge first, invalidate afterwards
+    body = await request.json()
+    manager = request.app.state.subscriptions
+    background_tasks.add_task(_handle_all, manager.handle, body.get("value", []))
+    return Response(status_code=202)
+
+
+@router.post("/lifecycle")
+async def receive_lifecycle_notifications(request: Request, background_tasks: BackgroundTasks, validationToken: Optional[str] = None):
+    """Subscription lifecycle events (reauthorizationRequired, subscriptionRemoved, missed)."""
+    if validationToken is not None:
+        return PlainTextResponse(validationToken)
+
+    body = await request.json()
+    manager = request.app.state.subscriptions
+    background_tasks.add_task(_handle_all, manager.handle_lifecycle, body.get("value", []))
+    return Response(status_code=202)
@@ -1,7 +1,20 @@
+import os
+import sys
 import tkinter as tk
 from tkinter import ttk, messagebox
+from bisect import bisect_right
+from datetime import datetime
+
+# Entry point of the desktop app: the slot/time-zone engine and the COM worker pool live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import backend
-from datetime import datetime, timedelta
+import timegrid
+
+SLOT_MINUTES = 30
+# Start times shown right away; the rest is appended in growing chunks while the UI stays responsive
+START_OPTIONS_FIRST_CHUNK = 48
+# How often the UI checks whether a background free/busy search has finished
+SEARCH_POLL_MS = 50
 
 class MeetingSchedulerApp:
     def __init__(self, root):
@@ -137,16 +150,25 @@ class MeetingSchedulerApp:
 
         # Disable button while searching
         self.submit_btn.config(state="disabled")
-        self.root.update()
 
-        # Call Backend
-        daily_slots, error = backend.find_free_slots_next_7_working_days(
+        # Call Backend: the lookups run on the COM worker threads, the UI polls for the result
+        future = backend.search_free_slots_next_7_working_days(
             my_email, 
             participants, 
             working_hours_only=self.working_hours_var.get()
         )
-        
+        self.root.after(SEARCH_POLL_MS, self.on_search_done, future)
+
+    def on_search_done(self, future):
+        if not future.done():
+            self.root.after(SEARCH_POLL_MS, self.on_search_done, future)
+            return
+
         self.submit_btn.config(state="normal")
+        try:
+            daily_slots, error = future.result()
+        except Exception as e:
+            daily_slots, error = {}, f"Error: {str(e)}"
         
         if error:
             messagebox.showerror("Error", error)
@@ -183,27 +205,24 @@ class MeetingSchedulerApp:
         self.start_label.config(state="normal")
         self.start_combo.config(state="readonly")
         
-        # Populate Start Combobox with all 30-min intervals found
-        start_options = []
-        
-        # We need to map the string back to the actual datetime objects easily
-        self.start_time_map = {} 
+        # Index the free blocks instead of materializing every 30-min start:
+        # block_offsets[i] = number of start times before block i
+        self.free_blocks = []
+        self.block_offsets = []
+        total = 0
+        for date_str in sorted(self.search_results.keys()):
+            for start, end in self.search_results[date_str]:
+                count = -(-(timegrid.to_minutes(end) - timegrid.to_minutes(start)) // SLOT_MINUTES)
+                if count > 0:
+                    self.free_blocks.append((start, end))
+                    self.block_offsets.append(total)
+                    total += count
+        self.start_option_count = total
         
-        sorted_dates = sorted(self.search_results.keys())
-        for date_str in sorted_dates:
-            slots = self.search_results[date_str]
-            for start, end in slots:
-                # Generate 30 min intervals within this slot
-                curr = start
-                while curr < end:
-                    # Format: "Mon 10/27 10:00"
-                    fmt_str = curr.strftime("%a %m/%d %H:%M")
-                    start_options.append(fmt_str)
-                    self.start_time_map[fmt_str] = (curr, end) # Store the current start and the max end of this block
-                    curr += timedelta(minutes=30)
-        
-        self.start_combo['values'] = start_options
+        self.start_options = []
+        self.start_combo['values'] = ()
         self.start_combo.set('')
+        self.fill_start_options(START_OPTIONS_FIRST_CHUNK)
         
         # Reset End Time interaction
         self.end_label.config(state="disabled")
@@ -211,28 +230,39 @@ class MeetingSchedulerApp:
         self.end_combo.set('')
         self.reserve_btn.config(state="disabled")
 
+    def start_slot_at(self, index):
+        """(start, max end of its free block) for the index-th start time."""
+        block = bisect_right(self.block_offsets, index) - 1
+        start, end = self.free_blocks[block]
+        # Elapsed-time arithmetic (aware datetimes + timedelta would be wall-clock across DST)
+        return timegrid.add_minutes(start, SLOT_MINUTES * (index - self.block_offsets[block])), end
+
+    def fill_start_options(self, chunk):
+        # Append the next chunk of formatted start times, then schedule the following one
+        first = len(self.start_options)
+        last = min(first + chunk, self.start_option_count)
+        for index in range(first, last):
+            # Format: "Mon 10/27 10:00"
+            self.start_options.append(self.start_slot_at(index)[0].strftime("%a %m/%d %H:%M"))
+        self.start_combo['values'] = self.start_options
+        if last < self.start_option_count:
+            options = self.start_options
+            # Skip the refill if a new search replaced the options in the meantime
+            self.root.after(1, lambda: options is self.start_options and self.fill_start_options(chunk * 2))
+
     def on_start_time_selected(self, event):
-        selected_str = self.start_combo.get()
-        if not selected_str:
+        index = self.start_combo.current()
+        if index < 0:
             return
         
-        start_dt, max_end_dt = self.start_time_map[selected_str]
+        start_dt, max_end_dt = self.start_slot_at(index)
         self.selected_start_dt = start_dt
         
-        # Populate End Time
-        # Must be same day, continuous
-        # We start from start_dt + 30 mins
-        # And go up to max_end_dt
-        
-        end_options = []
-        self.end_time_map = {}
-        
-        curr = start_dt + timedelta(minutes=30)
-        while curr <= max_end_dt:
-            fmt_str = curr.strftime("%H:%M")
-            end_options.append(fmt_str)
-            self.end_time_map[fmt_str] = curr
-            curr += timedelta(minutes=30)
+        # Populate End Time: same continuous block, from start_dt + 30 mins up to max_end_dt
+        end_count = (timegrid.to_minutes(max_end_dt) - timegrid.to_minutes(start_dt)) // SLOT_MINUTES
+        end_options = [
+            timegrid.add_minutes(start_dt, SLOT_MINUTES * (i + 1)).strftime("%H:%M") for i in range(end_count)
+        ]
             
         self.end_label.config(state="normal")
         self.end_combo.config(state="readonly")
@@ -241,11 +271,11 @@ class MeetingSchedulerApp:
         self.reserve_btn.config(state="disabled")
 
     def on_end_time_selected(self, event):
-        selected_str = self.end_combo.get()
-        if not selected_str:
+        index = self.end_combo.current()
+        if index < 0:
             return
         
-        self.selected_end_dt = self.end_time_map[selected_str]
+        self.selected_end_dt = timegrid.add_minutes(self.selected_start_dt, SLOT_MINUTES * (index + 1))
         self.reserve_btn.config(state="normal")
 
     def on_reserve(self):
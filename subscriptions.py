@@ -0,0 +1,216 @@
+"""
+Graph change notifications for the user's calendar and watched room mailboxes.
+
+SubscriptionManager creates and renews /subscriptions pointing at the webhook in
+src/routers/notifications.py (on start-up it first adopts the ones an earlier
+run left behind, deleting duplicates), and turns incoming notifications into targeted
+cache invalidation instead of waiting for TTLs:
+- created events: only the free/busy day buckets the event touches,
+- updated/deleted events: the mailbox's buckets (the old time is unknown),
+plus any remembered getSchedule/findMeetingTimes answers mentioning the mailbox.
+
+Configuration:
+    GRAPH_NOTIFICATION_URL           public HTTPS URL of the webhook (enables subscriptions)
+    GRAPH_NOTIFICATION_CLIENT_STATE  shared secret echoed back by Graph in every notification
+                                     (required with GRAPH_NOTIFICATION_URL, the same for every
+                                     process and restart)
+    GRAPH_WATCHED_ROOMS              comma-separated room mailboxes to watch
+"""
+import asyncio
+import logging
+import os
+import secrets
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import circuit_breaker
+import fair_scheduler
+import paging
+import scheduling
+from freebusy_cache import freebusy_cache
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_URL = os.getenv("GRAPH_NOTIFICATION_URL")
+CLIENT_STATE = os.getenv("GRAPH_NOTIFICATION_CLIENT_STATE")
+WATCHED_ROOMS = [r.strip().lower() for r in os.getenv("GRAPH_WATCHED_ROOMS", "").split(",") if r.strip()]
+
+# Event subscriptions live at most 4230 minutes; renew well before that
+SUBSCRIPTION_MINUTES = 4200
+RENEW_BEFORE = timedelta(hours=1)
+RENEW_CHECK_SECONDS = 900
+
+
+class SubscriptionManager:
+    def __init__(self, call, notification_url: Optional[str] = NOTIFICATION_URL, client_state: Optional[str] = CLIENT_STATE,
+                 watched_rooms: List[str] = WATCHED_ROOMS):
+        if notification_url and not client_state:
+            # Subscriptions outlive the process: a per-process secret would reject their notifications after a restart
+            raise ValueError("GRAPH_NOTIFICATION_CLIENT_STATE must be set when GRAPH_NOTIFICATION_URL is")
+        self.call = call
+        self.notification_url = notification_url
+        self.client_state = client_state
+        self.watched_rooms = watched_rooms
+        self.subscriptions: Dict[str, dict] = {}  # id -> {"mailbox", "resource", "expires"}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.notification_url)
+
+    def _expiry(self) -> datetime:
+        return datetime.now(timezone.utc) + timedelta(minutes=SUBSCRIPTION_MINUTES)
+
+    async def subscribe(self, mailbox: str, resource: str) -> dict:
+        expires = self._expiry()
+        payload = {
+            "changeType": "created,updated,deleted",
+            "notificationUrl": self.notification_url,
+            "lifecycleNotificationUrl": self.notification_url.rstrip("/") + "/lifecycle",
+            "resource": resource,
+            "expirationDateTime": expires.isoformat(),
+            "clientState": self.client_state
+        }
+        data = await self.call("POST", "/subscriptions", payload, params={"$select": "id,expirationDateTime"})
+        subscription = {"mailbox": mailbox.lower(), "resource": resource, "expires": expires}
+        self.subscriptions[data["id"]] = subscription
+        logger.info(f"Subscribed to {resource} ({data['id']})")
+        return subscription
+
+    async def reconcile(self):
+        """Adopt this webhook's subscriptions that Graph still has (e.g. from before a restart), deleting duplicates."""
+        me = (await scheduling.get_my_address(self.call)).lower()
+        existing = await paging.take(self.call, "/subscriptions", page_size=None)
+        adopted = {s["mailbox"] for s in self.subscriptions.values()}
+        for item in existing:
+            if item.get("notificationUrl") != self.notification_url:
+                continue
+            parts = item.get("resource", "").strip("/").split("/")
+            if [p.lower() for p in parts] == ["me", "events"]:
+                mailbox = me
+            elif len(parts) == 3 and parts[0].lower() == "users" and parts[2].lower() == "events":
+                mailbox = parts[1].lower()
+            else:
+                continue
+            if mailbox in adopted:
+                try:
+                    await self.call("DELETE", f"/subscriptions/{item['id']}")
+                    logger.info(f"Deleted duplicate subscription {item['id']} for {mailbox}")
+                except Exception as e:
+                    logger.warning(f"Deleting duplicate subscription {item['id']} failed: {e}")
+                continue
+            adopted.add(mailbox)
+            self.subscriptions[item["id"]] = {
+                "mailbox": mailbox,
+                "resource": item["resource"],
+                "expires": datetime.fromisoformat(item["expirationDateTime"].replace("Z", "+00:00"))
+            }
+            logger.info(f"Adopted subscription {item['id']} for {mailbox}")
+
+    async def ensure(self):
+        """Subscribe to the user's calendar and each watched room mailbox."""
+        me = await scheduling.get_my_address(self.call)
+        wanted = {me.lower(): "/me/events", **{room: f"/users/{room}/events" for room in self.watched_rooms}}
+        subscribed = {s["mailbox"] for s in self.subscriptions.values()}
+        results = await asyncio.gather(
+            *(self.subscribe(mailbox, resource) for mailbox, resource in wanted.items() if mailbox not in subscribed),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning(f"Subscription failed: {result}")
+
+    async def renew(self, subscription_id: str):
+        expires = self._expiry()
+        await self.call("PATCH", f"/subscriptions/{subscription_id}", {"expirationDateTime": expires.isoformat()})
+        self.subscriptions[subscription_id]["expires"] = expires
+
+    async def renew_due(self):
+        """Renew subscriptions close to expiry; recreate the ones Graph no longer knows."""
+        now = datetime.now(timezone.utc)
+        for subscription_id, subscription in list(self.subscriptions.items()):
+            if subscription["expires"] - now > RENEW_BEFORE:
+                continue
+            try:
+                await self.renew(subscription_id)
+            except Exception as e:
+                logger.warning(f"Renewing {subscription_id} failed ({e}), recreating")
+                self.subscriptions.pop(subscription_id, None)
+        await self.ensure()
+
+    async def run(self):
+        """Create subscriptions, then keep them alive (run as a background task)."""
+        fair_scheduler.set_priority(fair_scheduler.BACKGROUND)
+        try:
+            await self.reconcile()
+        except Exception as e:
+            logger.warning(f"Listing existing subscriptions failed, creating new ones: {e}")
+        await self.renew_due()
+        while True:
+            await asyncio.sleep(RENEW_CHECK_SECONDS)
+            try:
+                await self.renew_due()
+            except Exception as e:
+                logger.warning(f"Subscription renewal failed: {e}")
+
+    def _authentic(self, notification: dict) -> bool:
+        # Without a configured secret nothing is accepted
+        return bool(self.client_state) and secrets.compare_digest(notification.get("clientState") or "", self.client_state)
+
+    def _mailbox_for(self, notification: dict) -> Optional[str]:
+        subscription = self.subscriptions.get(notification.get("subscriptionId"))
+        if subscription:
+            return subscription["mailbox"]
+        # Not adopted yet (notification during start-up): the resource may name the mailbox
+        parts = notification.get("resource", "").split("/")
+        if len(parts) > 1 and parts[0].lower() == "users" and "@" in parts[1]:
+            return parts[1].lower()
+        return None
+
+    async def handle(self, notification: dict) -> bool:
+        """Validate one change notification and invalidate what it affects. Returns False if rejected."""
+        if not self._authentic(notification):
+            logger.warning(f"Rejected notification with bad clientState for {notification.get('subscriptionId')}")
+            return False
+        mailbox = self._mailbox_for(notification)
+        if not mailbox:
+            logger.warning(f"Ignoring notification for unknown subscription {notification.get('subscriptionId')}")
+            return False
+
+        days = None
+        if notification.get("changeType") == "created":
+            days = await self._event_days(notification.get("resource", ""))
+
+        if days:
+            for day in days:
+                freebusy_cache.invalidate(mailbox, day)
+        else:
+            freebusy_cache.invalidate(mailbox)
+        circuit_breaker.last_known_good.invalidate_where(
+            lambda key: key[1].endswith(circuit_breaker.READ_ONLY_ACTIONS) and mailbox in key[2].lower()
+        )
+        logger.info(f"{notification.get('changeType')} on {mailbox}: invalidated {len(days) if days else 'all'} day bucket(s)")
+        return True
+
+    async def _event_days(self, resource: str) -> Optional[list]:
+        """Local days an event may touch (UTC times, padded a day each side), or None if unknown."""
+        try:
+            event = await self.call("GET", f"/{resource}", params={"$select": "start,end"})
+            start = datetime.fromisoformat(event["start"]["dateTime"][:19]).date() - timedelta(days=1)
+            end = datetime.fromisoformat(event["end"]["dateTime"][:19]).date() + timedelta(days=1)
+        except Exception as e:
+            logger.info(f"Could not read {resource} ({e}), invalidating the whole mailbox")
+            return None
+        return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+    async def handle_lifecycle(self, notification: dict) -> bool:
+        """Lifecycle events: renew on reauthorizationRequired, recreate when removed."""
+        if not self._authentic(notification):
+            return False
+        subscription_id = notification.get("subscriptionId")
+        event = notification.get("lifecycleEvent")
+        if event == "reauthorizationRequired" and subscription_id in self.subscriptions:
+            await self.renew(subscription_id)
+        elif event == "subscriptionRemoved":
+            self.subscriptions.pop(subscription_id, None)
+            await self.ensure()
+        return True
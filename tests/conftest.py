@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "src")]
+
+# Keep module-level caches (free/busy snapshots) out of the working tree
+os.environ.setdefault("FREEBUSY_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "freebusy_cache.db"))
+os.environ.setdefault("MEETING_TIMEZONE", "America/Los_Angeles")
@@ -0,0 +1,105 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import httpx
+
+import booking_queue
+import meeting_core
+
+
+def graph_error(status: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "https://graph.microsoft.com/v1.0/me/events")
+    return httpx.HTTPStatusError(f"HTTP {status}", request=request, response=httpx.Response(status, request=request))
+
+
+def event(subject: str, hour: int = 10) -> dict:
+    return meeting_core.build_event(subject, f"2030-01-07T{hour}:00:00", f"2030-01-07T{hour}:30:00", ["a@example.com"])
+
+
+async def wait_for(ticket_ids, statuses=(booking_queue.BOOKED, booking_queue.FAILED)):
+    for _ in range(500):
+        current = [booking_queue.status(t) for t in ticket_ids]
+        if all(s["status"] in statuses for s in current):
+            return current
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"tickets never settled: {current}")
+
+
+def test_throttled_booking_is_retried_with_the_same_transaction_id(monkeypatch):
+    monkeypatch.setattr(booking_queue, "RETRY_BASE_SECONDS", 0.01)
+    sent = []
+
+    async def call(method, endpoint, data=None, params=None):
+        sent.append(data["transactionId"])
+        if len(sent) == 1:
+            raise graph_error(503)
+        return {"webLink": "https://outlook/event"}
+
+    async def main():
+        ticket = await booking_queue.submit(call, event("Retried"))
+        return ticket, (await wait_for([ticket["ticket"]]))[0]
+
+    ticket, final = asyncio.run(main())
+    assert final["status"] == booking_queue.BOOKED
+    assert final["attempts"] == 2
+    assert sent == [ticket["ticket"], ticket["ticket"]]
+
+
+def test_client_errors_are_not_retried(monkeypatch):
+    async def call(method, endpoint, data=None, params=None):
+        raise graph_error(400)
+
+    async def main():
+        ticket = await booking_queue.submit(call, event("Rejected"))
+        return (await wait_for([ticket["ticket"]]))[0]
+
+    final = asyncio.run(main())
+    assert final["status"] == booking_queue.FAILED
+    assert final["attempts"] == 1
+
+
+def test_http_date_retry_after_does_not_break_the_batch(monkeypatch):
+    monkeypatch.setattr(booking_queue, "RETRY_BASE_SECONDS", 0.01)
+    retry_at = format_datetime(datetime.now(timezone.utc) - timedelta(seconds=1), usegmt=True)
+    batches = []
+
+    async def call(method, endpoint, data=None, params=None):
+        if endpoint == "/$batch":
+            batches.append(len(data["requests"]))
+            return {"responses": [
+                {"id": "0", "status": 429, "headers": {"Retry-After": retry_at}, "body": {}},
+                {"id": "1", "status": 201, "body": {"webLink": "https://outlook/second"}}
+            ]}
+        return {"webLink": "https://outlook/first"}
+
+    async def main():
+        # Queued before the worker runs, so both go out in one $batch
+        first = await booking_queue.submit(call, event("Batched 1", 11))
+        second = await booking_queue.submit(call, event("Batched 2", 12))
+        return await wait_for([first["ticket"], second["ticket"]])
+
+    first, second = asyncio.run(main())
+    assert batches == [2]
+    assert first["status"] == second["status"] == booking_queue.BOOKED
+    assert first["attempts"] == 2 and second["attempts"] == 1
+
+
+def test_identical_request_returns_the_pending_ticket():
+    gate = None
+
+    async def call(method, endpoint, data=None, params=None):
+        await gate.wait()
+        return {"webLink": "https://outlook/event"}
+
+    async def main():
+        nonlocal gate
+        gate = asyncio.Event()
+        first = await booking_queue.submit(call, event("Twice", 13))
+        again = await booking_queue.submit(call, event("Twice", 13))
+        gate.set()
+        await wait_for([first["ticket"]])
+        return first, again
+
+    first, again = asyncio.run(main())
+    assert again["ticket"] == first["ticket"]
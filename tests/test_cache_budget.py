@@ -0,0 +1,67 @@
+import pytest
+
+import caches
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    """A fresh manager with a small budget (caches created in the test register with it)."""
+    manager = caches.CacheManager(20_000)
+    monkeypatch.setattr(caches, "MANAGER", manager)
+    return manager
+
+
+def entry_size(key, value) -> int:
+    return caches.approx_size(key) + caches.approx_size(value) + caches.ENTRY_OVERHEAD_BYTES
+
+
+def test_usage_follows_sets_overwrites_and_invalidations(manager):
+    cache = caches.TTLCache("budget_usage", 60)
+    cache.set("a", "x" * 100)
+    cache.set("b", ["y"] * 10)
+    assert manager.used_bytes == entry_size("a", "x" * 100) + entry_size("b", ["y"] * 10)
+
+    cache.set("a", "x" * 500)
+    assert manager.used_bytes == entry_size("a", "x" * 500) + entry_size("b", ["y"] * 10)
+
+    cache.invalidate("b")
+    cache.invalidate("a")
+    assert manager.used_bytes == 0
+    assert manager.stats()["caches"]["budget_usage"]["entries"] == 0
+
+
+def test_large_cheap_entries_go_before_small_expensive_ones(manager):
+    costly = caches.TTLCache("budget_costly", 60, cost=10)
+    cheap = caches.TTLCache("budget_cheap", 60, cost=1)
+    costly.set("catalog", "r" * 500)
+    for i in range(10):
+        cheap.set(i, "p" * 4000)
+
+    assert manager.used_bytes <= manager.budget_bytes
+    assert costly.get("catalog") == "r" * 500
+    assert cheap.evictions > 0 and costly.evictions == 0
+    assert manager.used_bytes == sum(meta.size for c in (costly, cheap) for meta in c._meta.values())
+
+
+def test_frequently_used_entries_survive(manager):
+    cache = caches.TTLCache("budget_hits", 60)
+    cache.set("hot", "h" * 4000)
+    cache.set("cold", "c" * 4000)
+    for _ in range(5):
+        cache.get("hot")
+    for i in range(3):
+        cache.set(f"new{i}", "n" * 4000)
+
+    assert cache.get("hot") == "h" * 4000
+    assert cache.get_entry("cold") is None
+
+
+def test_eviction_advances_the_clock(manager):
+    cache = caches.TTLCache("budget_clock", 60)
+    for i in range(6):
+        cache.set(i, "v" * 4000)
+    assert cache.evictions > 0
+    # Entries stored from now on start from the last evicted priority, so old ones age out
+    assert manager.clock > 0
+    cache.set("later", "v" * 4000)
+    assert cache._meta["later"].priority > manager.clock
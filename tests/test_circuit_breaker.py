@@ -0,0 +1,105 @@
+import asyncio
+
+import httpx
+import pytest
+
+import circuit_breaker
+import deadlines
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+def make_breaker():
+    return CircuitBreaker("test", failure_rate=0.5, min_requests=4, window_seconds=60, open_seconds=30)
+
+
+def test_opens_when_failure_rate_is_reached():
+    breaker = make_breaker()
+    for failed in (False, True, False):
+        breaker.record(failed)
+    assert breaker.state == CLOSED
+    breaker.record(True)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = make_breaker()
+    breaker.state, breaker.opened_at = OPEN, -1000
+    assert breaker.before_call() is True
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_probe_outcome_closes_or_reopens():
+    breaker = make_breaker()
+    breaker.state, breaker.opened_at = OPEN, -1000
+    breaker.before_call()
+    breaker.record(True)
+    assert breaker.state == OPEN
+
+    breaker.opened_at = -1000
+    breaker.before_call()
+    breaker.record(False)
+    assert breaker.state == CLOSED
+
+
+def test_abandoned_probe_frees_the_slot():
+    breaker = make_breaker()
+    breaker.state, breaker.opened_at = OPEN, -1000
+    breaker.before_call()
+    breaker.abandon_probe()
+    assert breaker.state == HALF_OPEN
+    assert breaker.before_call() is True
+
+
+def _open_breaker(endpoint):
+    breaker = circuit_breaker.breaker_for(endpoint)
+    breaker.state, breaker.opened_at = OPEN, -1000
+    return breaker
+
+
+def test_cancelled_probe_does_not_wedge_the_breaker():
+    breaker = _open_breaker("/test/cancelled")
+
+    async def slow(*args):
+        await asyncio.sleep(10)
+
+    async def main():
+        task = asyncio.create_task(circuit_breaker.guarded_call(slow, "GET", "/test/cancelled"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert breaker.state == HALF_OPEN and not breaker.probe_in_flight
+
+
+def test_timed_out_probe_is_not_a_success():
+    breaker = _open_breaker("/test/deadline")
+
+    async def too_slow(*args):
+        raise deadlines.DeadlineExceeded("tool deadline reached")
+
+    with pytest.raises(deadlines.DeadlineExceeded):
+        asyncio.run(circuit_breaker.guarded_call(too_slow, "GET", "/test/deadline"))
+    assert breaker.state == HALF_OPEN and not breaker.probe_in_flight
+
+
+def test_only_graph_side_errors_count_as_failures():
+    request = httpx.Request("GET", "https://graph.microsoft.com/v1.0/me")
+
+    def status_error(code):
+        return httpx.HTTPStatusError("error", request=request, response=httpx.Response(code, request=request))
+
+    assert circuit_breaker.is_failure(status_error(503))
+    assert circuit_breaker.is_failure(status_error(429))
+    assert not circuit_breaker.is_failure(status_error(404))
+    assert circuit_breaker.is_failure(httpx.ConnectTimeout("timeout"))
+    assert not circuit_breaker.is_failure(ValueError("bad input"))
+
+
+def test_endpoint_names_collapse_ids():
+    assert circuit_breaker.endpoint_name("/users/ann@example.com/calendar/events?$top=5") == "/users/{id}/calendar/events"
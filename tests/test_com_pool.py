@@ -0,0 +1,136 @@
+import asyncio
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+import com_pool
+
+
+class FakeProvider(com_pool.Provider):
+    """Records which thread opened it and answers from a fixed directory."""
+
+    known = {"me@example.com": "0" * 48, "ann@example.com": "0" * 18 + "22" + "0" * 28}
+
+    def __init__(self):
+        self.thread = None
+        self.closed = False
+        self.meetings = []
+
+    def open(self):
+        self.thread = threading.get_ident()
+
+    def close(self):
+        self.closed = True
+
+    def resolve(self, address):
+        assert threading.get_ident() == self.thread
+        return address in self.known
+
+    def free_busy(self, address, start, interval, complete=False):
+        assert threading.get_ident() == self.thread
+        time.sleep(0.05)
+        return self.known.get(address)
+
+    def create_meeting(self, subject, body, required_emails, start, end):
+        self.meetings.append(subject)
+
+
+def make_pool(workers=3):
+    providers = []
+
+    def factory():
+        providers.append(FakeProvider())
+        return providers[-1]
+
+    return com_pool.ComPool(factory, workers=workers), providers
+
+
+def test_jobs_run_on_the_thread_that_opened_the_provider():
+    pool, providers = make_pool()
+    try:
+        assert pool.resolve("me@example.com").result(timeout=5) is True
+        assert pool.resolve("nobody@example.com").result(timeout=5) is False
+        assert pool.free_busy("nobody@example.com", datetime(2026, 3, 9), 30).result(timeout=5) is None
+    finally:
+        pool.shutdown()
+    assert len(providers) == 3
+    assert all(p.closed for p in providers)
+
+
+def test_lookups_run_concurrently_across_workers():
+    pool, _ = make_pool(workers=4)
+    try:
+        started = time.perf_counter()
+        futures = [pool.free_busy("ann@example.com", datetime(2026, 3, 9), 30) for _ in range(8)]
+        results = [f.result(timeout=5) for f in futures]
+        elapsed = time.perf_counter() - started
+    finally:
+        pool.shutdown()
+    assert results == [FakeProvider.known["ann@example.com"]] * 8
+    # 8 jobs of 50 ms on 4 workers: about 2 rounds, far below running them one by one
+    assert elapsed < 0.3
+
+
+def test_job_errors_reach_the_caller():
+    pool, _ = make_pool(workers=1)
+    try:
+        future = pool.submit(lambda provider: 1 / 0)
+        with pytest.raises(ZeroDivisionError):
+            future.result(timeout=5)
+        # The worker survives the failed job
+        assert pool.resolve("me@example.com").result(timeout=5) is True
+    finally:
+        pool.shutdown()
+
+
+def test_provider_that_cannot_open_fails_every_job():
+    class Unavailable(FakeProvider):
+        def open(self):
+            raise OSError("Outlook is not installed")
+
+    pool = com_pool.ComPool(Unavailable, workers=2)
+    try:
+        with pytest.raises(OSError):
+            pool.resolve("me@example.com").result(timeout=5)
+    finally:
+        pool.shutdown()
+
+
+def test_futures_can_be_awaited():
+    pool, _ = make_pool(workers=1)
+
+    async def main():
+        return await asyncio.wrap_future(pool.resolve("ann@example.com"))
+
+    try:
+        assert asyncio.run(main()) is True
+    finally:
+        pool.shutdown()
+
+
+def test_when_all_combines_results_in_order():
+    pool, _ = make_pool(workers=2)
+    try:
+        futures = [pool.resolve(a) for a in ("me@example.com", "nobody@example.com", "ann@example.com")]
+        assert com_pool.when_all(futures, list).result(timeout=5) == [True, False, True]
+        assert com_pool.when_all([], len).result(timeout=5) == 0
+    finally:
+        pool.shutdown()
+
+
+def test_backend_search_uses_the_pool():
+    import backend
+
+    pool, _ = make_pool(workers=3)
+    try:
+        future = backend.search_free_slots_next_7_working_days("me@example.com", ["ann@example.com"], pool=pool)
+        daily_slots, error = future.result(timeout=10)
+        assert error is None
+        assert len(daily_slots) == 7
+
+        unresolved = backend.search_free_slots_next_7_working_days("nobody@example.com", [], pool=pool)
+        assert unresolved.result(timeout=10) == ({}, "未能解析任何有效邮箱")
+    finally:
+        pool.shutdown()
@@ -0,0 +1,60 @@
+import asyncio
+
+import fair_scheduler
+
+
+def _run_order(requests, max_concurrency=1):
+    """Start (user, priority) requests while the only slot is busy; return the order they ran in."""
+    order = []
+
+    async def main():
+        scheduler = fair_scheduler.FairScheduler(max_concurrency=max_concurrency, aging_seconds=60)
+        gate = asyncio.Event()
+
+        async def blocker():
+            await gate.wait()
+
+        first = asyncio.create_task(scheduler.run("blocker", blocker))
+        await asyncio.sleep(0)
+
+        async def submit(user, level, name):
+            fair_scheduler.set_priority(level)
+
+            async def call():
+                order.append(name)
+            await scheduler.run(user, call)
+
+        tasks = []
+        for user, level, name in requests:
+            tasks.append(asyncio.create_task(submit(user, level, name)))
+            await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(first, *tasks)
+
+    asyncio.run(main())
+    return order
+
+
+def test_users_are_served_round_robin():
+    interactive = fair_scheduler.INTERACTIVE
+    order = _run_order([
+        ("bulk", interactive, "b0"), ("bulk", interactive, "b1"), ("bulk", interactive, "b2"),
+        ("alice", interactive, "a0"), ("carol", interactive, "c0"),
+    ])
+    assert order == ["b0", "a0", "c0", "b1", "b2"]
+
+
+def test_background_waits_for_interactive():
+    order = _run_order([
+        ("sync", fair_scheduler.BACKGROUND, "bg"),
+        ("warmup", fair_scheduler.PREFETCH, "pf"),
+        ("alice", fair_scheduler.INTERACTIVE, "a0"),
+    ])
+    assert order == ["a0", "pf", "bg"]
+
+
+def test_priority_context_manager_restores_the_class():
+    assert fair_scheduler.current_priority() == fair_scheduler.INTERACTIVE
+    with fair_scheduler.priority(fair_scheduler.BACKGROUND):
+        assert fair_scheduler.current_priority() == fair_scheduler.BACKGROUND
+    assert fair_scheduler.current_priority() == fair_scheduler.INTERACTIVE
@@ -0,0 +1,104 @@
+import asyncio
+
+import httpx
+import pytest
+
+import deadlines
+import meeting_core
+
+
+class StaticToken(meeting_core.AuthProvider):
+    def get_token(self) -> str:
+        return "token"
+
+
+def run_with(monkeypatch, responses, method="GET", endpoint="/me", budget=None):
+    """Send one request through GraphEngine._send against scripted responses; return (result or error, requests made)."""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return responses[min(len(requests), len(responses)) - 1]
+
+    monkeypatch.setattr(meeting_core, "GRAPH_RETRY_BASE_SECONDS", 0.01)
+
+    async def main():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(meeting_core, "shared_client", lambda: client)
+        engine = meeting_core.GraphEngine(StaticToken())
+        try:
+            if budget is None:
+                return await engine._send(method, endpoint, {} if method == "POST" else None)
+            with deadlines.budget(budget):
+                return await engine._send(method, endpoint, {} if method == "POST" else None)
+        finally:
+            await client.aclose()
+
+    try:
+        return asyncio.run(main()), len(requests)
+    except Exception as e:
+        return e, len(requests)
+
+
+def test_throttled_read_is_retried(monkeypatch):
+    result, made = run_with(monkeypatch, [httpx.Response(429), httpx.Response(200, json={"mail": "me@example.com"})])
+    assert result == {"mail": "me@example.com"}
+    assert made == 2
+
+
+def test_retries_are_bounded(monkeypatch):
+    result, made = run_with(monkeypatch, [httpx.Response(503)])
+    assert isinstance(result, Exception)
+    assert made == meeting_core.GRAPH_MAX_RETRIES + 1
+
+
+def test_client_errors_and_writes_are_not_retried(monkeypatch):
+    _, made = run_with(monkeypatch, [httpx.Response(404), httpx.Response(200, json={})])
+    assert made == 1
+    _, made = run_with(monkeypatch, [httpx.Response(503), httpx.Response(200, json={})], "POST", "/me/events")
+    assert made == 1
+
+
+def test_no_retry_past_the_deadline(monkeypatch):
+    throttled = httpx.Response(429, headers={"Retry-After": "5"})
+    result, made = run_with(monkeypatch, [throttled, httpx.Response(200, json={})], budget=1)
+    assert isinstance(result, Exception)
+    assert made == 1
+
+
+def test_backoff_does_not_hold_a_scheduler_slot(monkeypatch):
+    import fair_scheduler
+
+    scheduler = fair_scheduler.FairScheduler(max_concurrency=1)
+    in_flight = []
+
+    class QueuedEngine(meeting_core.GraphEngine):
+        async def _send_attempt(self, method, endpoint, data=None, params=None):
+            return await scheduler.run("user", lambda: self._send_once(method, endpoint, data, params))
+
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay):
+        in_flight.append(scheduler.in_flight)
+        await real_sleep(0)
+
+    responses = [httpx.Response(503), httpx.Response(200, json={})]
+
+    async def main():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: responses.pop(0)))
+        monkeypatch.setattr(meeting_core, "shared_client", lambda: client)
+        monkeypatch.setattr(meeting_core.asyncio, "sleep", sleep)
+        try:
+            return await QueuedEngine(StaticToken())._send("GET", "/me")
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(main()) == {}
+    assert in_flight == [0]
+
+
+def test_repeated_booking_reuses_the_transaction_id():
+    first = meeting_core.build_event("Sync", "2026-03-02T10:00:00", "2026-03-02T10:30:00", ["B@example.com", "a@example.com"])
+    again = meeting_core.build_event("Sync", "2026-03-02T10:00:00", "2026-03-02T10:30:00", ["a@example.com", "b@example.com"])
+    later = meeting_core.build_event("Sync", "2026-03-02T11:00:00", "2026-03-02T11:30:00", ["a@example.com", "b@example.com"])
+    assert first["transactionId"] == again["transactionId"] != later["transactionId"]
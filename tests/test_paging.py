@@ -0,0 +1,74 @@
+import asyncio
+from contextlib import aclosing
+
+import pytest
+
+import paging
+
+
+class EndlessCollection:
+    """Fake Graph `call` serving numbered pages forever, recording requests and cancellations."""
+
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.requests = 0
+        self.cancelled = 0
+
+    async def __call__(self, method, endpoint, data=None, params=None):
+        page = self.requests
+        self.requests += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return {"value": [{"id": page * 10 + i} for i in range(10)], "@odata.nextLink": f"https://next/{page + 1}"}
+
+
+def test_take_stops_requesting_after_the_prefetch_window():
+    collection = EndlessCollection()
+
+    async def main():
+        items = await paging.take(collection, "/users", limit=25, page_size=10, prefetch=1)
+        requested = collection.requests
+        await asyncio.sleep(0.05)
+        return items, requested
+
+    items, requested = asyncio.run(main())
+    assert [item["id"] for item in items] == list(range(25))
+    # 3 pages consumed, at most one more fetched ahead, nothing after the producer was cancelled
+    assert requested <= 4
+    assert collection.requests == requested
+
+
+def test_leaving_early_cancels_the_request_in_flight():
+    collection = EndlessCollection(delay=0.05)
+
+    async def main():
+        async with aclosing(paging.iter_pages(collection, "/users", page_size=10, prefetch=1)) as pages:
+            async for _ in pages:
+                # The producer is now waiting on the next page
+                await asyncio.sleep(0.01)
+                break
+        await asyncio.sleep(0.1)
+
+    asyncio.run(main())
+    assert collection.cancelled == 1
+    assert collection.requests == 2
+
+
+def test_producer_errors_reach_the_consumer():
+    async def call(method, endpoint, data=None, params=None):
+        if endpoint == "/users":
+            return {"value": [{"id": 1}], "@odata.nextLink": "https://next/1"}
+        raise RuntimeError("page 2 failed")
+
+    async def main():
+        seen = []
+        with pytest.raises(RuntimeError, match="page 2 failed"):
+            async with aclosing(paging.iter_items(call, "/users", page_size=10)) as items:
+                async for item in items:
+                    seen.append(item["id"])
+        return seen
+
+    assert asyncio.run(main()) == [1]
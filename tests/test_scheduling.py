@@ -0,0 +1,55 @@
+from datetime import date
+
+import scheduling
+import timegrid
+
+
+def test_view_to_free_mask_sets_bits_for_free_slots_only():
+    assert scheduling.view_to_free_mask("0120340") == 0b1001001
+    assert scheduling.view_to_free_mask("") == 0
+
+
+def test_run_mask_marks_starts_of_long_enough_runs():
+    # free slots 0-2 and 4-5
+    mask = 0b110111
+    assert scheduling.run_mask(mask, 1) == mask
+    assert scheduling.run_mask(mask, 2) == 0b010011
+    assert scheduling.run_mask(mask, 3) == 0b000001
+    assert scheduling.run_mask(mask, 4) == 0
+
+
+def test_intersection_of_several_people():
+    views = {"a": "0002", "b": "2000", "c": "0000"}
+    combined = -1
+    for view in views.values():
+        combined &= scheduling.view_to_free_mask(view)
+    assert combined == 0b0110
+
+
+def _day_views(busy_local_hours):
+    """One UTC day grid per person for 2026-03-09, busy during the given local hours."""
+    day = date(2026, 3, 9)
+    utc_day, utc_num_days, grid_start = scheduling.local_days_grid(day, 1)
+    table = timegrid.offset_table(scheduling.MEETING_ZONE, day, 1)
+    views = {}
+    for person, (start_hour, end_hour) in busy_local_hours.items():
+        view = ["0"] * (utc_num_days * 48)
+        start, end = table.work_window(day, start_hour, end_hour)
+        for k in range((start - grid_start) // 30, (end - grid_start) // 30):
+            view[k] = "2"
+        views[person] = "".join(view)
+    return views, grid_start
+
+
+def test_common_slots_skip_anyone_busy():
+    views, grid_start = _day_views({"a": (9, 12), "b": (13, 17)})
+    slots = scheduling.common_slots(views, grid_start, "2026-03-09", 60)
+    starts = [s["start"][11:16] for s in slots]
+    assert starts == ["08:00", "12:00", "17:00"]
+
+
+def test_attendance_slots_rank_by_free_count():
+    views, grid_start = _day_views({"a": (8, 12), "b": (8, 10), "c": (16, 18)})
+    slots = scheduling.attendance_slots(views, grid_start, date(2026, 3, 9), 1, 60, max_results=3)
+    assert slots[0] == {"start": "2026-03-09T12:00:00", "end": "2026-03-09T13:00:00", "attending": 3}
+    assert [s["attending"] for s in slots] == [3, 3, 3]
@@ -0,0 +1,63 @@
+import time
+
+import pytest
+
+import caches
+import shared_cache
+
+
+@pytest.fixture
+def two_workers(tmp_path, monkeypatch):
+    """This process's store plus a second worker's store on the same SQLite file."""
+    path = str(tmp_path / "shared.db")
+    mine, other = shared_cache.SharedStore(path), shared_cache.SharedStore(path)
+    other.origin = mine.origin + 1
+    monkeypatch.setattr(shared_cache, "store", mine)
+    monkeypatch.setattr(shared_cache, "_caches", {})
+    monkeypatch.setattr(shared_cache, "SYNC_SECONDS", 0)
+    return mine, other
+
+
+def test_entries_fetched_by_one_worker_serve_the_other(two_workers):
+    _, other = two_workers
+    cache = caches.TTLCache("test_rooms", 60, shared=True)
+    other.put("test_rooms", ("rooms", 1), ["room@example.com"], time.time())
+    assert cache.get(("rooms", 1)) == ["room@example.com"]
+
+
+def test_invalidation_by_another_worker_drops_the_local_copy(two_workers):
+    _, other = two_workers
+    cache = caches.TTLCache("test_groups", 60, shared=True)
+    cache.set("team@example.com", ["a@example.com"])
+    assert cache.get("team@example.com") == ["a@example.com"]
+
+    other.delete("test_groups", "team@example.com")
+    assert cache.get("team@example.com") is None
+
+
+def test_write_by_another_worker_replaces_the_local_copy(two_workers):
+    _, other = two_workers
+    cache = caches.TTLCache("test_tickets", 60, shared=True)
+    cache.set("t1", {"status": "queued"})
+    other.put("test_tickets", "t1", {"status": "booked"}, time.time())
+    assert cache.get("t1") == {"status": "booked"}
+
+
+def test_own_writes_are_not_reported_as_changes(two_workers):
+    mine, other = two_workers
+    mine.put("test_people", "k", 1, time.time())
+    other.put("test_people", "k", 2, time.time())
+    assert mine.changes() == [("test_people", "k")]
+    assert other.changes() == [("test_people", "k")]
+
+
+def test_prune_drops_expired_entries_and_old_log_rows(two_workers):
+    mine, _ = two_workers
+    mine.put("test_old", "stale", 1, time.time() - 120)
+    mine.put("test_old", "fresh", 2, time.time())
+    mine.db.execute("UPDATE invalidations SET at = ?", (time.time() - shared_cache.LOG_RETENTION_SECONDS - 1,))
+    mine.db.commit()
+
+    mine.prune({"test_old": 60})
+    assert mine.keys("test_old") == ["fresh"]
+    assert mine.db.execute("SELECT COUNT(*) FROM invalidations").fetchone()[0] == 0
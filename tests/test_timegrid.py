@@ -0,0 +1,30 @@
+from datetime import date
+
+import timegrid
+
+
+def test_offsets_across_the_spring_forward_change():
+    table = timegrid.offset_table("America/Los_Angeles", date(2026, 3, 7), 3)
+    # PST before 2026-03-08 02:00 local (10:00 UTC), PDT after
+    change = timegrid.day_minutes(date(2026, 3, 8)) + 10 * 60
+    assert table.offset_at(change - 1) == -8 * 60
+    assert table.offset_at(change) == -7 * 60
+
+
+def test_spring_forward_day_is_23_hours():
+    table = timegrid.offset_table("America/Los_Angeles", date(2026, 3, 8), 1)
+    length = table.local_midnight(date(2026, 3, 9)) - table.local_midnight(date(2026, 3, 8))
+    assert length == 23 * 60
+
+
+def test_work_window_follows_the_offset():
+    table = timegrid.offset_table("America/Los_Angeles", date(2026, 3, 6), 5)
+    before_start, _ = table.work_window(date(2026, 3, 6), 8, 18)
+    after_start, _ = table.work_window(date(2026, 3, 9), 8, 18)
+    assert before_start - timegrid.day_minutes(date(2026, 3, 6)) == 16 * 60
+    assert after_start - timegrid.day_minutes(date(2026, 3, 9)) == 15 * 60
+    assert table.local_iso(after_start) == "2026-03-09T08:00:00"
+
+
+def test_windows_zone_names_are_accepted():
+    assert timegrid.iana_name("Pacific Standard Time") == "America/Los_Angeles"
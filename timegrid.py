@@ -0,0 +1,220 @@
+"""
+Slot arithmetic in UTC integer minutes with precomputed time-zone offset tables.
+
+Every instant is an int: minutes since 1970-01-01 00:00 UTC. Free/busy views
+are requested from Graph in UTC, so slot i of a view starting at `grid_start`
+covers [grid_start + i*interval, grid_start + (i+1)*interval) and every UTC day
+has exactly 24*60 minutes. Local notions (dates, working hours, wall-clock
+output) go through an OffsetTable: the zone's UTC offsets over the query
+horizon, computed once, so converting is a bisect plus an addition and stays
+correct on days with a DST transition (23 or 25 hour days). Working-hour masks
+of several zones are plain ints and intersect with &.
+
+"Local minutes" are UTC minutes plus the zone's offset: local // 1440 is the
+local day ordinal and local % 1440 the wall-clock minute.
+
+Configuration:
+    MEETING_TIMEZONE   IANA zone (or Windows name) for dates and working hours
+                       (default America/Los_Angeles, i.e. "Pacific Standard Time")
+"""
+import os
+from bisect import bisect_right
+from datetime import date, datetime, timedelta, timezone, tzinfo
+from functools import lru_cache
+from typing import List, Tuple
+
+try:
+    import zoneinfo
+except ImportError:
+    zoneinfo = None
+
+try:
+    from dateutil import tz as dateutil_tz
+except ImportError:
+    dateutil_tz = None
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MINUTES_PER_DAY = 24 * 60
+
+# IANA -> Windows zone names (Graph's dateTimeTimeZone and Outlook use the Windows ones)
+WINDOWS_ZONE_NAMES = {
+    "UTC": "UTC",
+    "America/Los_Angeles": "Pacific Standard Time",
+    "America/Vancouver": "Pacific Standard Time",
+    "America/Denver": "Mountain Standard Time",
+    "America/Edmonton": "Mountain Standard Time",
+    "America/Chicago": "Central Standard Time",
+    "America/Winnipeg": "Central Standard Time",
+    "America/New_York": "Eastern Standard Time",
+    "America/Toronto": "Eastern Standard Time",
+    "America/Halifax": "Atlantic Standard Time",
+    "Europe/London": "GMT Standard Time",
+    "Europe/Paris": "Romance Standard Time",
+    "Europe/Berlin": "W. Europe Standard Time",
+    "Asia/Kolkata": "India Standard Time",
+    "Asia/Shanghai": "China Standard Time",
+    "Asia/Tokyo": "Tokyo Standard Time",
+}
+_IANA_BY_WINDOWS = {}
+for _iana, _windows in WINDOWS_ZONE_NAMES.items():
+    _IANA_BY_WINDOWS.setdefault(_windows, _iana)
+
+# Standard-time offsets used only when neither zoneinfo data nor dateutil is available
+FIXED_OFFSETS = {
+    "UTC": 0,
+    "America/Los_Angeles": -480, "America/Vancouver": -480,
+    "America/Denver": -420, "America/Edmonton": -420,
+    "America/Chicago": -360, "America/Winnipeg": -360,
+    "America/New_York": -300, "America/Toronto": -300,
+    "America/Halifax": -240,
+    "Europe/London": 0, "Europe/Paris": 60, "Europe/Berlin": 60,
+    "Asia/Kolkata": 330, "Asia/Shanghai": 480, "Asia/Tokyo": 540,
+}
+
+
+def iana_name(name: str) -> str:
+    """Accept either an IANA or a (known) Windows zone name."""
+    return _IANA_BY_WINDOWS.get(name, name)
+
+
+DEFAULT_ZONE = iana_name(os.getenv("MEETING_TIMEZONE", "America/Los_Angeles"))
+
+
+def graph_zone_name(name: str = DEFAULT_ZONE) -> str:
+    """Zone name to send in Graph dateTimeTimeZone values."""
+    return WINDOWS_ZONE_NAMES.get(iana_name(name), name)
+
+
+@lru_cache(maxsize=None)
+def get_zone(name: str = DEFAULT_ZONE) -> tzinfo:
+    name = iana_name(name)
+    # 1. Try built-in or backport zoneinfo
+    if zoneinfo:
+        try:
+            return zoneinfo.ZoneInfo(name)
+        except Exception:
+            pass  # ZoneInfoNotFoundError or similar (no tzdata)
+
+    # 2. Try dateutil (often has internal windows mapping)
+    if dateutil_tz:
+        zone = dateutil_tz.gettz(name)
+        if zone:
+            return zone
+
+    # 3. Fixed standard-time offset: no DST, but never crashes
+    return timezone(timedelta(minutes=FIXED_OFFSETS.get(name, 0)), name=name)
+
+
+def to_minutes(dt: datetime) -> int:
+    """UTC minutes of a datetime (naive datetimes are taken as UTC)."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int((dt - EPOCH).total_seconds() // 60)
+
+
+def from_minutes(minutes: int, zone: tzinfo = timezone.utc) -> datetime:
+    """Aware datetime for UTC minutes, expressed in `zone`."""
+    return (EPOCH + timedelta(minutes=minutes)).astimezone(zone)
+
+
+def utc_datetime(minutes: int) -> datetime:
+    """Naive UTC datetime for UTC minutes (what Graph gets with timeZone 'UTC')."""
+    return (EPOCH + timedelta(minutes=minutes)).replace(tzinfo=None)
+
+
+def day_minutes(day: date) -> int:
+    """UTC minutes of 00:00 UTC on `day` (also: local minutes of local midnight)."""
+    return (day - EPOCH.date()).days * MINUTES_PER_DAY
+
+
+def utc_days(start: int, end: int) -> Tuple[date, int]:
+    """(first UTC day, number of days) of the whole UTC days covering [start, end)."""
+    first = start // MINUTES_PER_DAY
+    last = (end - 1) // MINUTES_PER_DAY
+    return EPOCH.date() + timedelta(days=first), last - first + 1
+
+
+def add_minutes(dt: datetime, minutes: int) -> datetime:
+    """Elapsed-time addition for aware datetimes (plain + timedelta is wall-clock and skips DST)."""
+    if dt.tzinfo is None:
+        return dt + timedelta(minutes=minutes)
+    return from_minutes(to_minutes(dt) + minutes, dt.tzinfo)
+
+
+class OffsetTable:
+    """UTC offsets of one zone over [start, end) UTC minutes, as sorted transition points."""
+
+    def __init__(self, zone_name: str, start: int, end: int):
+        self.zone_name = zone_name
+        zone = get_zone(zone_name)
+
+        def offset(minutes: int) -> int:
+            return int(from_minutes(minutes, zone).utcoffset().total_seconds() // 60)
+
+        self.starts: List[int] = [start]
+        self.offsets: List[int] = [offset(start)]
+        # Offsets change at most once a day: probe daily, then bisect to the exact minute
+        probe = start
+        while probe < end:
+            following = min(probe + MINUTES_PER_DAY, end)
+            if offset(following) != self.offsets[-1]:
+                low, high = probe, following
+                while high - low > 1:
+                    middle = (low + high) // 2
+                    if offset(middle) == self.offsets[-1]:
+                        low = middle
+                    else:
+                        high = middle
+                self.starts.append(high)
+                self.offsets.append(offset(high))
+            probe = following
+
+    def offset_at(self, utc: int) -> int:
+        return self.offsets[max(bisect_right(self.starts, utc) - 1, 0)]
+
+    def to_local(self, utc: int) -> int:
+        return utc + self.offset_at(utc)
+
+    def to_utc(self, local: int) -> int:
+        # Offset in force at the resulting instant (wall times skipped by DST move forward)
+        return local - self.offset_at(local - self.offset_at(local))
+
+    def local_midnight(self, day: date) -> int:
+        """UTC minutes of 00:00 local time on `day`."""
+        return self.to_utc(day_minutes(day))
+
+    def local_date(self, utc: int) -> date:
+        return EPOCH.date() + timedelta(days=self.to_local(utc) // MINUTES_PER_DAY)
+
+    def local_iso(self, utc: int) -> str:
+        """'YYYY-MM-DDTHH:MM:SS' wall-clock time in this zone."""
+        return utc_datetime(self.to_local(utc)).isoformat(timespec="seconds")
+
+    def work_window(self, day: date, start_hour: int, end_hour: int) -> Tuple[int, int]:
+        """UTC minutes [start, end) of the working hours on local `day`."""
+        midnight = day_minutes(day)
+        return self.to_utc(midnight + start_hour * 60), self.to_utc(midnight + end_hour * 60)
+
+    def work_mask(self, grid_start: int, num_slots: int, interval: int, start_hour: int, end_hour: int,
+                  weekdays_only: bool = False) -> int:
+        """Bitset over a UTC slot grid: bit i set when slot i lies inside this zone's working hours."""
+        mask = 0
+        grid_end = grid_start + num_slots * interval
+        day = self.local_date(grid_start) - timedelta(days=1)
+        while self.local_midnight(day) < grid_end:
+            if not weekdays_only or day.weekday() < 5:
+                start, end = self.work_window(day, start_hour, end_hour)
+                first = max(-(-(start - grid_start) // interval), 0)
+                last = min((end - grid_start) // interval, num_slots)
+                if last > first:
+                    mask |= ((1 << (last - first)) - 1) << first
+            day += timedelta(days=1)
+        return mask
+
+
+@lru_cache(maxsize=64)
+def offset_table(zone_name: str = DEFAULT_ZONE, first_day: date = None, num_days: int = 1) -> OffsetTable:
+    """Offset table covering local days first_day .. first_day + num_days (padded a day each side)."""
+    first_day = first_day or datetime.now(timezone.utc).date()
+    start = day_minutes(first_day - timedelta(days=2))
+    return OffsetTable(iana_name(zone_name), start, start + (num_days + 4) * MINUTES_PER_DAY)
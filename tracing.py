@@ -0,0 +1,253 @@
+"""
+Span tracing from MCP tool call down to each Graph sub-request.
+
+Every tool invocation decorated with @traced_tool opens a root span; work done
+on its behalf opens child spans with span(): token acquisition, waiting for a
+Graph slot, each Graph request (endpoint, status, bytes, breaker state),
+booking retries and backoff, cache lookups (hit or miss) and local slot
+computation. The current span lives in a context variable, so spans opened in
+sub-tasks of a fan-out get the right parent without being passed around.
+
+Finished spans are exported in batches as OTLP/JSON (ExportTraceServiceRequest)
+by a background thread, to any of:
+    file  one JSON document per line in MCP_TRACE_FILE (the format of the
+          OpenTelemetry collector's otlpjsonfile receiver), inspectable with jq
+    otlp  POST to OTEL_EXPORTER_OTLP_ENDPOINT + /v1/traces (OTLP/HTTP, JSON encoding)
+
+Configuration:
+    MCP_TRACE                     'on' to record spans (default off: span() is a no-op)
+    MCP_TRACE_EXPORTERS           comma separated, default 'file'
+    MCP_TRACE_FILE                default ./traces/spans.jsonl (rotated at MCP_TRACE_MAX_MB)
+    OTEL_EXPORTER_OTLP_ENDPOINT   default http://localhost:4318
+    OTEL_SERVICE_NAME             default meeting-mcp
+"""
+import atexit
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("MCP_TRACE", "off").lower() in ("1", "on", "true")
+EXPORTERS = [e.strip() for e in os.getenv("MCP_TRACE_EXPORTERS", "file").lower().split(",") if e.strip()]
+TRACE_FILE = os.getenv("MCP_TRACE_FILE", os.path.join(os.path.dirname(__file__), "traces", "spans.jsonl"))
+TRACE_MAX_MB = float(os.getenv("MCP_TRACE_MAX_MB", "50"))
+OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318").rstrip("/")
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "meeting-mcp")
+FLUSH_SECONDS = 2.0
+MAX_BATCH = 512
+
+# OTLP span kinds and status codes
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+STATUS_OK, STATUS_ERROR = 1, 2
+
+
+class Span:
+    def __init__(self, name: str, parent: Optional["Span"], kind: int, attributes: dict):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.kind = kind
+        self.attributes = dict(attributes)
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.status = STATUS_OK
+        self.message = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes):
+        self.attributes.update(attributes)
+
+    def record_error(self, error: BaseException):
+        self.status = STATUS_ERROR
+        self.message = f"{type(error).__name__}: {error}"
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items() if v is not None],
+            "status": {"code": self.status, **({"message": self.message} if self.message else {})}
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class _NoopSpan:
+    def set_attribute(self, key: str, value):
+        pass
+
+    def set_attributes(self, **attributes):
+        pass
+
+    def record_error(self, error: BaseException):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def _otlp_attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+@contextmanager
+def span(name: str, kind: int = KIND_INTERNAL, **attributes):
+    """Child span of the current one (a new trace when there is none)."""
+    if not ENABLED:
+        yield NOOP_SPAN
+        return
+    current = Span(name, _current.get(), kind, attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.record_error(e)
+        raise
+    finally:
+        _current.reset(token)
+        current.end_ns = time.time_ns()
+        exporter.submit(current)
+
+
+def current_span():
+    return _current.get() or NOOP_SPAN
+
+
+@contextmanager
+def detached():
+    """Run a block (e.g. starting a long-lived task) outside the current trace."""
+    token = _current.set(None)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def traced(name: str, **attributes):
+    """Decorator: run a function (sync or async) inside a span."""
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name, **attributes):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, **attributes):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def traced_tool(tool):
+    """Tool decorator: root span per MCP tool invocation."""
+    @functools.wraps(tool)
+    async def wrapper(*args, **kwargs):
+        with span(f"tool {tool.__name__}", KIND_SERVER, **{"mcp.tool": tool.__name__}) as root:
+            result = await tool(*args, **kwargs)
+            if isinstance(result, dict):
+                root.set_attributes(**{"mcp.partial": bool(result.get("partial")), "mcp.stale": bool(result.get("stale"))})
+            # Tools report failures in their result (error string, or an "error" entry in main.py)
+            error = result if isinstance(result, str) and result.startswith("Error") else None
+            if isinstance(result, dict):
+                error = result.get("error")
+            elif isinstance(result, list) and result and isinstance(result[0], dict):
+                error = result[0].get("error")
+            if error:
+                root.status, root.message = STATUS_ERROR, str(error)[:200]
+            return result
+
+    return wrapper
+
+
+class Exporter:
+    """Batches finished spans and ships them from a background thread."""
+
+    def __init__(self, exporters: List[str]):
+        self.exporters = exporters
+        self.spans: "queue.Queue[Span]" = queue.Queue(maxsize=10000)
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+
+    def submit(self, finished: Span):
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._run, name="mcp-trace-export", daemon=True)
+                    self.thread.start()
+                    atexit.register(self.flush)
+        try:
+            self.spans.put_nowait(finished)
+        except queue.Full:
+            pass  # never slow a tool call down for tracing
+
+    def _run(self):
+        while True:
+            time.sleep(FLUSH_SECONDS)
+            self.flush()
+
+    def flush(self):
+        """Export everything queued so far, MAX_BATCH spans per request."""
+        while True:
+            batch = []
+            while len(batch) < MAX_BATCH:
+                try:
+                    batch.append(self.spans.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._export(batch)
+
+    def _export(self, batch: List[Span]):
+        document = {"resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+            "scopeSpans": [{"scope": {"name": "meetingmcp"}, "spans": [s.to_otlp() for s in batch]}]
+        }]}
+        for name in self.exporters:
+            try:
+                if name == "file":
+                    self._write_file(document)
+                elif name == "otlp":
+                    httpx.post(f"{OTLP_ENDPOINT}/v1/traces", json=document, timeout=5).raise_for_status()
+            except Exception as e:
+                logger.warning(f"Exporting {len(batch)} spans to {name} failed: {e}")
+
+    def _write_file(self, document: dict):
+        os.makedirs(os.path.dirname(TRACE_FILE) or ".", exist_ok=True)
+        if os.path.exists(TRACE_FILE) and os.path.getsize(TRACE_FILE) > TRACE_MAX_MB * 1024 * 1024:
+            os.replace(TRACE_FILE, TRACE_FILE + ".1")
+        with open(TRACE_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(document, separators=(",", ":")) + "\n")
+
+
+exporter = Exporter(EXPORTERS)
@@ -0,0 +1,80 @@
+"""
+Optional warm-up run when a server starts, so the first question of a session hits warm caches.
+
+Enabled with MCP_WARMUP=1. Within MCP_WARMUP_BUDGET_SECONDS it:
+1. acquires a Graph token (MSAL refresh happens here, not on the first tool call),
+2. loads the room catalog and the top MCP_WARMUP_TOP_PEOPLE people from /me/people,
+3. prefetches next week's free/busy for the user and those people in one bulk
+   getSchedule into the persistent free/busy cache.
+Whatever has not finished when the budget runs out is abandoned.
+
+It runs as a task on the server's own event loop (see running(), used as the
+FastMCP lifespan in server.py), so background refreshes it starts keep running
+after it finishes.
+"""
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import date
+
+import directory
+import fair_scheduler
+import scheduling
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENABLED = os.getenv("MCP_WARMUP", "0") == "1"
+WARMUP_TOP_PEOPLE = int(os.getenv("MCP_WARMUP_TOP_PEOPLE", "10"))
+WARMUP_BUDGET_SECONDS = float(os.getenv("MCP_WARMUP_BUDGET_SECONDS", "10"))
+WARMUP_DAYS = 7
+
+
+async def warm_up(call, get_token=None, top_people: int = WARMUP_TOP_PEOPLE, budget_seconds: float = WARMUP_BUDGET_SECONDS):
+    """Warm token, room catalog, people and free/busy caches within `budget_seconds`."""
+    started = time.monotonic()
+
+    async def run():
+        # Runs as its own task (wait_for), so this only lowers warm-up's own Graph calls
+        fair_scheduler.set_priority(fair_scheduler.PREFETCH)
+
+        # 1. Token (MSAL is synchronous, keep the loop free)
+        if get_token:
+            await asyncio.to_thread(get_token)
+
+        # 2. Directory data, concurrently (a missing permission for one must not stop the rest)
+        rooms, people = await asyncio.gather(
+            directory.get_rooms(call),
+            directory.get_relevant_people(call, top_people),
+            return_exceptions=True
+        )
+        for result in (rooms, people):
+            if isinstance(result, Exception):
+                logger.warning(f"Warm-up lookup failed: {result}")
+        if isinstance(people, Exception):
+            people = []
+
+        # 3. Next week's free/busy for the user and frequent collaborators, in bulk
+        me = await scheduling.get_my_address(call)
+        emails = list(dict.fromkeys([me.lower(), *people]))
+        await scheduling.get_schedules(call, emails, date.today(), WARMUP_DAYS)
+        logger.info(f"Warm-up done in {time.monotonic() - started:.1f}s, prefetched {len(emails)} schedules")
+
+    try:
+        await asyncio.wait_for(run(), timeout=budget_seconds)
+    except asyncio.TimeoutError:
+        logger.warning(f"Warm-up stopped after its {budget_seconds}s budget")
+    except Exception as e:
+        logger.warning(f"Warm-up failed: {e}")
+
+
+@asynccontextmanager
+async def running(call, get_token=None):
+    """Start warm_up as a task on the running loop (when enabled) and stop it on exit, if still busy."""
+    task = asyncio.create_task(warm_up(call, get_token), name="mcp-warmup") if WARMUP_ENABLED else None
+    try:
+        yield task
+    finally:
+        if task is not None:
+            task.cancel()